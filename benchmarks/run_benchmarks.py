@@ -0,0 +1,245 @@
+"""Run genshin.py offline on synthetic sheets and check each stage against the budgets in budgets.json.
+
+    python benchmarks/run_benchmarks.py                      # 1x and 10x the live roster
+    python benchmarks/run_benchmarks.py --scales 1 10 100
+    python benchmarks/run_benchmarks.py --update-budgets     # record current numbers, plus headroom
+    python benchmarks/run_benchmarks.py --tolerance 1.5      # loosen every budget by half
+    python benchmarks/run_benchmarks.py -- --expansion loop  # anything after -- goes to genshin.py
+
+No network or API key is needed: each scale's sheet is generated, stored as a snapshot and built
+with --offline --full-rebuild in a scratch directory, after an unmeasured build of the same sheet with
+its first tab generated differently, so the diff stage has changed rows to find. Stage timings and row counts come from the
+metrics.json the build writes. Startup (a cold `import genshin` plus one normalization call, in a
+fresh interpreter) is measured too, and must not load pandas. Exits with status 1 if any stage goes
+over its wall-time or peak-RSS budget (each stage's own peak RSS; the whole build's for the total).
+
+Wall-time budgets are relative to the machine they were recorded on: budgets.json keeps the time a
+fixed calibration workload took there, and each run scales the budgets by how long it takes here.
+"""
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import snapshots  # noqa: E402
+from synthetic_sheet import BASE_CHARACTERS, ELEMENTS, make_value_ranges  # noqa: E402
+
+BUDGETS_PATH = os.path.join(BENCHMARK_DIR, 'budgets.json')
+# Budgets are measured numbers times this much, so ordinary machine noise does not fail a run
+WALL_HEADROOM = 2.0
+RSS_HEADROOM = 1.5
+# Stages this fast are mostly timer noise; never budget them below this
+MIN_WALL_BUDGET = 0.05
+STARTUP_REPEATS = 5
+CALIBRATION_REPEATS = 5
+# Runs in a fresh interpreter; prints the import and first-call times and whether pandas got loaded
+STARTUP_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import genshin
+imported = time.perf_counter()
+genshin.clean_and_split_stats('CRIT Rate/DMG (until requirement is met)')
+called = time.perf_counter()
+print(json.dumps({'import': imported - start, 'first_call': called - imported, 'pandas': 'pandas' in sys.modules}))
+'''
+
+
+def calibration_workload():
+    """Fixed CPU-bound work shaped like the pipeline's Python stages: splitting, regex, grouping, sorting, JSON."""
+    lines = [f"{i % 9}. Crit Rate / ATK% ~= EM [note {i % 13}]" for i in range(40000)]
+    groups = {}
+    for line in lines:
+        rank, text = line.split('. ', 1)
+        text = re.sub(r'\s*(?:/|~=)\s*', '|', re.sub(r'\[.*?\]', '', text))
+        groups.setdefault(rank, []).extend(name.strip() for name in text.split('|'))
+    json.loads(json.dumps(groups))
+    sorted(lines, key=lambda line: line[::-1])
+
+
+def calibrate():
+    """Best-of-CALIBRATION_REPEATS wall time of calibration_workload() on this machine."""
+    runs = []
+    for _ in range(CALIBRATION_REPEATS):
+        start = time.perf_counter()
+        calibration_workload()
+        runs.append(time.perf_counter() - start)
+    return round(min(runs), 4)
+
+
+def run_scale(scale, workdir, pipeline_args):
+    """Build a synthetic sheet of scale x BASE_CHARACTERS in workdir and return its stage metrics."""
+    value_ranges = make_value_ranges(BASE_CHARACTERS * scale, seed=scale)
+    previous_ranges = make_value_ranges(BASE_CHARACTERS * scale, seed=scale + 1)[:1] + value_ranges[1:]
+    snapshots.save_snapshot(os.path.join(workdir, 'previous'), ELEMENTS, previous_ranges)
+    snapshots.save_snapshot(os.path.join(workdir, 'snapshot'), ELEMENTS, value_ranges)
+    shutil.copy(os.path.join(REPO_DIR, 'artifact_evaluator_template.html'), workdir)
+
+    def command(snapshot_dir):
+        return [
+            sys.executable, os.path.join(REPO_DIR, 'genshin.py'),
+            '--offline', '--snapshot-dir', snapshot_dir, '--full-rebuild', *pipeline_args,
+        ]
+
+    subprocess.run(command('previous'), cwd=workdir, check=True, stdout=subprocess.DEVNULL)
+    start = time.perf_counter()
+    subprocess.run(command('snapshot'), cwd=workdir, check=True, stdout=subprocess.DEVNULL)
+    total = time.perf_counter() - start
+
+    with open(os.path.join(workdir, 'output', 'metrics.json'), 'r', encoding='utf-8') as f:
+        metrics = json.load(f)
+    stages = metrics['stages']
+    for stage in stages.values():
+        # Where a stage's own peak is not measured (off Linux), budget the process peak so far
+        if stage.get('peak_rss_mb') is None:
+            stage['peak_rss_mb'] = stage.get('process_peak_rss_mb')
+    rss = [stage['process_peak_rss_mb'] for stage in stages.values() if stage.get('process_peak_rss_mb') is not None]
+    stages['total'] = {'wall_s': round(total, 4), 'peak_rss_mb': max(rss) if rss else None}
+    return stages
+
+
+def measure_startup():
+    """Best-of-STARTUP_REPEATS cold start: interpreter plus `import genshin` (total), the import and one cleaner call."""
+    runs = []
+    for _ in range(STARTUP_REPEATS):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=REPO_DIR, check=True,
+                                capture_output=True, text=True)
+        runs.append({**json.loads(result.stdout), 'total': time.perf_counter() - start})
+    stages = {
+        stage: {'wall_s': round(min(run[stage] for run in runs), 4), 'peak_rss_mb': None}
+        for stage in ('import', 'first_call', 'total')
+    }
+    return stages, any(run['pandas'] for run in runs)
+
+
+def scaled_budgets(budgets, wall_factor, rss_factor):
+    """budgets with wall times multiplied by wall_factor and peak RSS by rss_factor."""
+    return {
+        stage: {
+            'wall_s': round(budget['wall_s'] * wall_factor, 2) if budget.get('wall_s') is not None else None,
+            'peak_rss_mb': round(budget['peak_rss_mb'] * rss_factor) if budget.get('peak_rss_mb') is not None else None,
+        }
+        for stage, budget in budgets.items()
+    }
+
+
+def over_budget(stages, budgets):
+    """(stage, metric, measured, budget) for every measurement above its budget."""
+    return [
+        (stage, metric, measured[metric], budgets[stage][metric])
+        for stage, measured in stages.items()
+        for metric in ('wall_s', 'peak_rss_mb')
+        if measured.get(metric) is not None and budgets.get(stage, {}).get(metric) is not None
+        and measured[metric] > budgets[stage][metric]
+    ]
+
+
+def format_table(label, stages, budgets):
+    lines = [
+        f"{label} ({stages['total']['wall_s']:.2f} s total)",
+        f"  {'stage':<12}{'wall s':>10}{'budget':>10}{'cpu s':>10}{'peak RSS MB':>12}{'budget':>10}{'rows out':>10}",
+    ]
+    for stage, measured in stages.items():
+        budget = budgets.get(stage, {})
+        lines.append(
+            f"  {stage:<12}{measured['wall_s']:>10.3f}{budget.get('wall_s', '-'):>10}"
+            f"{measured['cpu_s'] if measured.get('cpu_s') is not None else '-':>10}"
+            f"{measured['peak_rss_mb'] if measured.get('peak_rss_mb') is not None else '-':>12}"
+            f"{budget['peak_rss_mb'] if budget.get('peak_rss_mb') is not None else '-':>10}"
+            f"{measured['rows_out'] if measured.get('rows_out') is not None else '-':>10}"
+        )
+    return '\n'.join(lines)
+
+
+def budgets_from(stages):
+    return {
+        stage: {
+            'wall_s': max(MIN_WALL_BUDGET, math.ceil(measured['wall_s'] * WALL_HEADROOM * 100) / 100),
+            'peak_rss_mb': (
+                math.ceil(measured['peak_rss_mb'] * RSS_HEADROOM / 10) * 10
+                if measured.get('peak_rss_mb') is not None else None
+            ),
+        }
+        for stage, measured in stages.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark genshin.py stages on synthetic sheets.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10],
+                        help=f"multiples of {BASE_CHARACTERS} characters to build (default: %(default)s)")
+    parser.add_argument('--update-budgets', action='store_true',
+                        help="write this run's numbers (with headroom) to budgets.json instead of checking them")
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help="multiply every budget (wall time and RSS) by this factor (default: %(default)s)")
+    parser.add_argument('--keep', action='store_true', help="keep the scratch build directories")
+    args, pipeline_args = parser.parse_known_args()
+    pipeline_args = [arg for arg in pipeline_args if arg != '--']
+
+    try:
+        with open(BUDGETS_PATH, 'r', encoding='utf-8') as f:
+            all_budgets = json.load(f)
+    except FileNotFoundError:
+        all_budgets = {}
+
+    calibration = calibrate()
+    recorded = all_budgets.get('calibration', {}).get('wall_s')
+    wall_factor = (calibration / recorded if recorded and not args.update_budgets else 1.0) * args.tolerance
+    print(f"calibration: {calibration:.4f} s (budgets recorded at {recorded or '-'} s): "
+          f"wall budgets x{wall_factor:.2f}, RSS budgets x{args.tolerance:.2f}\n")
+    if args.update_budgets:
+        all_budgets['calibration'] = {'wall_s': calibration}
+
+    def label_budgets(label):
+        return scaled_budgets(all_budgets.get(label, {}), wall_factor, args.tolerance)
+
+    regressions = []
+    startup, loads_pandas = measure_startup()
+    print(format_table("startup: import genshin", startup, label_budgets('startup')) + '\n')
+    if args.update_budgets:
+        all_budgets['startup'] = budgets_from(startup)
+    else:
+        regressions += [('startup', *regression) for regression in over_budget(startup, label_budgets('startup'))]
+    if loads_pandas:
+        regressions.append(('startup', 'import', 'loads pandas', True, False))
+    for scale in args.scales:
+        label = f"{scale}x"
+        workdir = tempfile.mkdtemp(prefix=f"genshin-bench-{label}-")
+        try:
+            stages = run_scale(scale, workdir, pipeline_args)
+        finally:
+            if args.keep:
+                print(f"{label} build kept in {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+        budgets = label_budgets(label)
+        print(format_table(f"{label}: {BASE_CHARACTERS * scale} characters", stages, budgets) + '\n')
+        if args.update_budgets:
+            all_budgets[label] = budgets_from(stages)
+        else:
+            regressions += [(label, *regression) for regression in over_budget(stages, budgets)]
+
+    if args.update_budgets:
+        with open(BUDGETS_PATH, 'w', encoding='utf-8') as f:
+            json.dump(all_budgets, f, indent=2)
+            f.write('\n')
+        print(f"Budgets written to {BUDGETS_PATH}")
+        return 0
+
+    for label, stage, metric, measured, budget in regressions:
+        print(f"REGRESSION {label} {stage}: {metric} {measured} > budget {budget}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
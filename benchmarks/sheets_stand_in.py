@@ -0,0 +1,100 @@
+"""Local stand-in for the Sheets API's spreadsheets.values.get, serving saved batchGet responses.
+
+    python benchmarks/sheets_stand_in.py main=response.json other=other.json --port 8765 --latency 0.2 --fail-every 5
+    # sources.json: [{"name": "main", "spreadsheetId": "main", "url": "http://127.0.0.1:8765"},
+    #                {"name": "other", "spreadsheetId": "other", "url": "http://127.0.0.1:8765"}]
+    python genshin.py --sources sources.json
+
+GET /v4/spreadsheets/<id>/values/<range> returns the valueRange of <id>'s response whose sheet title
+matches <range>'s, ignoring surrounding spaces (the saved ranges carry row bounds the request does not,
+and the element tab titles are not consistently padded). With no files, each spreadsheet id is served
+a synthetic sheet of --characters characters. --latency delays every response and --fail-every N
+answers every Nth request with 503, to exercise retries and concurrency.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_sheet import make_value_ranges  # noqa: E402
+
+
+def sheet_title(range_name):
+    """The sheet title part of an A1 range ("'Pyro '!A1:J19" -> "Pyro ")."""
+    title = range_name.rsplit('!', 1)[0]
+    return title[1:-1].replace("''", "'") if title.startswith("'") and title.endswith("'") else title
+
+
+def make_handler(responses, characters, latency, fail_every):
+    lock = threading.Lock()
+    request_count = itertools.count(1)
+
+    def value_ranges(spreadsheet_id):
+        with lock:
+            if spreadsheet_id not in responses:
+                responses[spreadsheet_id] = {'valueRanges': make_value_ranges(characters)}
+            return responses[spreadsheet_id]['valueRanges']
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            parts = urlsplit(self.path).path.split('/')
+            if len(parts) != 6 or parts[1:3] != ['v4', 'spreadsheets'] or parts[4] != 'values':
+                return self.reply(404, {'error': {'code': 404, 'message': f"Unknown path {self.path}"}})
+            if fail_every and next(request_count) % fail_every == 0:
+                return self.reply(503, {'error': {'code': 503, 'message': "The service is currently unavailable."}})
+            title = sheet_title(unquote(parts[5])).strip()
+            for value_range in value_ranges(parts[3]):
+                if sheet_title(value_range['range']).strip() == title:
+                    return self.reply(200, value_range)
+            self.reply(400, {'error': {'code': 400, 'message': f"Unable to parse range: {unquote(parts[5])}"}})
+
+        def reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve saved batchGet responses like the Sheets API values.get.")
+    parser.add_argument('responses', nargs='*', help="spreadsheet_id=response.json pairs")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--characters', type=int, default=100, help="synthetic sheet size for unknown ids")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds to wait before every response")
+    parser.add_argument('--fail-every', type=int, default=0, help="answer every Nth request with 503 (0: never)")
+    args = parser.parse_args()
+
+    responses = {}
+    for pair in args.responses:
+        spreadsheet_id, path = pair.split('=', 1)
+        with open(path, 'r', encoding='utf-8') as f:
+            responses[spreadsheet_id] = json.load(f)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port),
+                                 make_handler(responses, args.characters, args.latency, args.fail_every))
+    print(f"Serving the Sheets API values.get on http://127.0.0.1:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Synthetic GOOD format artifact inventories over the synthetic sheet's sets, for inventory.py.
+
+    python benchmarks/synthetic_inventory.py 1500 > inventory.json
+    python inventory.py inventory.json --limit 20
+"""
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory import good_set_key  # noqa: E402
+from synthetic_sheet import SETS  # noqa: E402
+
+MAIN_STATS = {
+    'flower': ['hp'],
+    'plume': ['atk'],
+    'sands': ['hp_', 'atk_', 'def_', 'eleMas', 'enerRech_'],
+    'goblet': ['hp_', 'atk_', 'def_', 'eleMas', 'physical_dmg_', 'anemo_dmg_', 'geo_dmg_', 'electro_dmg_',
+               'hydro_dmg_', 'pyro_dmg_', 'cryo_dmg_', 'dendro_dmg_'],
+    'circlet': ['hp_', 'atk_', 'def_', 'eleMas', 'critRate_', 'critDMG_', 'heal_'],
+}
+SUBSTATS = ['hp', 'atk', 'def', 'hp_', 'atk_', 'def_', 'eleMas', 'enerRech_', 'critRate_', 'critDMG_']
+
+
+def make_inventory(n_artifacts=1500, seed=0):
+    """Return a GOOD export dict holding n_artifacts random artifacts (mostly 5 star, any level)."""
+    rng = random.Random(seed)
+    set_keys = [good_set_key(artifact_set) for artifact_set in SETS]
+    artifacts = []
+    for _ in range(n_artifacts):
+        slot = rng.choice(list(MAIN_STATS))
+        main_stat = rng.choice(MAIN_STATS[slot])
+        level = rng.choice([0, 0, 4, 8, 12, 16, 20, 20])
+        substats = rng.sample([key for key in SUBSTATS if key != main_stat], 3 + (level >= 4 or rng.random() < 0.3))
+        artifacts.append({
+            'setKey': rng.choice(set_keys),
+            'slotKey': slot,
+            'level': level,
+            'rarity': 5 if rng.random() < 0.9 else 4,
+            'mainStatKey': main_stat,
+            'location': '',
+            'lock': False,
+            'substats': [{'key': key, 'value': round(rng.uniform(2, 20), 1)} for key in substats],
+        })
+    return {'format': 'GOOD', 'version': 2, 'source': 'synthetic_inventory', 'artifacts': artifacts}
+
+
+if __name__ == '__main__':
+    json.dump(make_inventory(int(sys.argv[1]) if len(sys.argv) > 1 else 1500), sys.stdout)
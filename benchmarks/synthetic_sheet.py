@@ -0,0 +1,115 @@
+"""Synthetic batchGet responses shaped like the recommendations sheet, for offline benchmarks.
+
+Each element tab has the 5 header rows the pipeline trims, 5 STAR / 4 STAR / NOTES / Last Updated
+keyword rows, a TRAVELER block on the traveler elements, multi-row (multi-role) character blocks,
+ranked `N. text` lines with occasional unranked ones, `~=` / `≈` continuation lines, category sets
+like `18% ATK set`, and the bracketed / parenthetical notes the canonicalizers strip.
+"""
+import random
+
+# Tab names as genshin.py stores them in snapshots, and the sheet tab titles they are fetched from
+ELEMENTS = ["PYRO", "ELECTRO", "DENDRO", "HYDRO", "CRYO", "ANEMO", "GEO"]
+TAB_TITLES = ["Pyro ", "Electro ", "Dendro", "Hydro ", "Cryo ", "Anemo ", "Geo "]
+TRAVELER_ELEMENTS = {"ANEMO", "GEO", "ELECTRO", "DENDRO", "HYDRO", "PYRO"}
+
+# Roughly the live sheet's roster; benchmark scales are multiples of it
+BASE_CHARACTERS = 100
+
+SETS = [
+    "Crimson Witch of Flames", "Gladiator's Finale", "Emblem Of Severed Fate", "Marechausse Hunter",
+    "Ocean Hued Clam", "Noblesse Oblige", "Deepwood Memories", "Golden Troupe", "Viridescent Venerer",
+    "Silken Moon Serenade", "Desert Pavillion Chronicle", "Obsidian Codex", "Scroll of the Hero of Cinder City",
+    "Blizzard Strayer", "Heart of Depth", "Tenacity of the Millelith", "Husk of Opulent Dreams",
+]
+CATEGORY_SETS = [
+    "18% ATK set", "18 ATK% set", "20% ER Set", "15% Healing Bonus", "80 EM", "20% HP", "15% Anemo DMG Set",
+    "15% Hydro DMG Bonus set", "25% Physical DMG set", "15% Cryo DMG set",
+]
+MAIN_STATS = {
+    "Sands": ["ATK%", "Atk%", "EM", "Elemental Mastery", "ER%", "HP%", "DEF%", "Energy Recharge%"],
+    "Goblet": ["Pyro DMG%", "Electro DMG", "ATK%", "HP%", "Hydro DMG", "EM", "Physical DMG%", "Cryo DMG%",
+               "Anemo Damage"],
+    "Circlet": ["CRIT", "Crit Rate%", "CRIT Rate", "Crit DMG", "Healing Bonus%", "EM", "ATK%", "HP%"],
+}
+SUBSTATS = [
+    "CRIT", "Crit Rate", "Crit DMG", "ATK%", "Flat ATK", "Elemental Mastery", "EM",
+    "ER% (until requirement is met)", "Energy Recharge [until requirement]", "HP%", "Flat DEF", "DEF%",
+    "Flat HP", "Crit Rate / DMG", "ATK% = EM", "HP% ≈ Crit Rate",
+]
+ROLES = ["DPS ✩", "DPS", "SUB DPS ✩", "SUPPORT", "SUB DPS", "BURST\nSUPPORT ✩", "SHIELD SUPPORT  [C4+ REQUIRED]",
+         "HEALER"]
+
+
+def artifact_sets_cell(rng):
+    lines = []
+    for i in range(rng.randint(1, 5)):
+        kind = rng.random()
+        if kind < 0.15:
+            names = rng.choice(CATEGORY_SETS)
+        elif kind < 0.3:
+            names = f"{rng.choice(SETS)} (2) {rng.choice(['/', '+', ''])} {rng.choice(SETS + CATEGORY_SETS)} (2)"
+        elif kind < 0.35:
+            names = "[Choose Two] " + " / ".join(rng.sample(SETS, 3))
+        else:
+            names = rng.choice(SETS) + rng.choice(["", "", "*", "  ", " [see notes]"])
+        lines.append(f"{i + 1}. {names}" if rng.random() > 0.05 else names)
+        if rng.random() < 0.15:
+            lines.append(rng.choice(["~= ", "≈ ", "~="]) + rng.choice(SETS))
+    if rng.random() < 0.1:
+        lines.append("")
+    return "\n".join(lines)
+
+
+def main_stats_cell(rng):
+    lines = []
+    for slot, options in MAIN_STATS.items():
+        stats = " / ".join(rng.sample(options, rng.randint(1, 3)))
+        if rng.random() < 0.1:
+            stats += " (or something)"
+        lines.append(f"{slot} - {stats}")
+    if rng.random() < 0.1:
+        lines.append("Any slot")
+    return "\n".join(lines)
+
+
+def substats_cell(rng):
+    lines = []
+    for i, substat in enumerate(rng.sample(SUBSTATS, rng.randint(1, 6))):
+        lines.append(f"{i + 1}. {substat}" if rng.random() > 0.07 else substat)
+        if rng.random() < 0.1:
+            lines.append(rng.choice(["~= ", "≈ "]) + rng.choice(SUBSTATS))
+    return "\n".join(lines)
+
+
+def make_value_ranges(n_characters=BASE_CHARACTERS, seed=0):
+    """Return a batchGet-style list of valueRanges (one per element tab, ELEMENTS order) with n_characters blocks."""
+    rng = random.Random(seed)
+    per_tab = [n_characters // len(ELEMENTS) + (i < n_characters % len(ELEMENTS)) for i in range(len(ELEMENTS))]
+    value_ranges = []
+    for element, title, n_tab in zip(ELEMENTS, TAB_TITLES, per_tab):
+        rows = [
+            ["", element],
+            [],
+            ["", "CHARACTER", "ROLE", "", "ARTIFACT SETS", "MAIN STATS", "SUBSTATS", "", "NOTES"],
+            [""],
+            [""],
+            ["", "5 STAR"],
+        ]
+        for i in range(n_tab):
+            if i == n_tab // 2:
+                rows.append(["", "4 STAR"])
+                rows.append(["", "*portrait \npending*", "DPS", "", "1. Golden Troupe", "Sands - EM", "1. EM"])
+            name = "TRAVELER" if i == 0 and element in TRAVELER_ELEMENTS else f"{element}CHAR{i}"
+            for role_row in range(rng.randint(1, 3)):
+                row = ["", name if role_row == 0 else "", rng.choice(ROLES), "",
+                       artifact_sets_cell(rng), main_stats_cell(rng), substats_cell(rng), "", "notes"]
+                # The API drops trailing empty cells, so some rows come back short
+                if rng.random() < 0.1:
+                    row = row[:3]
+                rows.append(row)
+            if rng.random() < 0.2:
+                rows.append(["", "", "", "", "", "", "", "", "talent priority notes"])
+        rows.append(["", "NOTES"])
+        rows.append(["", "Last Updated: 2026-01-01"])
+        value_ranges.append({"range": f"'{title}'!A1:J{len(rows)}", "majorDimension": "ROWS", "values": rows})
+    return value_ranges
@@ -1,17 +1,62 @@
+import argparse
+import bisect
+import contextlib
+import cProfile
+import functools
+import gzip
+import hashlib
+import io
 import json
+import multiprocessing
 import os
-import pandas as pd
+import pickle
 import re
-from dotenv import load_dotenv
-from googleapiclient.discovery import build
+import shutil
+import sys
+import time
+import tracemalloc
 
-load_dotenv()
+import snapshots
+
+# pandas and numpy are imported inside the stages that use them (and the Google client only when
+# fetching), so importing this module to reuse the parsers and cleaners stays fast.
 
-API_KEY = os.environ['GOOGLE_API_KEY']
 SPREADSHEET_ID = '1gNxZ2xab1J6o1TuNVWMeLOZ7TPOqrsf3SshP5DLvKzI'
+RANGES = [
+    "Pyro !A1:J",
+    "Electro !A1:J",
+    "Dendro!A1:J",
+    "Hydro !A1:J",
+    "Cryo !A1:J",
+    "Anemo !A1:J",
+    "Geo !A1:J",
+]
+
+# Elemental types in the same order as the ranges list
+elements = ["PYRO", "ELECTRO", "DENDRO", "HYDRO", "CRYO", "ANEMO", "GEO"]
 
-# Validation counters for summary
-validation_counts = {
+SNAPSHOT_DIR = 'output/snapshot'
+# Snapshots of the sources after the first one (which builds use) when fetching with --sources
+SOURCE_SNAPSHOT_DIR = 'output/sources'
+# Flattened dataset files, by format: pipe-delimited text, Arrow IPC (memory-mappable), Parquet and an
+# indexed SQLite database (see recommendations_db.py)
+DATASET_PATHS = {
+    'csv': 'output/output.csv',
+    'arrow': 'output/output.arrow',
+    'parquet': 'output/output.parquet',
+    'sqlite': 'output/output.sqlite',
+}
+METRICS_PATH = 'output/metrics.json'
+# One JSON line per poll of the watch command that rebuilt (or failed), with its stage timings
+WATCH_LOG_PATH = 'output/watch_log.jsonl'
+# sha256 and size of each file a build wrote, so unchanged files are not rewritten (or republished)
+OUTPUT_MANIFEST_PATH = 'output/manifest.json'
+# What the last build that changed the flattened rows added, removed and re-ranked (see diff_datasets)
+CHANGES_PATH = 'output/changes.json'
+PUBLISH_DIR = 'docs'
+
+# Validation counters for summary; each build counts into its own copy
+VALIDATION_COUNTS = {
     'rows_fetched': 0,
     'rows_after_header_trim': 0,
     'rows_filtered_keywords': 0,
@@ -25,164 +70,655 @@ validation_counts = {
     'final_output_rows': 0,
 }
 
-# Initialize Google Sheets API
-service = build('sheets', 'v4', developerKey=API_KEY)
-sheet = service.spreadsheets()
-
-# Fetch data
-response = service.spreadsheets().values().batchGet(
-    spreadsheetId=SPREADSHEET_ID,
-    ranges=[
-        "Pyro !A1:J",
-        "Electro !A1:J",
-        "Dendro!A1:J",
-        "Hydro !A1:J",
-        "Cryo !A1:J",
-        "Anemo !A1:J",
-        "Geo !A1:J",
-    ]
-).execute()
 
-# Elemental types in the same order as the ranges list
-elements = ["PYRO", "ELECTRO", "DENDRO", "HYDRO", "CRYO", "ANEMO", "GEO"]
+def map_in_workers(function, *iterables, workers=1):
+    """map() that runs on a pool of worker processes when workers > 1; results keep input order."""
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(function, *iterables))
+    return list(map(function, *iterables))
+
+
+def map_tabs(function, tab_keys, *iterables, workers=1, tab_cache=None):
+    """map_in_workers() over element tabs that reuses results tab_cache holds for the same function and tab key.
+
+    Only tabs whose key (element and content hash) is new are computed; tab_cache then holds just this
+    call's results for function. Without tab_cache, every tab is computed.
+    """
+    if tab_cache is None:
+        return map_in_workers(function, *iterables, workers=workers)
+    keys = [(function.__name__, tab_key) for tab_key in tab_keys]
+    pending = [i for i, key in enumerate(keys) if key not in tab_cache]
+    fresh_results = map_in_workers(function, *([arguments[i] for i in pending] for arguments in iterables), workers=workers)
+    tab_cache.update(zip([keys[i] for i in pending], fresh_results))
+    current_keys = set(keys)
+    for key in [key for key in tab_cache if key[0] == function.__name__ and key not in current_keys]:
+        del tab_cache[key]
+    return [tab_cache[key] for key in keys]
+
+
+def new_run_metrics(profile=False):
+    """Empty per-stage metrics for one run; with profile, each stage runs under its own cProfile profiler."""
+    return {'stages': {}, 'profiles': {}, 'current': {'name': None}, 'profile': profile}
+
+
+# The highest peak RSS mark reset_peak_rss() has cleared; on Linux clearing it also lowers ru_maxrss
+cleared_peak_rss_mb = 0.0
+
+
+def process_peak_rss_mb():
+    """Peak resident set size of this process so far (over every stage run yet), or None without the resource module."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max(round(max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1), cleared_peak_rss_mb)
+
+
+def reset_peak_rss():
+    """Lower the kernel's peak RSS mark (VmHWM) to the current RSS, so stage_peak_rss_mb() covers what follows.
+
+    Only Linux supports this (writing 5 to /proc/self/clear_refs); returns whether it worked.
+    """
+    global cleared_peak_rss_mb
+    cleared_peak_rss_mb = process_peak_rss_mb() or 0.0
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def stage_peak_rss_mb():
+    """Peak RSS since the last reset_peak_rss() (VmHWM in /proc/self/status), or None where unavailable."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def cpu_seconds():
+    """CPU time of this process plus its reaped children (pool workers, once their pool has shut down)."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def begin_stage(metrics, name=None, rows_in=None):
+    """Finish recording the running stage, if any, and start recording name (None just finishes).
+
+    A stage records wall and CPU time, its own peak RSS (Linux only: the kernel's peak mark is reset
+    when it starts), the process's peak RSS so far (which later stages repeat until one goes higher),
+    its own tracemalloc peak (when tracing) and the rows it took in and put out (see stage_rows).
+    """
+    now, cpu = time.perf_counter(), cpu_seconds()
+    current_stage = metrics['current']
+    if current_stage['name'] is not None:
+        if current_stage['profile'] is not None:
+            current_stage['profile'].disable()
+            metrics['profiles'][current_stage['name']] = current_stage['profile']
+        metrics['stages'][current_stage['name']] = {
+            'wall_s': round(now - current_stage['wall_start'], 4),
+            'cpu_s': round(cpu - current_stage['cpu_start'], 4),
+            'peak_rss_mb': stage_peak_rss_mb() if current_stage['rss_reset'] else None,
+            'process_peak_rss_mb': process_peak_rss_mb(),
+            'tracemalloc_peak_mb': (
+                round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1) if tracemalloc.is_tracing() else None
+            ),
+            'rows_in': current_stage['rows_in'],
+            'rows_out': current_stage['rows_out'],
+        }
+    current_stage.clear()
+    current_stage.update(name=name, wall_start=now, cpu_start=cpu, rows_in=rows_in, rows_out=None, profile=None)
+    if name is None:
+        return
+    current_stage['rss_reset'] = reset_peak_rss()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    if metrics['profile']:
+        current_stage['profile'] = cProfile.Profile()
+        current_stage['profile'].enable()
+
+
+def stage_rows(metrics, rows_in=None, rows_out=None):
+    """Record row counts for the running stage once they are known."""
+    if rows_in is not None:
+        metrics['current']['rows_in'] = rows_in
+    if rows_out is not None:
+        metrics['current']['rows_out'] = rows_out
+
+
+def count_sheet_rows(value_ranges):
+    return sum(len(value_range.get('values', [])) for value_range in value_ranges)
+
+
+# A batch_get function, batch_get(spreadsheet_id, ranges), returns the valueRanges of a Sheets batchGet
+# response. fetch() takes any of them, so a file-backed or local stand-in can replace the Google API.
+def google_batch_get():
+    """batch_get against the Google Sheets API; the API key and Google client are only loaded when fetching.
+
+    The client is built once here and reused by every call, so keep the function for repeated fetches.
+    """
+    from dotenv import load_dotenv
+    from googleapiclient import discovery
+
+    load_dotenv()
+    service = discovery.build('sheets', 'v4', developerKey=os.environ['GOOGLE_API_KEY'])
+
+    def batch_get(spreadsheet_id, ranges):
+        response = service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=ranges
+        ).execute()
+        return response['valueRanges']
+
+    return batch_get
+
+
+def file_batch_get(path):
+    """batch_get that serves a saved batchGet response (JSON with 'valueRanges') from path, rereading it each call."""
+    def batch_get(spreadsheet_id, ranges):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)['valueRanges']
+
+    return batch_get
+
+
+def fetch_value_ranges(batch_get=None):
+    """Fetch all element tabs with one batchGet, through batch_get (default: the Google Sheets API)."""
+    batch_get = batch_get if batch_get is not None else google_batch_get()
+    return batch_get(SPREADSHEET_ID, RANGES)
+
+
+def fetch(snapshot_dir=SNAPSHOT_DIR, metrics=None, batch_get=None):
+    """Fetch the sheet (through batch_get, if given) and store it as the snapshot in snapshot_dir.
+
+    Returns the valueRanges and the names of the tabs whose content changed since the last snapshot.
+    """
+    metrics = metrics if metrics is not None else new_run_metrics()
+    begin_stage(metrics, 'fetch')
+    value_ranges = fetch_value_ranges(batch_get)
+    changed_tabs = snapshots.save_snapshot(snapshot_dir, elements, value_ranges, SPREADSHEET_ID)
+    stage_rows(metrics, rows_out=count_sheet_rows(value_ranges))
+    begin_stage(metrics)
+    return value_ranges, changed_tabs
+
+
+def ingest(sources, snapshot_dir=SNAPSHOT_DIR, metrics=None, concurrency=8, retries=4, clean=True):
+    """Fetch the element tabs of every source (see sheet_sources) concurrently, cleaning the built source's tabs.
+
+    Only the first source is built. With clean, each of its tabs is trimmed and filtered (clean_tab)
+    as soon as its range comes back, while the other requests are still in flight, so the fetch stage
+    includes that work. The first source is stored as the snapshot in snapshot_dir, the one builds use;
+    the others are only snapshotted, uncleaned, under SOURCE_SNAPSHOT_DIR/<name>.
+    Returns {source name: {'value_ranges', 'snapshot_dir', 'changed_tabs'}} in source order; the first
+    source's also has a 'tab_cache' of its clean_tab results keyed as map_tabs keys them, for build().
+    """
+    import sheet_sources
+
+    metrics = metrics if metrics is not None else new_run_metrics()
+    begin_stage(metrics, 'fetch')
+    api_key = None
+    if any('spreadsheetId' in source and 'url' not in source for source in sources):
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        api_key = os.environ['GOOGLE_API_KEY']
+    results = {source['name']: {'value_ranges': [None] * len(elements)} for source in sources}
+    built_source = results[sources[0]['name']]
+    built_source['tab_cache'] = {}
+    for name, index, value_range in sheet_sources.iter_value_ranges(
+            sources, elements, RANGES, api_key, concurrency=concurrency, retries=retries):
+        results[name]['value_ranges'][index] = value_range
+        if clean and results[name] is built_source:
+            tab_key = (elements[index], snapshots.tab_hash(value_range))
+            built_source['tab_cache'][(clean_tab.__name__, tab_key)] = clean_tab(elements[index], value_range)
+    for i, source in enumerate(sources):
+        result = results[source['name']]
+        result['snapshot_dir'] = snapshot_dir if i == 0 else os.path.join(SOURCE_SNAPSHOT_DIR, source['name'])
+        result['changed_tabs'] = snapshots.save_snapshot(
+            result['snapshot_dir'], elements, result['value_ranges'], source.get('spreadsheetId')
+        )
+    stage_rows(metrics, rows_out=sum(count_sheet_rows(result['value_ranges']) for result in results.values()))
+    begin_stage(metrics)
+    return results
+
+
+def load_sheet(snapshot_dir=SNAPSHOT_DIR, metrics=None):
+    """Load the valueRanges saved by the last fetch; needs no network or API key."""
+    metrics = metrics if metrics is not None else new_run_metrics()
+    begin_stage(metrics, 'fetch')
+    value_ranges = snapshots.load_snapshot(snapshot_dir, elements)
+    stage_rows(metrics, rows_out=count_sheet_rows(value_ranges))
+    begin_stage(metrics)
+    return value_ranges
+
+# Step 2: Filter out unwanted rows (e.g., "4 STAR", "5 STAR", "NOTES", and "Last Updated:" rows)
+filter_keywords = ["4 STAR", "5 STAR", "NOTES", "*portrait \npending*"]
+
+
+BLOCK_COLUMNS = ['Character', 'Role', 'Artifact Sets', 'Main Stats', 'Substats']
+
+
+def character_names(df_cleaned):
+    """Mask of rows that start a character block: a non-empty string in column '1'.
+
+    Sheet values arrive as strings, so missing cells (rows shorter than the widest) are the only non-strings.
+    """
+    return df_cleaned[1].fillna('').ne('')
+
 
-dfs = []
+def parse_blocks(df_cleaned, current_character=None):
+    """Group cleaned rows into character blocks (non-empty strings in column '1' are character names).
+
+    The name is forward-filled down each block and blocks are numbered by a running count of names.
+    Rows before the first name continue current_character's block (or are dropped without one): they
+    are numbered block -1 and their cells are returned separately so tabs parsed on their own can be
+    stitched back together. Returns the parsed rows (BLOCK_COLUMNS plus 'Block'), each block's cells
+    and the continued cells.
+    """
+    import numpy as np
+    import pandas as pd
+
+    is_name = character_names(df_cleaned)
+    character = df_cleaned[1].where(is_name).ffill()
+    if current_character:
+        character = character.fillna(current_character)
+    in_block = character.notna().to_numpy()
+    df_parsed = pd.DataFrame({
+        'Character': character,
+        'Role': df_cleaned[2],
+        'Artifact Sets': df_cleaned[4],
+        'Main Stats': df_cleaned[5],
+        'Substats': df_cleaned[6],
+        'Block': is_name.cumsum() - 1,
+    })[in_block].reset_index(drop=True)
+
+    # Blocks are runs of rows, so each block's cells are one slice of the rows
+    cells = df_parsed[BLOCK_COLUMNS].to_numpy(dtype=object).tolist()
+    blocks = df_parsed['Block'].to_numpy()
+    starts = np.flatnonzero(np.diff(blocks, prepend=-2)).tolist()
+    block_cells = [cells[start:end] for start, end in zip(starts, starts[1:] + [len(cells)])]
+    continued_cells = block_cells.pop(0) if block_cells and blocks[0] == -1 else []
+    return df_parsed, block_cells, continued_cells
+
+
+def clean_tab(element, value_range):
+    """Rename travelers, trim header rows and drop keyword rows of one element tab, with column masks.
+
+    Runs in a worker process with --workers. Returns the cleaned rows and the tab's validation counts.
+    """
+    import numpy as np
+    import pandas as pd
 
-for i, value_range in enumerate(response['valueRanges']):
     df = pd.DataFrame(value_range['values'])
-    validation_counts['rows_fetched'] += len(df)
 
     # Rename TRAVELER rows in column 1
-    df.iloc[:, 1] = df.iloc[:, 1].apply(
-        lambda x: f"{elements[i]} TRAVELER" if isinstance(x, str) and x.startswith("TRAVELER") else x
-    )
+    df[1] = df[1].mask(df[1].str.startswith("TRAVELER", na=False), f"{element} TRAVELER")
 
-    # Trim the first 5 rows (0-indexed)
-    df_trimmed = df.iloc[5:].reset_index(drop=True)
-    validation_counts['rows_after_header_trim'] += len(df_trimmed)
-    dfs.append(df_trimmed)
+    # Trim the first 5 rows (0-indexed) and drop keyword rows in the same selection
+    after_header = np.arange(len(df)) >= 5
+    keep = after_header & ~df[1].isin(filter_keywords) & ~df[1].str.startswith("Last Updated:", na=False)
+    df_cleaned = df[keep].reset_index(drop=True)
 
-# Concatenate all the trimmed dataframes into one final dataframe
-df_trimmed = pd.concat(dfs, ignore_index=True)
+    counts = {
+        'rows_fetched': len(df),
+        'rows_after_header_trim': int(after_header.sum()),
+        'rows_after_keyword_filter': len(df_cleaned),
+    }
+    return df_cleaned, counts
 
-# Step 2: Filter out unwanted rows (e.g., "4 STAR", "5 STAR", "NOTES", and "Last Updated:" rows)
-filter_keywords = ["4 STAR", "5 STAR", "NOTES", "*portrait \npending*"]
 
-df_cleaned = df_trimmed[
-    ~df_trimmed[1].isin(filter_keywords) &
-    ~df_trimmed[1].astype(str).str.startswith("Last Updated:")
-].reset_index(drop=True)
-validation_counts['rows_filtered_keywords'] = len(df_trimmed) - len(df_cleaned)
-validation_counts['rows_after_keyword_filter'] = len(df_cleaned)
+def parse_tab(df_cleaned):
+    """Parse one cleaned element tab into character blocks; runs in a worker process with --workers.
 
-# Step 3: Identify character blocks (non-empty strings in column '1' are character names)
-parsed_blocks = []
-current_character = None
+    Returns the parsed rows and block cells (block numbers local to the tab), and the rows before the
+    tab's first character name, which belong to the previous tab's last block.
+    """
+    df_parsed, block_cells, _ = parse_blocks(df_cleaned)
+    is_name = character_names(df_cleaned).to_numpy()
+    leading_rows = df_cleaned.iloc[:int(is_name.argmax()) if is_name.any() else len(df_cleaned)]
+    return df_parsed, block_cells, leading_rows
 
-for _, row in df_cleaned.iterrows():
-    if isinstance(row[1], str) and row[1]:  # If column '1' has a non-empty string
-        current_character = row[1]
-    if current_character:
-        parsed_blocks.append({
-            "Character": current_character,
-            "Role": row[2],
-            "Artifact Sets": row[4],
-            "Main Stats": row[5],
-            "Substats": row[6]
-        })
 
-# Step 4: Convert parsed blocks into a DataFrame
-df_parsed = pd.DataFrame(parsed_blocks)
-
-# Step 5: Filter rows to retain only those with meaningful data
-df_final_cleaned = df_parsed[
-    df_parsed[['Role', 'Artifact Sets', 'Main Stats', 'Substats']]
-    .notnull()
-    .any(axis=1)
-].reset_index(drop=True)
-validation_counts['rows_missing_data'] = len(df_parsed) - len(df_final_cleaned)
-validation_counts['rows_with_meaningful_data'] = len(df_final_cleaned)
-
-# Normalize multiline text fields, collapse multiple spaces
-for col in ['Artifact Sets', 'Main Stats', 'Substats']:
-    df_final_cleaned[col] = df_final_cleaned[col].apply(
-        lambda x: re.sub(r' +', ' ', x).splitlines() if isinstance(x, str) else []
-    )
-
-def concatenate_tilde_lines(lines):
-    processed_lines = []
-    for i, line in enumerate(lines):
-        line = line.strip()
-        # If needed concatenate with the previous line using " / "
-        if line.startswith('~=') and processed_lines:
-            processed_lines[-1] += ' / ' + line[2:].strip()
-        elif line.startswith('≈') and processed_lines:
-            processed_lines[-1] += ' / ' + line[1:].strip()
-        else:
-            processed_lines.append(line)
-    return processed_lines
+# Step 3: Identify character blocks, one tab at a time, and stitch them together in tab order.
+# Each block is fingerprinted from its raw cells so unchanged blocks can reuse their cached expansion.
+BLOCK_CACHE_PATH = 'output/cache/blocks.pkl'
 
-df_final_cleaned['Artifact Sets'] = df_final_cleaned['Artifact Sets'].apply(concatenate_tilde_lines)
-df_final_cleaned['Substats'] = df_final_cleaned['Substats'].apply(concatenate_tilde_lines)
 
-# Helper functions for enhanced processing
-def clean_and_split_artifact_set_names(artifact_sets_names_text):
-    replacements = [
-        # Use "|" as a consistent separator
-        ["/", "|"],
-        ["+", "|"],
-        # Formerly included " and " which is now in an artifact set name, alas
-        ["~=", "|"],
-        ["≈", "|"],
-        ["(2) [Choose One] and", "|"],  # number parentheticals (and other dirt) sometimes act as separators
-        ["(2) and", "|"],
-        ["(2)", "|"],
-        ["(4)", "|"],
-
-        # Remove garbage
-        ["[Choose One]", ""],  
-        ["[Choose Two]", ""],
-        ["[Choose two]", ""],
-        ["[see notes]", ""],
-        ["Mixes of", ""],
-        ["Furina teams only, performs as well or better than Nighttime Whispers in the Echoing Woods", ""],
-        ["Other damaging options (see DPS)", ""],
-        ["*", ""],
-        ["(Crit Rate secondary stat weapon only)", ""],
-
-        # Canonicalize names
-        ["15% Anemo DMG Set", "15% Anemo DMG set"],
-        ["15% Healing Bonus", "15% Healing Bonus set"],
-        ["15% Healing Bonus set set", "15% Healing Bonus set"],  # alas
-        ["15% Hydro DMG Bonus set", "15% Hydro DMG set"],
-        ["18 ATK% set", "18% ATK set"],
-        ["18% ATK Set", "18% ATK set"],
-        ["20% ER Set", "20% Energy Recharge set"],
-        ["20% ER set", "20% Energy Recharge set"],
-        ["20% HP", "20% HP set"],
-        ["20% HP set set", "20% HP set"],  # alas again
-        ["80 EM", "80 EM set"],
-        ["80 EM set set", "80 EM set"],  # alas again again
-        ["Emblem Of Severed Fate", "Emblem of Severed Fate"],
-        ["Marechausse Hunter", "Marechaussee Hunter"],
-        ["Ocean Hued Clam", "Ocean-Hued Clam"],
-        ["Desert Pavillion Chronicle", "Desert Pavilion Chronicle"],
-        ["Silken Moon Serenade", "Silken Moon's Serenade"],
-
-        # Set category expansions; assume only 5 star sets matter
-        ["15% Anemo DMG set", "15% Anemo DMG set|Viridescent Venerer|Desert Pavilion Chronicle"],
-        ["15% Cryo DMG set", "15% Cryo DMG set|Blizzard Strayer|Finale of the Deep Galleries"],
-        ["15% Healing Bonus set", "15% Healing Bonus set|Maiden Beloved|Ocean-Hued Clam|Song of Days Past"],
-        ["15% Hydro DMG set", "15% Hydro DMG set|Heart of Depth|Nymph's Dream"],
-        ["18% ATK set", "18% ATK set|Gladiator's Finale|Shimenawa's Reminiscence|Vermillion Hereafter|Echoes of an Offering|Nighttime Whispers in the Echoing Woods|Fragment of Harmonic Whimsy|Unfinished Reverie"],
-        ["20% Energy Recharge set", "20% Energy Recharge set|Emblem of Severed Fate"],
-        ["20% HP set", "20% HP set|Tenacity of the Millelith|Vourukasha's Glow"],
-        ["25% Physical DMG set", "25% Physical DMG set|Bloodstained Chivalry|Pale Flame"],
-        ["80 EM set", "80 EM set|Wanderer's Troupe|Gilded Dreams|Flower of Paradise Lost"],
+def source_fingerprint(functions, *values):
+    """Hash of the functions' source code, values (as JSON) and the pandas version."""
+    import inspect
+
+    import pandas as pd
+
+    digest = hashlib.sha256(pd.__version__.encode('utf-8'))
+    for function in functions:
+        digest.update(inspect.getsource(function).encode('utf-8'))
+    digest.update(json.dumps(values, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def parser_fingerprint():
+    """Hash of the code and tables that turn a block's cells into rows; cached expansions are only valid for it.
+
+    Block fingerprints hash the cells themselves, so only what runs after parse_blocks() counts here:
+    edits to the index, writers or CLI keep the block cache.
+    """
+    return source_fingerprint(
+        [normalize_fields, split_lines, merge_continuation_lines, lines_by_cell,
+         patterns_overlap, rules_interact, compile_replacements, apply_replacements,
+         canonical_artifact_set_names, clean_and_split_artifact_set_names, canonical_stats, clean_and_split_stats,
+         extract_rank, expand_rows_loop, explode_lines, parse_ranked_names, parse_main_stat_line, explode_pairs,
+         expand_rows_columnar, expand_blocks, expand_character_blocks],
+        ARTIFACT_SET_NAME_REPLACEMENTS, STAT_REPLACEMENTS, LINE_BREAKS, OTHER_LINE_BREAKS, OUTPUT_COLUMNS,
+        EXPANSION_COUNT_KEYS,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def index_fingerprint():
+    """Hash of the code that builds the web index; an index cached by other code is not patched, but rebuilt."""
+    return source_fingerprint(
+        [group_characters, group_substats, group_character_builds, bitset_words, rank_ends, member_cell,
+         generate_web_json],
+        CELL_KEYS, CHARACTER_KEYS, FIXED_SLOT, FIXED_MAIN_STAT_LABEL,
+    )
+
+
+def trim_and_filter_tabs(value_ranges, validation_counts, metrics, workers=1, tab_keys=None, tab_cache=None):
+    """Clean every element tab (see clean_tab), adding their row counts to validation_counts.
+
+    With tab_cache (see map_tabs), tabs whose key in tab_keys is cached are not cleaned again.
+    """
+    begin_stage(metrics, 'trim_filter', rows_in=count_sheet_rows(value_ranges))
+    cleaned_tabs = []
+    for df_tab, counts in map_tabs(clean_tab, tab_keys, elements, value_ranges, workers=workers, tab_cache=tab_cache):
+        cleaned_tabs.append(df_tab)
+        for key, value in counts.items():
+            validation_counts[key] += value
+    validation_counts['rows_filtered_keywords'] = (
+        validation_counts['rows_after_header_trim'] - validation_counts['rows_after_keyword_filter']
+    )
+    stage_rows(metrics, rows_out=validation_counts['rows_after_keyword_filter'])
+    return cleaned_tabs
+
+
+def parse_character_blocks(cleaned_tabs, validation_counts, metrics, workers=1, tab_keys=None, tab_cache=None):
+    """Parse cleaned tabs into one frame of fingerprinted character block rows that carry some data.
+
+    With tab_cache (see map_tabs), tabs whose key in tab_keys is cached are not parsed again.
+    """
+    import pandas as pd
+
+    begin_stage(metrics, 'blocks', rows_in=validation_counts['rows_after_keyword_filter'])
+    tab_frames = []
+    block_cells = []
+
+    for df_tab, tab_cells, leading_rows in map_tabs(parse_tab, tab_keys, cleaned_tabs, workers=workers,
+                                                    tab_cache=tab_cache):
+        if block_cells and len(leading_rows):
+            df_continued, _, continued_cells = parse_blocks(leading_rows, block_cells[-1][0][0])
+            tab_frames.append(df_continued.assign(Block=len(block_cells) - 1))
+            # A new list: the previous tab's cells may be cached for the next build
+            block_cells[-1] = block_cells[-1] + continued_cells
+        # Rows before the tab's first name were stitched on above (or have no character)
+        tab_frames.append(df_tab[df_tab['Block'] >= 0].assign(Block=df_tab['Block'] + len(block_cells)))
+        block_cells.extend(tab_cells)
+
+    block_fingerprints = [
+        hashlib.sha256(json.dumps([parser_fingerprint(), cells], default=str).encode('utf-8')).hexdigest()
+        for cells in block_cells
     ]
-    for r in replacements:
-        artifact_sets_names_text = artifact_sets_names_text.replace(r[0], r[1])
-    artifact_sets_names_text = artifact_sets_names_text.strip()
+
+    # Step 4: One frame of parsed block rows, in sheet order
+    df_parsed = pd.concat(tab_frames, ignore_index=True)
+    df_parsed['Fingerprint'] = df_parsed['Block'].map(pd.Series(block_fingerprints, dtype='str'))
+
+    # Step 5: Filter rows to retain only those with meaningful data
+    df_final_cleaned = df_parsed[
+        df_parsed[['Role', 'Artifact Sets', 'Main Stats', 'Substats']]
+        .notnull()
+        .any(axis=1)
+    ].reset_index(drop=True)
+    validation_counts['rows_missing_data'] = len(df_parsed) - len(df_final_cleaned)
+    validation_counts['rows_with_meaningful_data'] = len(df_final_cleaned)
+    stage_rows(metrics, rows_out=len(df_final_cleaned))
+    return df_final_cleaned
+
+# The line boundaries str.splitlines() recognizes, and those other than \n
+LINE_BREAKS = r'\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]'
+OTHER_LINE_BREAKS = r'[\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]'
+
+
+def split_lines(series):
+    """One row per line of each text cell (after collapsing runs of spaces), indexed by cell position.
+
+    Matches re.sub(r' +', ' ', text).splitlines(): splitting leaves one empty piece after a final
+    line break (or for an empty cell), which is dropped. Missing cells have no lines.
+    """
+    text = series.reset_index(drop=True).fillna('').astype(object)
+    spaced = text.str.contains('  ', regex=False)
+    if spaced.any():
+        text = text.mask(spaced, text[spaced].str.replace(' +', ' ', regex=True))
+    # Sheet cells break lines with \n; split on every splitlines() boundary only when another one occurs
+    if re.search(OTHER_LINE_BREAKS, ''.join(text)):
+        lines = text.str.split(LINE_BREAKS, regex=True).explode()
+    else:
+        lines = text.str.split('\n', regex=False).explode()
+    is_last = ~lines.index.duplicated(keep='last')
+    return lines[~(is_last & (lines == ''))]
+
+
+def merge_continuation_lines(lines):
+    """Strip lines and append each ~= / ≈ line to the previous line of its cell with " / ".
+
+    A continuation line that opens its cell has nothing to join and is kept as it is.
+    """
+    import numpy as np
+    import pandas as pd
+
+    lines = lines.str.strip()
+    continued = lines.str.startswith(('~=', '≈')) & lines.index.duplicated(keep='first')
+    if not continued.any():
+        return lines
+    continuation = lines[continued]
+    continuation = continuation.str[2:].where(continuation.str.startswith('~='), continuation.str[1:]).str.strip()
+    pieces = lines.to_numpy(dtype=object)
+    pieces[continued.to_numpy()] = (' / ' + continuation).to_numpy(dtype=object)
+
+    # Each continuation joins the nearest line before it that is not one: concatenate every piece
+    # once and cut the text where those lines start
+    text = ''.join(pieces)
+    piece_lengths = np.fromiter(map(len, pieces), dtype=np.int64, count=len(pieces))
+    ends = np.cumsum(piece_lengths)
+    is_head = ~continued.to_numpy()
+    bounds = np.append((ends - piece_lengths)[is_head], len(text)).tolist()
+    merged = [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    return pd.Series(merged, index=lines.index[is_head], dtype=object)
+
+
+def lines_by_cell(lines, n_cells):
+    """Per-cell lists of the lines split_lines() (and merge_continuation_lines()) returned."""
+    import numpy as np
+
+    bounds = np.searchsorted(lines.index.to_numpy(dtype=np.int64), np.arange(n_cells + 1)).tolist()
+    values = lines.tolist()
+    return [values[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def normalize_fields(df):
+    """Split multiline text fields into lines (collapsing multiple spaces) and merge ~= / ≈ continuation lines.
+
+    Each column's distinct texts are exploded to one row per line, so the splitting and merging run
+    as string-accessor passes over all lines at once rather than per cell. Cells with the same text
+    share one list.
+    """
+    import pandas as pd
+
+    df = df.copy()
+    for col in ['Artifact Sets', 'Main Stats', 'Substats']:
+        codes, texts = pd.factorize(df[col])
+        lines = split_lines(pd.Series(texts, dtype=object))
+        if col != 'Main Stats':
+            lines = merge_continuation_lines(lines)
+        # Missing cells have code -1, which picks the trailing empty list
+        text_lines = lines_by_cell(lines, len(texts)) + [[]]
+        df[col] = pd.Series([text_lines[code] for code in codes], index=df.index, dtype=object)
+    return df
+
+# Helper functions for enhanced processing
+CANONICALIZATION_CACHE_SIZE = 8192
+
+
+def patterns_overlap(a, b):
+    """True if some text could contain overlapping occurrences of a and b."""
+    if not a or not b:
+        return False
+    if a in b or b in a:
+        return True
+    return any(a[-n:] == b[:n] or b[-n:] == a[:n] for n in range(1, min(len(a), len(b))))
+
+
+def rules_interact(earlier, later):
+    """True if applying the earlier [old, new] rule first can change what the later rule matches."""
+    (old, new), (later_old, _) = earlier, later
+    if new == "" and len(later_old) > 1:
+        return True  # deleting text can join the pieces of a later pattern
+    if patterns_overlap(new, later_old):
+        return True  # the earlier output feeds the later pattern, e.g. "20% HP" -> "20% HP set" -> "20% HP set set"
+    # Overlapping patterns compete for the same text: one alternation scans left to right, so it can
+    # pick the later pattern where it starts first (["aba", "X"], ["ba", "Y"] on "baba": "YY", not "bX")
+    return patterns_overlap(old, later_old)
+
+
+def compile_replacements(rules):
+    """Compile ordered [old, new] str.replace rules into alternation regex passes.
+
+    Applying the passes gives the same text as calling str.replace for each rule in order.
+    Consecutive rules share one pass (longest match first) unless they interact, in which
+    case the later rule starts a new pass so chained rules keep their order.
+    """
+    groups = []
+    for rule in rules:
+        if not groups or any(rules_interact(earlier, rule) for earlier in groups[-1]):
+            groups.append([])
+        groups[-1].append(rule)
+    passes = []
+    for group in groups:
+        mapping = dict(group)
+        alternatives = sorted(mapping, key=len, reverse=True)
+        pattern = re.compile('|'.join(re.escape(old) for old in alternatives))
+        passes.append((pattern, mapping))
+    return passes
+
+
+def apply_replacements(passes, text):
+    for pattern, mapping in passes:
+        text = pattern.sub(lambda m: mapping[m.group(0)], text)
+    return text
+
+
+ARTIFACT_SET_NAME_REPLACEMENTS = [
+    # Use "|" as a consistent separator
+    ["/", "|"],
+    ["+", "|"],
+    # Formerly included " and " which is now in an artifact set name, alas
+    ["~=", "|"],
+    ["≈", "|"],
+    ["(2) [Choose One] and", "|"],  # number parentheticals (and other dirt) sometimes act as separators
+    ["(2) and", "|"],
+    ["(2)", "|"],
+    ["(4)", "|"],
+
+    # Remove garbage
+    ["[Choose One]", ""],  
+    ["[Choose Two]", ""],
+    ["[Choose two]", ""],
+    ["[see notes]", ""],
+    ["Mixes of", ""],
+    ["Furina teams only, performs as well or better than Nighttime Whispers in the Echoing Woods", ""],
+    ["Other damaging options (see DPS)", ""],
+    ["*", ""],
+    ["(Crit Rate secondary stat weapon only)", ""],
+
+    # Canonicalize names
+    ["15% Anemo DMG Set", "15% Anemo DMG set"],
+    ["15% Healing Bonus", "15% Healing Bonus set"],
+    ["15% Healing Bonus set set", "15% Healing Bonus set"],  # alas
+    ["15% Hydro DMG Bonus set", "15% Hydro DMG set"],
+    ["18 ATK% set", "18% ATK set"],
+    ["18% ATK Set", "18% ATK set"],
+    ["20% ER Set", "20% Energy Recharge set"],
+    ["20% ER set", "20% Energy Recharge set"],
+    ["20% HP", "20% HP set"],
+    ["20% HP set set", "20% HP set"],  # alas again
+    ["80 EM", "80 EM set"],
+    ["80 EM set set", "80 EM set"],  # alas again again
+    ["Emblem Of Severed Fate", "Emblem of Severed Fate"],
+    ["Marechausse Hunter", "Marechaussee Hunter"],
+    ["Ocean Hued Clam", "Ocean-Hued Clam"],
+    ["Desert Pavillion Chronicle", "Desert Pavilion Chronicle"],
+    ["Silken Moon Serenade", "Silken Moon's Serenade"],
+
+    # Set category expansions; assume only 5 star sets matter
+    ["15% Anemo DMG set", "15% Anemo DMG set|Viridescent Venerer|Desert Pavilion Chronicle"],
+    ["15% Cryo DMG set", "15% Cryo DMG set|Blizzard Strayer|Finale of the Deep Galleries"],
+    ["15% Healing Bonus set", "15% Healing Bonus set|Maiden Beloved|Ocean-Hued Clam|Song of Days Past"],
+    ["15% Hydro DMG set", "15% Hydro DMG set|Heart of Depth|Nymph's Dream"],
+    ["18% ATK set", "18% ATK set|Gladiator's Finale|Shimenawa's Reminiscence|Vermillion Hereafter|Echoes of an Offering|Nighttime Whispers in the Echoing Woods|Fragment of Harmonic Whimsy|Unfinished Reverie"],
+    ["20% Energy Recharge set", "20% Energy Recharge set|Emblem of Severed Fate"],
+    ["20% HP set", "20% HP set|Tenacity of the Millelith|Vourukasha's Glow"],
+    ["25% Physical DMG set", "25% Physical DMG set|Bloodstained Chivalry|Pale Flame"],
+    ["80 EM set", "80 EM set|Wanderer's Troupe|Gilded Dreams|Flower of Paradise Lost"],
+]
+ARTIFACT_SET_NAME_PASSES = compile_replacements(ARTIFACT_SET_NAME_REPLACEMENTS)
+
+STAT_REPLACEMENTS = [
+    # Remove extraneous text
+    ["*", ""],
+    ["until requirement is met", ""],
+    ["until requirement", ""],
+
+    # Canonicalize naming
+    ["Atk%", "ATK%"],
+    ["Anemo Damage", "Anemo DMG"],
+    ["Crit Rate%", "Crit Rate"],
+    ["CRIT Rate", "Crit Rate"],
+    ["CRIT", "Crit Rate|Crit DMG"],
+    ["Cryo DMG%", "Cryo DMG"],
+    ["Electro Damage", "Electro DMG"],
+    ["Electro DMG%", "Electro DMG"],
+    ["Energy Recharge%", "Energy Recharge"],
+    ["ER%", "Energy Recharge"],
+    ["Flat DEF", "DEF"],
+    ["Geo DMG%", "Geo DMG"],
+    ["Healing Bonus%", "Healing Bonus"],
+    ["Physical DMG%", "Physical DMG"],
+    ["Pyro DMG%", "Pyro DMG"],
+
+    # Use "|" as a consistent delimiter
+    ["/", "|"],
+    ["+", "|"],
+    [" and ", "|"],
+    ["~=", "|"],
+    ["=", "|"],
+    ["≈", "|"],
+]
+STAT_PASSES = compile_replacements(STAT_REPLACEMENTS)
+
+
+@functools.lru_cache(maxsize=CANONICALIZATION_CACHE_SIZE)
+def canonical_artifact_set_names(artifact_sets_names_text):
+    artifact_sets_names_text = apply_replacements(ARTIFACT_SET_NAME_PASSES, artifact_sets_names_text).strip()
 
     ns = [name.strip() for name in artifact_sets_names_text.split("|") if name]
     seen = {"", "Any", "set"}  # don't include meaningless artifact set text
@@ -191,40 +727,52 @@ def clean_and_split_artifact_set_names(artifact_sets_names_text):
         if n not in seen:
             uniques.append(n)
             seen.add(n)
-    return uniques
+    return tuple(uniques)
 
-def clean_and_split_stats(stat):
-    if not isinstance(stat, str):
-        return []
-    
+
+def clean_and_split_artifact_set_names(artifact_sets_names_text):
+    return list(canonical_artifact_set_names(artifact_sets_names_text))
+
+
+@functools.lru_cache(maxsize=CANONICALIZATION_CACHE_SIZE)
+def canonical_stats(stat):
     # Remove extraneous text
     stat = re.sub(r'\(.*?\)', '', stat)
     stat = re.sub(r'\[.*?\]', '', stat)
-    stat = stat.replace("*", "")
-    stat = stat.replace("until requirement is met", "")
-    stat = stat.replace("until requirement", "")
 
-    # Canonicalize naming
-    stat = stat.replace("Atk%", "ATK%")
-    stat = stat.replace("Anemo Damage", "Anemo DMG")
-    stat = stat.replace("Crit Rate%", "Crit Rate")
-    stat = stat.replace("CRIT Rate", "Crit Rate")
-    stat = stat.replace("CRIT", "Crit Rate|Crit DMG")
-    stat = stat.replace("Cryo DMG%", "Cryo DMG")
-    stat = stat.replace("Electro Damage", "Electro DMG")
-    stat = stat.replace("Electro DMG%", "Electro DMG")
-    stat = stat.replace("Energy Recharge%", "Energy Recharge")
-    stat = stat.replace("ER%", "Energy Recharge")
-    stat = stat.replace("Flat DEF", "DEF")
-    stat = stat.replace("Geo DMG%", "Geo DMG")
-    stat = stat.replace("Healing Bonus%", "Healing Bonus")
-    stat = stat.replace("Physical DMG%", "Physical DMG")
-    stat = stat.replace("Pyro DMG%", "Pyro DMG")
-
-    separators = ["/", "+", " and ", "~=", "=", "≈"]
-    for sep in separators:
-        stat = stat.replace(sep, "|")  # Use a consistent delimiter
-    return [("Crit DMG" if s.strip() == "DMG" else s.strip()) for s in stat.split("|") if s.strip()]
+    stat = apply_replacements(STAT_PASSES, stat)
+    return tuple(("Crit DMG" if s.strip() == "DMG" else s.strip()) for s in stat.split("|") if s.strip())
+
+
+def clean_and_split_stats(stat):
+    if not isinstance(stat, str):
+        return []
+    return list(canonical_stats(stat))
+
+
+CANONICALIZATION_CACHES = {
+    'Artifact set names': canonical_artifact_set_names,
+    'Stats': canonical_stats,
+}
+# Added to this process's hits and misses: those of worker processes, whose own caches die with them,
+# less those of the --check-expansion reference run, which is not part of the build. Entry counts
+# are not kept: a string cached by several workers would be counted once per worker.
+cache_count_offsets = {label: [0, 0] for label in CANONICALIZATION_CACHES}
+
+
+def cache_counters():
+    return {label: cached.cache_info() for label, cached in CANONICALIZATION_CACHES.items()}
+
+
+def canonicalization_cache_stats():
+    """Hits and misses of each canonicalization cache, worker processes included."""
+    stats = {}
+    for label, cache_info in cache_counters().items():
+        hits, misses = (own + worker for own, worker in
+                        zip((cache_info.hits, cache_info.misses), cache_count_offsets[label]))
+        stats[label] = {'hits': hits, 'misses': misses}
+    return stats
+
 
 def extract_rank(text):
     if isinstance(text, str) and text.strip():
@@ -233,317 +781,1383 @@ def extract_rank(text):
             return int(parts[0]), parts[1].strip()
     return None, text.strip() if isinstance(text, str) else text
 
-# Enhanced data processing
-enhanced_data_v2 = []
-
-for _, row in df_final_cleaned.iterrows():
-    character = row["Character"]
-    preferred_role = "✩" in row["Role"] if isinstance(row["Role"], str) else False
-    role = re.sub(r'[\r\n]+', ' ', row["Role"]).replace("✩", "").strip()
-    artifact_sets_lines = row["Artifact Sets"]
-    main_stat_lines = row["Main Stats"]
-    substat_lines = row["Substats"]
-
-    for artifact_sets_line in artifact_sets_lines:
-        artifact_rank, artifact_set_names_text = extract_rank(artifact_sets_line)
-        if artifact_rank is None:
-            validation_counts['artifact_lines_no_rank'] += 1
+OUTPUT_COLUMNS = [
+    "Character",
+    "Role",
+    "Preferred Role",
+    "Artifact Set",
+    "Artifact Set Rank",
+    "Artifact Slot",
+    "Main Stat",
+    "Substat",
+    "Substat Rank",
+]
+# In memory and in the columnar files, the low-cardinality text columns are categoricals and the
+# ranks the smallest integer type that holds them (int8 for any real sheet)
+RANK_COLUMNS = ["Artifact Set Rank", "Substat Rank"]
+CATEGORY_COLUMNS = [column for column in OUTPUT_COLUMNS if column not in RANK_COLUMNS + ["Preferred Role"]]
+EXPANSION_COUNT_KEYS = [
+    'artifact_lines_no_rank',
+    'main_stat_lines_no_slot',
+    'substat_lines_no_rank',
+    'skipped_duplicate_main_substat',
+]
+
+
+def expand_rows_loop(df_final_cleaned):
+    """Reference expansion: one output row per set x main stat x substat, built row by row.
+
+    Returns the rows (indexed by their source row) and the per-source-row skip counts.
+    """
+    import pandas as pd
+
+    enhanced_data_v2 = []
+    source_rows = []
+    row_counts = []
+
+    for source_row, row in df_final_cleaned.iterrows():
+        counts = dict.fromkeys(EXPANSION_COUNT_KEYS, 0)
+        row_counts.append(counts)
+        character = row["Character"]
+        preferred_role = "✩" in row["Role"] if isinstance(row["Role"], str) else False
+        role = re.sub(r'[\r\n]+', ' ', row["Role"]).replace("✩", "").strip()
+        artifact_sets_lines = row["Artifact Sets"]
+        main_stat_lines = row["Main Stats"]
+        substat_lines = row["Substats"]
+
+        for artifact_sets_line in artifact_sets_lines:
+            artifact_rank, artifact_set_names_text = extract_rank(artifact_sets_line)
+            if artifact_rank is None:
+                counts['artifact_lines_no_rank'] += 1
+                continue
+            artifact_set_names = clean_and_split_artifact_set_names(artifact_set_names_text)
+            for artifact_set_name in artifact_set_names:
+                for main_stat_line in main_stat_lines:
+                    # Split main stats by slashes and clean
+                    slot_stat_parts = main_stat_line.split(" - ")
+                    slot = slot_stat_parts[0].strip() if len(slot_stat_parts) > 1 else None
+                    if slot is None:
+                        counts['main_stat_lines_no_slot'] += 1
+                        continue
+                    main_stats = clean_and_split_stats(slot_stat_parts[1]) if len(slot_stat_parts) > 1 else []
+                    for stat in main_stats:
+                        for substat_line in substat_lines:
+                            substat_rank, substat_text = extract_rank(substat_line)
+                            if substat_rank is None:
+                                counts['substat_lines_no_rank'] += 1
+                                continue
+                            substat_names = clean_and_split_stats(substat_text)
+                            for substat_name in substat_names:
+                                if stat == substat_name:
+                                    counts['skipped_duplicate_main_substat'] += 1
+                                    continue  # Skip duplicate main and substats; can't be rolled
+                                source_rows.append(source_row)
+                                enhanced_data_v2.append({
+                                    "Character": character,
+                                    "Role": role,
+                                    "Preferred Role": preferred_role,
+                                    "Artifact Set": artifact_set_name,
+                                    "Artifact Set Rank": artifact_rank,
+                                    "Artifact Slot": slot,
+                                    "Main Stat": stat,
+                                    "Substat": substat_name,
+                                    "Substat Rank": substat_rank
+                                })
+
+    return (
+        pd.DataFrame(enhanced_data_v2, index=source_rows),
+        pd.DataFrame(row_counts, index=df_final_cleaned.index, columns=EXPANSION_COUNT_KEYS),
+    )
+
+
+def explode_lines(series, parse_line):
+    """Explode a column of line lists into (source row, parsed line) pairs, parsing each distinct line once."""
+    import numpy as np
+    import pandas as pd
+
+    lines = series.explode().dropna()
+    parsed = {line: parse_line(line) for line in lines.unique()}
+    return pd.DataFrame({
+        'row': lines.index.to_numpy(dtype=np.int64),
+        'parsed': [parsed[line] for line in lines],
+    })
+
+
+def parse_ranked_names(line, split_names):
+    """Parse a ranked 'N. text' line into (rank, names), or (None, []) if unranked."""
+    rank, text = extract_rank(line)
+    if rank is None:
+        return None, []
+    return rank, split_names(text)
+
+
+def parse_main_stat_line(line):
+    """Parse a 'Slot - stats' line into (slot, main stats), or (None, []) if there is no slot."""
+    slot_stat_parts = line.split(" - ")
+    if len(slot_stat_parts) < 2:
+        return None, []
+    return slot_stat_parts[0].strip(), clean_and_split_stats(slot_stat_parts[1])
+
+
+def explode_pairs(lines, key_name, value_name, seq_name):
+    """Explode (key, [values]) parses into one row per value, numbered in source order."""
+    import numpy as np
+    import pandas as pd
+
+    keys = [parsed[0] for parsed in lines['parsed']]
+    values = [parsed[1] for parsed in lines['parsed']]
+    frame = pd.DataFrame({'row': lines['row'].to_numpy(dtype=np.int64), key_name: keys, value_name: values})
+    frame = frame[frame[key_name].notna()].explode(value_name).dropna(subset=[value_name])
+    frame[seq_name] = range(len(frame))
+    return frame.reset_index(drop=True)
+
+
+def expand_rows_columnar(df_final_cleaned):
+    """Columnar expansion: explode each field once, then join sets x main stats x substats per row.
+
+    Produces the same rows, in the same order, and the same counts as expand_rows_loop.
+    """
+    import numpy as np
+    import pandas as pd
+
+    df = df_final_cleaned.reset_index(drop=True)
+
+    set_lines = explode_lines(
+        df['Artifact Sets'], lambda line: parse_ranked_names(line, clean_and_split_artifact_set_names)
+    )
+    main_lines = explode_lines(df['Main Stats'], parse_main_stat_line)
+    substat_lines = explode_lines(df['Substats'], lambda line: parse_ranked_names(line, clean_and_split_stats))
+
+    sets = explode_pairs(set_lines, 'Artifact Set Rank', 'Artifact Set', 'set_seq')
+    mains = explode_pairs(main_lines, 'Artifact Slot', 'Main Stat', 'main_seq')
+    substats = explode_pairs(substat_lines, 'Substat Rank', 'Substat', 'sub_seq')
+
+    # The loop path counts skipped lines once per enclosing iteration, so weight them the same way.
+    n_rows = len(df)
+    sets_per_row = np.bincount(sets['row'].to_numpy(dtype=np.int64), minlength=n_rows)
+    stats_per_row = np.bincount(mains['row'].to_numpy(dtype=np.int64), minlength=n_rows)
+    unranked_sets = np.array([parsed[0] is None for parsed in set_lines['parsed']], dtype=bool)
+    no_slot_mains = np.array([parsed[0] is None for parsed in main_lines['parsed']], dtype=bool)
+    unranked_substats = np.array([parsed[0] is None for parsed in substat_lines['parsed']], dtype=bool)
+    no_slot_per_row = np.bincount(main_lines['row'].to_numpy()[no_slot_mains], minlength=n_rows)
+    unranked_substats_per_row = np.bincount(substat_lines['row'].to_numpy()[unranked_substats], minlength=n_rows)
+    unranked_sets_per_row = np.bincount(set_lines['row'].to_numpy()[unranked_sets], minlength=n_rows)
+
+    expanded = sets.merge(mains, on='row').merge(substats, on='row')
+    duplicate_main_substat = (expanded['Main Stat'] == expanded['Substat']).to_numpy()
+    duplicates_per_row = np.bincount(expanded['row'].to_numpy()[duplicate_main_substat], minlength=n_rows)
+    row_counts = pd.DataFrame({
+        'artifact_lines_no_rank': unranked_sets_per_row,
+        'main_stat_lines_no_slot': sets_per_row * no_slot_per_row,
+        'substat_lines_no_rank': sets_per_row * stats_per_row * unranked_substats_per_row,
+        'skipped_duplicate_main_substat': duplicates_per_row,
+    }, index=df_final_cleaned.index)
+    expanded = expanded[~duplicate_main_substat].sort_values(['set_seq', 'main_seq', 'sub_seq'], kind='stable')
+
+    roles = df['Role']
+    rows = expanded['row'].to_numpy()
+    preferred = roles.map(lambda role: "✩" in role if isinstance(role, str) else False).to_numpy(dtype=bool)
+    cleaned_roles = roles.str.replace(r'[\r\n]+', ' ', regex=True).str.replace("✩", "").str.strip()
+    rows_df = pd.DataFrame({
+        "Character": df['Character'].to_numpy(dtype=object)[rows],
+        "Role": cleaned_roles.to_numpy(dtype=object)[rows],
+        "Preferred Role": preferred[rows],
+        "Artifact Set": expanded['Artifact Set'].to_numpy(dtype=object),
+        "Artifact Set Rank": expanded['Artifact Set Rank'].to_numpy(dtype=np.int64),
+        "Artifact Slot": expanded['Artifact Slot'].to_numpy(dtype=object),
+        "Main Stat": expanded['Main Stat'].to_numpy(dtype=object),
+        "Substat": expanded['Substat'].to_numpy(dtype=object),
+        "Substat Rank": expanded['Substat Rank'].to_numpy(dtype=np.int64),
+    }, columns=OUTPUT_COLUMNS, index=df_final_cleaned.index[rows])
+    return rows_df, row_counts
+
+
+EXPANSION_ENGINES = {
+    'columnar': expand_rows_columnar,
+    'loop': expand_rows_loop,
+}
+
+
+def compact_dtypes(df):
+    """Flattened rows with categorical text columns and downcast ranks."""
+    import pandas as pd
+
+    df = df.astype({column: 'category' for column in CATEGORY_COLUMNS})
+    for column in RANK_COLUMNS:
+        df[column] = pd.to_numeric(df[column], downcast='integer')
+    return df
+
+
+def expand_blocks(df_blocks, engine):
+    """Expand a run of whole, normalized character blocks; runs in a worker process with --workers.
+
+    In a worker, also returns how much this call moved the canonicalization cache counters.
+    """
+    before = cache_counters()
+    df_rows, row_counts = EXPANSION_ENGINES[engine](df_blocks)
+    if multiprocessing.parent_process() is None:
+        return df_rows, row_counts, None
+    after = cache_counters()
+    cache_counts = {
+        label: [after[label].hits - before[label].hits, after[label].misses - before[label].misses]
+        for label in after
+    }
+    return df_rows, row_counts, cache_counts
+
+def empty_block_cache():
+    """A block cache with no blocks and no index, tagged with the current parser and index code."""
+    return {'parser': parser_fingerprint(), 'index': index_fingerprint(), 'blocks': {}, 'order': [], 'web_json': None}
+
+
+def load_block_cache(path):
+    """Load cached block expansions and the index built from them, or an empty cache if missing or stale."""
+    try:
+        with open(path, 'rb') as f:
+            cache = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        cache = None
+    if not cache or cache.get('parser') != parser_fingerprint():
+        cache = empty_block_cache()
+    if cache.get('index') != index_fingerprint():
+        cache['index'], cache['web_json'] = index_fingerprint(), None
+    return cache
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w', **open_kwargs):
+    """Write to a temp file beside path and move it into place only if the block succeeds."""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, mode, **open_kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_output_manifest(path=OUTPUT_MANIFEST_PATH):
+    """The output manifest ({'files': {path relative to output/: {'sha256', 'bytes', 'variants'}}}), or an empty one."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'files': {}}
+
+
+def save_output_manifest(manifest, path=OUTPUT_MANIFEST_PATH):
+    """Write the manifest (sorted, no timestamps, so identical builds give identical bytes) if it changed."""
+    content = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path, 'wb') as f:
+        f.write(content)
+
+
+def output_key(path):
+    """path relative to the output directory, as the manifest and the shard map name it."""
+    return os.path.relpath(path, os.path.dirname(OUTPUT_MANIFEST_PATH)).replace(os.sep, '/')
+
+
+PRECOMPRESSED_SUFFIXES = ['.gz', '.br']
+
+
+def precompressed_variants(data):
+    """gzip and brotli copies of data a static host can serve as-is, keyed by file suffix.
+
+    gzip's header mtime is pinned so the bytes depend only on data. The levels are chosen for build
+    time: on the 10x plain index, gzip 9 and brotli 9 take about 4x and 2x as long for 6-9% smaller files.
+    """
+    import brotli
+
+    return {'.gz': gzip.compress(data, compresslevel=6, mtime=0), '.br': brotli.compress(data, quality=7)}
+
+
+def write_output(path, content, manifest, precompress=False):
+    """Write content (bytes, or a list of bytes chunks) to path unless the manifest has it unchanged.
+
+    A file whose sha256 matches its manifest entry, and which is still on disk with its siblings,
+    is left alone, mtime included. With precompress, .gz and .br siblings are written beside it.
+    Records the file in manifest (the caller saves it); returns True if the file was written.
+    """
+    chunks = [content] if isinstance(content, bytes) else content
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    entry = {'sha256': digest.hexdigest(), 'bytes': sum(len(chunk) for chunk in chunks)}
+    if precompress:
+        entry['variants'] = PRECOMPRESSED_SUFFIXES
+    key = output_key(path)
+    siblings = [path + suffix for suffix in entry.get('variants', [])]
+    if manifest['files'].get(key) == entry and all(os.path.exists(p) for p in [path] + siblings):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path, 'wb') as f:
+        f.writelines(chunks)
+    if precompress:
+        for suffix, compressed in precompressed_variants(b''.join(chunks)).items():
+            with atomic_write(path + suffix, 'wb') as f:
+                f.write(compressed)
+    manifest['files'][key] = entry
+    return True
+
+
+def move_output(tmp_path, path, manifest):
+    """Move a finished file at tmp_path (beside path) into place unless the manifest has path unchanged.
+
+    Like write_output() for outputs built on disk: one os.replace, no copy. An unchanged file is left
+    alone, mtime included, and tmp_path is removed. Records path in manifest; returns True if it moved.
+    """
+    entry = {'sha256': file_sha256(tmp_path), 'bytes': os.path.getsize(tmp_path)}
+    key = output_key(path)
+    if manifest['files'].get(key) == entry and os.path.exists(path):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    manifest['files'][key] = entry
+    return True
+
+
+def remove_output(path, manifest):
+    """Delete path and its precompressed siblings, if present, and drop it from the manifest."""
+    for p in [path] + [path + suffix for suffix in PRECOMPRESSED_SUFFIXES]:
+        if os.path.exists(p):
+            os.remove(p)
+    manifest['files'].pop(output_key(path), None)
+
+
+def save_block_cache(path, cache):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path, 'wb') as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def expand_character_blocks(df_final_cleaned, block_cache, validation_counts, metrics, workers=1, expansion='columnar'):
+    """Flatten every block into output rows, in sheet order, adding its skip counts to validation_counts.
+
+    Only blocks whose fingerprint is not in block_cache are normalized and expanded; their rows are
+    added to the cache. Returns the flattened rows and the blocks' fingerprints in sheet order.
+    """
+    import numpy as np
+    import pandas as pd
+
+    begin_stage(metrics, 'normalize')
+    cached_blocks = block_cache['blocks']
+    # Identical blocks share a fingerprint; only the first is expanded, and its rows are patched in for each
+    first_blocks = df_final_cleaned.drop_duplicates('Fingerprint')['Block']
+    fresh_rows = ~df_final_cleaned['Fingerprint'].isin(cached_blocks) & df_final_cleaned['Block'].isin(first_blocks)
+    df_fresh_blocks = df_final_cleaned[fresh_rows]
+    # Shard by whole blocks, keeping sheet order, so concatenating shard results matches a serial run
+    shard_blocks = np.array_split(df_fresh_blocks['Block'].unique(), max(1, min(workers, len(df_fresh_blocks))))
+    shards = [df_fresh_blocks[df_fresh_blocks['Block'].isin(blocks)] for blocks in shard_blocks]
+    stage_rows(metrics, rows_in=len(df_fresh_blocks), rows_out=len(df_fresh_blocks))
+    shards = map_in_workers(normalize_fields, shards, workers=workers)
+
+    begin_stage(metrics, 'expand', rows_in=len(df_final_cleaned))
+    shard_results = map_in_workers(expand_blocks, shards, [expansion] * len(shards), workers=workers)
+    df_fresh = pd.concat([rows for rows, _, _ in shard_results])
+    fresh_row_counts = pd.concat([row_counts for _, row_counts, _ in shard_results])
+    for _, _, cache_counts in shard_results:
+        for label, counts in (cache_counts or {}).items():
+            cache_count_offsets[label] = [total + count for total, count in zip(cache_count_offsets[label], counts)]
+    fresh_fingerprints = df_final_cleaned['Fingerprint']
+    fresh_counts = fresh_row_counts.groupby(fresh_fingerprints.loc[fresh_row_counts.index]).sum()
+    fresh_block_rows = dict(iter(df_fresh.groupby(fresh_fingerprints.loc[df_fresh.index].to_numpy(), sort=False)))
+    for fingerprint in fresh_counts.index:
+        block_rows = fresh_block_rows.get(fingerprint)
+        cached_blocks[fingerprint] = {
+            'rows': block_rows.reset_index(drop=True) if block_rows is not None else None,
+            'counts': {key: int(value) for key, value in fresh_counts.loc[fingerprint].items()},
+        }
+
+    # Patch the flattened frame together from per-block rows, in sheet order
+    block_order = df_final_cleaned.drop_duplicates('Block')['Fingerprint'].tolist()
+    block_frames = [cached_blocks[fp]['rows'] for fp in block_order if cached_blocks[fp]['rows'] is not None]
+    df_enhanced_v2 = compact_dtypes(
+        pd.concat(block_frames, ignore_index=True) if block_frames else pd.DataFrame(columns=OUTPUT_COLUMNS)
+    )
+    for fingerprint in block_order:
+        for key, value in cached_blocks[fingerprint]['counts'].items():
+            validation_counts[key] += value
+    stage_rows(metrics, rows_out=len(df_enhanced_v2))
+    return df_enhanced_v2, block_order
+
+
+def check_expansion_against_loop(df_final_cleaned, df_enhanced_v2, validation_counts):
+    """Fail unless the reference loop expansion gives the same rows and skip counts.
+
+    The reference run's canonicalization cache hits and misses are left out of the build's.
+    """
+    import pandas as pd
+
+    before = cache_counters()
+    df_reference, reference_row_counts = expand_rows_loop(normalize_fields(df_final_cleaned))
+    for label, after in cache_counters().items():
+        cache_count_offsets[label][0] -= after.hits - before[label].hits
+        cache_count_offsets[label][1] -= after.misses - before[label].misses
+    pd.testing.assert_frame_equal(df_enhanced_v2, compact_dtypes(df_reference.reset_index(drop=True)))
+    for key in EXPANSION_COUNT_KEYS:
+        assert validation_counts[key] == reference_row_counts[key].sum(), f"{key} differs from the reference loop"
+
+
+def index_changes(block_cache, block_order):
+    """The cached index and the rows of blocks added or removed since it was built, or (None, None).
+
+    The index can only be patched when the blocks both builds share are still in the same order;
+    otherwise it is rebuilt in full.
+    """
+    import pandas as pd
+
+    cached_blocks = block_cache['blocks']
+    previous_order = block_cache['order']
+    current_blocks, previous_blocks = set(block_order), set(previous_order)
+    kept_order = [fp for fp in block_order if fp in previous_blocks]
+    if block_cache['web_json'] is None or kept_order != [fp for fp in previous_order if fp in current_blocks]:
+        return None, None
+    changed_block_frames = [
+        cached_blocks[fp]['rows'] for fp in current_blocks ^ previous_blocks
+        if cached_blocks[fp]['rows'] is not None
+    ]
+    changed_rows = (
+        pd.concat(changed_block_frames, ignore_index=True) if changed_block_frames
+        else pd.DataFrame(columns=OUTPUT_COLUMNS)
+    )
+    return block_cache['web_json'], changed_rows
+
+
+def write_dataset(df_enhanced_v2, metrics, manifest, formats=('csv', 'arrow')):
+    """Write flattened rows in each of formats (keys of DATASET_PATHS), skipping files whose content is unchanged.
+
+    The Arrow file is uncompressed so load_dataset() can memory-map it; Parquet is the compressed
+    copy for archiving and other tools. Both keep the categorical columns dictionary-encoded.
+    The SQLite database is normalized and indexed for ad-hoc lookups (see recommendations_db).
+    Formats not written this build are dropped from the manifest (their files stay on disk).
+    """
+    begin_stage(metrics, 'dataset', rows_in=len(df_enhanced_v2))
+    for dataset_format, path in DATASET_PATHS.items():
+        if dataset_format not in formats:
+            manifest['files'].pop(output_key(path), None)
+            continue
+        if dataset_format == 'csv':
+            # Flattened rows as (pipe delimited) CSV
+            content = df_enhanced_v2.to_csv(index=False, sep='|').encode('utf-8')
+        elif dataset_format in ('arrow', 'parquet'):
+            buffer = io.BytesIO()
+            if dataset_format == 'arrow':
+                df_enhanced_v2.to_feather(buffer, compression='uncompressed')
+            else:
+                df_enhanced_v2.to_parquet(buffer, index=False)
+            content = buffer.getvalue()
+        else:
+            import recommendations_db
+
+            # Built in a temp file beside path, then hashed and moved into place (or dropped if unchanged)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            recommendations_db.build_database(df_enhanced_v2, f"{path}.tmp")
+            move_output(f"{path}.tmp", path, manifest)
             continue
-        artifact_set_names = clean_and_split_artifact_set_names(artifact_set_names_text)
-        for artifact_set_name in artifact_set_names:
-            for main_stat_line in main_stat_lines:
-                # Split main stats by slashes and clean
-                slot_stat_parts = main_stat_line.split(" - ")
-                slot = slot_stat_parts[0].strip() if len(slot_stat_parts) > 1 else None
-                if slot is None:
-                    validation_counts['main_stat_lines_no_slot'] += 1
-                    continue
-                main_stats = clean_and_split_stats(slot_stat_parts[1]) if len(slot_stat_parts) > 1 else []
-                for stat in main_stats:
-                    for substat_line in substat_lines:
-                        substat_rank, substat_text = extract_rank(substat_line)
-                        if substat_rank is None:
-                            validation_counts['substat_lines_no_rank'] += 1
-                            continue
-                        substat_names = clean_and_split_stats(substat_text)
-                        for substat_name in substat_names:
-                            if stat == substat_name:
-                                validation_counts['skipped_duplicate_main_substat'] += 1
-                                continue  # Skip duplicate main and substats; can't be rolled
-                            enhanced_data_v2.append({
-                                "Character": character,
-                                "Role": role,
-                                "Preferred Role": preferred_role,
-                                "Artifact Set": artifact_set_name,
-                                "Artifact Set Rank": artifact_rank,
-                                "Artifact Slot": slot,
-                                "Main Stat": stat,
-                                "Substat": substat_name,
-                                "Substat Rank": substat_rank
-                            })
-
-# Convert enhanced data v2 to DataFrame, write to (pipe delimited) CSV file
-df_enhanced_v2 = pd.DataFrame(enhanced_data_v2)
-validation_counts['final_output_rows'] = len(df_enhanced_v2)
-os.makedirs("output", exist_ok=True)
-df_enhanced_v2.to_csv("output/output.csv", index=False, sep='|')
-
-
-def generate_web_json(df):
-    """Generate optimized JSON for the web artifact evaluator."""
+        write_output(path, content, manifest)
+    stage_rows(metrics, rows_out=len(df_enhanced_v2))
+
+
+def load_dataset(path=DATASET_PATHS['arrow'], dataset_format=None):
+    """Load flattened rows written by write_dataset(), with the same dtypes the build used.
+
+    An Arrow file is memory-mapped rather than parsed (pyarrow.feather.read_table(path, memory_map=True)
+    gives the zero-copy table itself); CSV is parsed and compacted. path may also be a file object, whose
+    dataset_format (a key of DATASET_PATHS) must then be given.
+    """
+    import pandas as pd
+
+    dataset_format = dataset_format or os.path.splitext(path)[1].lstrip('.')
+    if dataset_format == 'arrow':
+        from pyarrow import feather
+
+        return feather.read_table(path, memory_map=isinstance(path, str)).to_pandas()
+    if dataset_format == 'parquet':
+        return pd.read_parquet(path)
+    return compact_dtypes(pd.read_csv(path, sep='|', keep_default_na=False))
+
+
+def last_dataset_format(manifest_files):
+    """Format of the dataset file the build that wrote manifest_files left (Arrow, else Parquet, else CSV), or None."""
+    # The manifest lists the formats the last build wrote (files skipped as unchanged keep old mtimes)
+    for dataset_format in ('arrow', 'parquet', 'csv'):
+        path = DATASET_PATHS[dataset_format]
+        if output_key(path) in manifest_files and os.path.exists(path):
+            return dataset_format
+    return None
+
+
+def read_last_dataset(manifest):
+    """The last build's dataset file as (format, manifest entry, content), or None if there was no build.
+
+    Read whole (not memory-mapped), so this build can replace the file before the content is diffed.
+    """
+    dataset_format = last_dataset_format(manifest['files'])
+    if dataset_format is None:
+        return None
+    path = DATASET_PATHS[dataset_format]
+    with open(path, 'rb') as f:
+        return dataset_format, manifest['files'][output_key(path)], f.read()
+
+
+# A row's identity across builds: rows of two builds with these values are the same recommendation
+DIFF_KEYS = ['Character', 'Role', 'Artifact Set', 'Artifact Slot', 'Main Stat', 'Substat']
+# Odd 64-bit multiplier (the FNV prime) folding the per-column hashes into one key per prefix of DIFF_KEYS
+DIFF_HASH_MULTIPLIER = 0x100000001B3
+
+
+def diff_keys(frame):
+    """Hashed join keys of flattened rows, as arrays: character+role, set and row keys, ranks and row position.
+
+    The keys hash values (not categorical codes), so they agree across builds and dtypes. 'index' is
+    the row keys as a pandas Index, unique: a row listed twice keeps only its best ranks.
+    """
+    import numpy as np
+    import pandas as pd
+
+    prefix_keys = {}
+    key = np.zeros(len(frame), dtype=np.uint64)
+    for column in DIFF_KEYS:
+        key = key * np.uint64(DIFF_HASH_MULTIPLIER) ^ pd.util.hash_pandas_object(frame[column], index=False).to_numpy()
+        prefix_keys[column] = key
+    keys = {
+        'character': prefix_keys['Role'],
+        'set': prefix_keys['Artifact Set'],
+        'row': key,
+        'set_rank': frame['Artifact Set Rank'].to_numpy(),
+        'substat_rank': frame['Substat Rank'].to_numpy(),
+        'position': np.arange(len(frame)),
+    }
+    index = pd.Index(key)
+    if index.has_duplicates:
+        # Of each run of equal keys keep the row with the best ranks; only the repeated rows are sorted
+        repeated = np.flatnonzero(index.duplicated(keep=False))
+        best_first = repeated[np.lexsort((keys['substat_rank'][repeated], keys['set_rank'][repeated]))]
+        keep = np.ones(len(key), dtype=bool)
+        keep[best_first] = ~pd.Index(key[best_first]).duplicated()
+        keys = {name: values[keep] for name, values in keys.items()}
+        index = pd.Index(keys['row'])
+    keys['index'] = index
+    return keys
+
+
+def diff_datasets(previous, current):
+    """Keyed diff of two builds' flattened rows: the recommendations added, removed and re-ranked.
+
+    Rows are matched by a hash join on their DIFF_KEYS, character+roles and their sets by hashes of
+    the leading keys; only changed rows are looked up and labelled. Returns the changes.json payload:
+    row counts, and per changed character+role its status ('added', 'removed' or 'changed'), row counts,
+    the sets it gained, lost or re-ranked ('from'/'to' set rank, null where absent) and, within sets
+    both builds recommend to it, the substats added, removed ([substat, rank]) or re-ranked ([substat,
+    from, to]). Substat changes are listed once per group of sets and [slot, main stat] cells they
+    apply to alike, as a sheet edit to a character's substats shows up in every set it wears.
+    """
+    import numpy as np
+    import pandas as pd
+
+    old, new = diff_keys(previous), diff_keys(current)
+    # The join: each new row's position among the old rows' keys, -1 where the previous build had no such row
+    old_positions = old['index'].get_indexer(new['index'])
+    kept = old_positions >= 0
+    old_kept = np.zeros(len(old['index']), dtype=bool)
+    old_kept[old_positions[kept]] = True
+    old_position = np.where(kept, old_positions, 0)
+    old_ranks = {'set_rank_old': old['set_rank'][old_position], 'substat_rank_old': old['substat_rank'][old_position]}
+    set_reranked = kept & (new['set_rank'] != old_ranks['set_rank_old'])
+    substat_reranked = kept & (new['substat_rank'] != old_ranks['substat_rank_old'])
+
+    def rows(keys, mask, **columns):
+        """Frame of the keys (and extra columns) of the rows in mask; only changed rows get this far."""
+        return pd.DataFrame({name: values[mask] for name, values in {**keys, **columns}.items() if name != 'index'})
+
+    added, removed = rows(new, ~kept), rows(old, ~old_kept)
+    reranked = rows(new, set_reranked | substat_reranked)
+    set_changes, substat_changes = rows(new, set_reranked, **old_ranks), rows(new, substat_reranked, **old_ranks)
+    old_sets, new_sets = pd.unique(old['set']), pd.unique(new['set'])
+    old_characters, new_characters = set(pd.unique(old['character']).tolist()), set(pd.unique(new['character']).tolist())
+
+    def labelled(frame, keys):
+        """Rows of keys (from diff_keys(frame)) with their DIFF_KEYS values, as named tuples."""
+        values = frame[DIFF_KEYS].iloc[keys['position'].to_numpy()].astype(object)
+        values.columns = ['name', 'role', 'artifact_set', 'slot', 'main_stat', 'substat']
+        return pd.concat([keys.reset_index(drop=True), values.reset_index(drop=True)], axis=1).itertuples()
+
+    entries = {}
+
+    def entry(row):
+        if (row.name, row.role) not in entries:
+            status = ('added' if row.character not in old_characters
+                      else 'removed' if row.character not in new_characters else 'changed')
+            entries[row.name, row.role] = {
+                'character': row.name, 'role': row.role, 'status': status,
+                'added': 0, 'removed': 0, 'reranked': 0, 'sets': [], 'cells': {},
+            }
+        return entries[row.name, row.role]
+
+    def cell(row):
+        return entry(row)['cells'].setdefault((row.artifact_set, row.slot, row.main_stat), {})
+
+    for frame, keys, count_name in ((current, added, 'added'), (previous, removed, 'removed'),
+                                    (current, reranked, 'reranked')):
+        counts = keys['character'].value_counts()
+        for row in labelled(frame, keys.drop_duplicates('character')):
+            entry(row)[count_name] = int(counts[row.character])
+
+    # Whole sets a character+role gained or lost, and sets both builds recommend to it at different ranks
+    for row in labelled(current, added[~added['set'].isin(old_sets)].drop_duplicates(['set', 'set_rank'])):
+        entry(row)['sets'].append({'set': row.artifact_set, 'from': None, 'to': int(row.set_rank)})
+    for row in labelled(previous, removed[~removed['set'].isin(new_sets)].drop_duplicates(['set', 'set_rank'])):
+        entry(row)['sets'].append({'set': row.artifact_set, 'from': int(row.set_rank), 'to': None})
+    for row in labelled(current, set_changes.drop_duplicates(['set', 'set_rank_old', 'set_rank'])):
+        entry(row)['sets'].append({'set': row.artifact_set, 'from': int(row.set_rank_old), 'to': int(row.set_rank)})
+
+    # Substat changes within those kept sets
+    for row in labelled(current, added[added['set'].isin(old_sets)]):
+        cell(row).setdefault('added', []).append([row.substat, int(row.substat_rank)])
+    for row in labelled(previous, removed[removed['set'].isin(new_sets)]):
+        cell(row).setdefault('removed', []).append([row.substat, int(row.substat_rank)])
+    for row in labelled(current, substat_changes):
+        cell(row).setdefault('reranked', []).append([row.substat, int(row.substat_rank_old), int(row.substat_rank)])
+
+    characters = []
+    for key in sorted(entries):
+        character = entries[key]
+        character['sets'].sort(key=lambda change: change['set'])
+        # Merge sets whose cell changed alike, then cells whose sets and changes match
+        sets_by_change = {}
+        for (artifact_set, slot, main_stat), changes in sorted(character.pop('cells').items()):
+            change_key = json.dumps(changes, sort_keys=True)
+            sets_by_change.setdefault((slot, main_stat, change_key), (changes, []))[1].append(artifact_set)
+        cells_by_change = {}
+        for (slot, main_stat, change_key), (changes, artifact_sets) in sets_by_change.items():
+            cells_by_change.setdefault((tuple(artifact_sets), change_key), (changes, []))[1].append([slot, main_stat])
+        character['substats'] = sorted(
+            ({'sets': list(artifact_sets), 'cells': cells, **changes}
+             for (artifact_sets, _), (changes, cells) in cells_by_change.items()),
+            key=lambda change: (change['cells'], change['sets']),
+        )
+        characters.append(character)
+    return {
+        'counts': {'rows': len(current), 'previousRows': len(previous), 'added': len(added),
+                   'removed': len(removed), 'reranked': len(reranked), 'characters': len(characters)},
+        'characters': characters,
+    }
+
+
+def write_changes(last_dataset, df_enhanced_v2, metrics, manifest):
+    """Diff this build's rows against the last build's (see read_last_dataset) and write changes.json.
+
+    Nothing is diffed when there was no previous build, or when this build's dataset file is
+    byte-identical to it; changes.json then keeps describing the last build that changed the rows.
+    Returns the changes written, or None.
+    """
+    begin_stage(metrics, 'diff', rows_in=len(df_enhanced_v2))
+    changes = None
+    current_format = last_dataset_format(manifest['files'])
+    if last_dataset is not None and current_format is not None:
+        dataset_format, previous_entry, content = last_dataset
+        # Compared with the same format's file when this build wrote one
+        current_entry = (manifest['files'].get(output_key(DATASET_PATHS[dataset_format]))
+                         or manifest['files'][output_key(DATASET_PATHS[current_format])])
+        if current_entry['sha256'] != previous_entry['sha256']:
+            changes = diff_datasets(load_dataset(io.BytesIO(content), dataset_format), df_enhanced_v2)
+            changes['datasets'] = {'previous': previous_entry['sha256'], 'current': current_entry['sha256']}
+            write_output(CHANGES_PATH, json.dumps(changes, separators=(',', ':')).encode('utf-8'), manifest)
+        elif os.path.exists(CHANGES_PATH):
+            # Kept, but still one of this build's outputs (a full rebuild starts from an empty manifest)
+            with open(CHANGES_PATH, 'rb') as f:
+                write_output(CHANGES_PATH, f.read(), manifest)
+    stage_rows(metrics, rows_out=changes['counts']['characters'] if changes else 0)
+    begin_stage(metrics)
+    return changes
+
+
+def load_changes():
+    """The changes.json the last build kept in its output manifest, or None."""
+    if output_key(CHANGES_PATH) not in load_output_manifest()['files'] or not os.path.exists(CHANGES_PATH):
+        return None
+    with open(CHANGES_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# summary.txt lists this many changed character+roles; changes.json has them all
+CHANGELOG_CHARACTERS = 40
+
+
+def changelog_lines(changes, limit=CHANGELOG_CHARACTERS):
+    """summary.txt lines for a changes.json payload: the totals, then one line per changed character+role."""
+    counts = changes['counts']
+    lines = [
+        f"Rows: {counts['previousRows']} -> {counts['rows']} ({counts['added']} added, {counts['removed']} removed, "
+        f"{counts['reranked']} re-ranked)",
+        f"Character+roles changed: {counts['characters']}",
+    ]
+    for character in changes['characters'][:limit]:
+        parts = [f"+{character['added']} -{character['removed']} ~{character['reranked']} rows"]
+        if character['sets']:
+            parts.append('sets ' + ', '.join(
+                f"+{change['set']} ({change['to']})" if change['from'] is None
+                else f"-{change['set']}" if change['to'] is None
+                else f"{change['set']} {change['from']}->{change['to']}"
+                for change in character['sets']
+            ))
+        for change in character['substats']:
+            substats = ([f"+{substat} ({rank})" for substat, rank in change.get('added', [])]
+                        + [f"-{substat}" for substat, _ in change.get('removed', [])]
+                        + [f"{substat} {old}->{new}" for substat, old, new in change.get('reranked', [])])
+            parts.append(f"substats {', '.join(substats)} in {len(change['cells'])} cell(s) of {len(change['sets'])} set(s)")
+        marker = {'added': '+', 'removed': '-', 'changed': '~'}[character['status']]
+        lines.append(f"  {marker} {character['character']} ({character['role']}): " + '; '.join(parts))
+    if len(changes['characters']) > limit:
+        lines.append(f"  ... and {len(changes['characters']) - limit} more in {CHANGES_PATH}")
+    return lines
+
+
+CELL_KEYS = ['Artifact Set', 'Artifact Slot', 'Main Stat']
+CHARACTER_KEYS = ['Character', 'Role']
+# Flower/Feather main stats are fixed, so the sheet never lists them; bySet aggregates them per set
+FIXED_SLOT = 'Flower/Feather'
+FIXED_MAIN_STAT_LABEL = 'Fixed Main Stats (HP / ATK)'
+
+
+def group_characters(frame, keys, rank_column='Artifact Set Rank'):
+    """Bucket character+role entries by keys, sorted by (setRank, character) like the UI expects."""
+    groups = {}
+    columns = keys + ['Character', 'Role', 'Preferred Role', rank_column]
+    for *key, character, role, preferred, set_rank in zip(*(frame[c].tolist() for c in columns)):
+        groups.setdefault(tuple(key), []).append({
+            'character': character,
+            'role': role,
+            'preferred': bool(preferred),
+            'setRank': int(set_rank)
+        })
+    for char_list in groups.values():
+        char_list.sort(key=lambda x: (x['setRank'], x['character'], x['role'], x['preferred']))
+    return groups
+
+
+def bitset_words(mask):
+    """Store an int bitset as little-endian 32-bit words, trailing zero words dropped.
+
+    Words stay within what JS bitwise operators handle, so the template ANDs them directly.
+    """
+    return [(mask >> shift) & 0xFFFFFFFF for shift in range(0, mask.bit_length(), 32)]
+
+
+def rank_ends(ranks):
+    """Cumulative counts of a rank-sorted list: entry r - 1 is how many ranks are <= r."""
+    return [bisect.bisect_right(ranks, rank) for rank in range(1, (ranks[-1] if ranks else 0) + 1)]
+
+
+def member_cell(characters, substats, member_masks):
+    """A cell entry: its characters and substats plus bitsets of all and of preferred character+roles.
+
+    The template's filters become slices: substats (sorted by rank) up to rankEnds[threshold - 1]
+    pass the rank threshold, preferredCharacters / preferredSubstats index the entries a preferred
+    character+role plays or wants, and preferredRankEnds cuts the latter at each threshold.
+    """
+    masks = [member_masks[(entry['character'], entry['role'])] for entry in characters]
+    members = preferred = 0
+    for entry, mask in zip(characters, masks):
+        members |= mask
+        if entry['preferred']:
+            preferred |= mask
+    preferred_words = bitset_words(preferred)
+    preferred_substats = [
+        i for i, entry in enumerate(substats) if any(a & b for a, b in zip(entry['members'], preferred_words))
+    ]
+    return {
+        'characters': characters,
+        'substats': substats,
+        'members': bitset_words(members),
+        'preferredMembers': preferred_words,
+        'rankEnds': rank_ends([entry['rank'] for entry in substats]),
+        'preferredCharacters': [i for i, mask in enumerate(masks) if mask & preferred],
+        'preferredSubstats': preferred_substats,
+        'preferredRankEnds': rank_ends([substats[i]['rank'] for i in preferred_substats])
+    }
+
+
+def group_character_builds(frame):
+    """Per (character, role): preferred flag, best rank per set, main stats per slot and best rank per substat.
+
+    Sets and substats are sorted best rank first; main stats keep their order of first appearance.
+    """
+    preferred = frame.groupby(CHARACTER_KEYS, sort=False, observed=True)['Preferred Role'].any()
+    builds = {
+        (character, role): {
+            'character': character,
+            'role': role,
+            'preferred': bool(is_preferred),
+            'sets': [],
+            'mainStats': {},
+            'substats': []
+        }
+        for (character, role), is_preferred in preferred.items()
+    }
+    set_ranks = (
+        frame.groupby(CHARACTER_KEYS + ['Artifact Set'], sort=False, observed=True)['Artifact Set Rank']
+        .min().reset_index()
+    )
+    for character, role, artifact_set, set_rank in zip(*(set_ranks[c].tolist() for c in set_ranks.columns)):
+        builds[(character, role)]['sets'].append({'set': artifact_set, 'setRank': int(set_rank)})
+    main_stats = frame.drop_duplicates(CHARACTER_KEYS + CELL_KEYS[1:])
+    for character, role, slot, main_stat in zip(*(main_stats[c].tolist() for c in CHARACTER_KEYS + CELL_KEYS[1:])):
+        builds[(character, role)]['mainStats'].setdefault(slot, []).append(main_stat)
+    substat_ranks = (
+        frame.groupby(CHARACTER_KEYS + ['Substat'], sort=False, observed=True)['Substat Rank']
+        .min().reset_index()
+    )
+    for character, role, substat, rank in zip(*(substat_ranks[c].tolist() for c in substat_ranks.columns)):
+        builds[(character, role)]['substats'].append({'substat': substat, 'rank': int(rank)})
+    for build in builds.values():
+        build['sets'].sort(key=lambda entry: (entry['setRank'], entry['set']))
+        build['substats'].sort(key=lambda entry: (entry['rank'], entry['substat']))
+    return builds
+
+
+def group_substats(frame, keys, member_masks, rank_column='Substat Rank'):
+    """Bucket substat+rank entries by keys, each with its sorted character+role attribution and its bitset."""
+    groups = {}
+    columns = keys + ['Substat', rank_column, 'Character', 'Role']
+    for *key, substat, rank, character, role in zip(*(frame[c].tolist() for c in columns)):
+        groups.setdefault(tuple(key), {}).setdefault((int(rank), substat), []).append((character, role))
+    return {
+        key: [
+            {
+                'substat': substat,
+                'rank': rank,
+                'characterRoles': [{'character': c, 'role': r} for c, r in sorted(char_roles)],
+                'members': bitset_words(sum(member_masks[pair] for pair in set(char_roles)))
+            }
+            for (rank, substat), char_roles in sorted(substats.items())
+        ]
+        for key, substats in groups.items()
+    }
+
+
+def generate_web_json(df, previous=None, changed_rows=None):
+    """Generate optimized JSON for the web artifact evaluator.
+
+    Given the previous index and the rows added or removed since it was built, only the sets,
+    slot/main stat pairs and character+roles those rows touch are regenerated; everything else
+    is reused.
+    """
+    import pandas as pd
+
     # Build meta information
     sets = sorted(df['Artifact Set'].unique().tolist())
     slots = sorted(df['Artifact Slot'].unique().tolist())
     characters = sorted(df['Character'].unique().tolist())
     substats = sorted(df['Substat'].unique().tolist())
+    # Global character+role order the membership bitsets index; a previous index built against
+    # another order has stale bitsets everywhere, so it is regenerated in full
+    member_order = sorted(map(tuple, df[CHARACTER_KEYS].drop_duplicates().itertuples(index=False)))
+    member_masks = {pair: 1 << bit for bit, pair in enumerate(member_order)}
+    if previous is not None and (
+        previous['meta'].get('memberOrder') != [list(pair) for pair in member_order] or 'byCharacter' not in previous
+        or any('rankEnds' not in cell for cell in previous['byMainStat'].values())
+    ):
+        previous = None
+
+    # Only regenerate what the changed rows touch; a full build touches everything
+    if previous is None:
+        set_rows = main_stat_rows = character_rows = df
+    else:
+        touched_sets = set(changed_rows['Artifact Set'])
+        touched_main_stats = set(zip(changed_rows['Artifact Slot'], changed_rows['Main Stat']))
+        touched_characters = set(zip(changed_rows['Character'], changed_rows['Role']))
+        set_rows = df[df['Artifact Set'].isin(touched_sets)]
+        main_stat_rows = df[pd.MultiIndex.from_frame(df[CELL_KEYS[1:]]).isin(list(touched_main_stats))]
+        character_rows = df[pd.MultiIndex.from_frame(df[CHARACTER_KEYS]).isin(list(touched_characters))]
+
+    # Main stats in order of first appearance, per set+slot and per slot
+    cell_order = {}
+    for artifact_set, slot, main_stat in set_rows.drop_duplicates(CELL_KEYS)[CELL_KEYS].itertuples(index=False):
+        cell_order.setdefault(artifact_set, {}).setdefault(slot, []).append(main_stat)
+    slot_order = {}
+    for slot, main_stat in df.drop_duplicates(CELL_KEYS[1:])[CELL_KEYS[1:]].itertuples(index=False):
+        slot_order.setdefault(slot, []).append(main_stat)
 
     # Main stats per slot
-    main_stats_by_slot = {}
-    for slot in slots:
-        main_stats_by_slot[slot] = sorted(
-            df[df['Artifact Slot'] == slot]['Main Stat'].unique().tolist()
-        )
+    main_stats_by_slot = {slot: sorted(slot_order[slot]) for slot in slots}
 
     meta = {
         'sets': sets,
         'slots': slots,
         'characters': characters,
         'substats': substats,
-        'mainStatsBySlot': main_stats_by_slot
+        'mainStatsBySlot': main_stats_by_slot,
+        'memberOrder': [list(pair) for pair in member_order]
     }
 
-    # Build bySet index: set → characters + slot breakdowns
+    # Shared aggregates. Each character+role keeps its lowest (preferred, set rank) pair,
+    # which sorting once and keeping the first duplicate gives for every grouping at once.
+    ranked = set_rows.sort_values(['Preferred Role', 'Artifact Set Rank'], kind='stable')
+    cell_subs = set_rows.drop_duplicates(CELL_KEYS + ['Substat', 'Substat Rank'] + CHARACTER_KEYS)
+    set_chars = group_characters(ranked.drop_duplicates(['Artifact Set'] + CHARACTER_KEYS), ['Artifact Set'])
+    set_subs = group_substats(
+        cell_subs.drop_duplicates(['Artifact Set', 'Substat', 'Substat Rank'] + CHARACTER_KEYS), ['Artifact Set'],
+        member_masks
+    )
+    cell_chars = group_characters(ranked.drop_duplicates(CELL_KEYS + CHARACTER_KEYS), CELL_KEYS)
+    cell_subs = group_substats(cell_subs, CELL_KEYS, member_masks)
+
+    # Build bySet (set → characters + slot breakdowns) and byArtifact ("set|slot|mainStat" →
+    # characters + substats) together; both views hold the same per-cell entries.
     by_set = {}
+    by_artifact = {}
     for artifact_set in sets:
-        set_df = df[df['Artifact Set'] == artifact_set]
-
-        # Get unique character/role combinations for this set
-        char_roles = set_df.groupby(['Character', 'Role', 'Preferred Role', 'Artifact Set Rank']).size().reset_index()
-        characters_list = []
-        seen_char_roles = set()
-        for _, row in char_roles.iterrows():
-            key = (row['Character'], row['Role'])
-            if key not in seen_char_roles:
-                seen_char_roles.add(key)
-                characters_list.append({
-                    'character': row['Character'],
-                    'role': row['Role'],
-                    'preferred': bool(row['Preferred Role']),
-                    'setRank': int(row['Artifact Set Rank'])
-                })
-
-        # Sort by setRank, then character name
-        characters_list.sort(key=lambda x: (x['setRank'], x['character']))
-
-        # Build slot breakdown
+        if artifact_set not in cell_order:
+            by_set[artifact_set] = previous['bySet'][artifact_set]
+            for slot, main_stat_data in by_set[artifact_set]['slots'].items():
+                for main_stat in main_stat_data:
+                    key = f"{artifact_set}|{slot}|{main_stat}"
+                    by_artifact[key] = previous['byArtifact'][key]
+            continue
+
+        characters_list = set_chars[(artifact_set,)]
         slot_breakdown = {}
         for slot in slots:
-            slot_df = set_df[set_df['Artifact Slot'] == slot]
-            if slot_df.empty:
+            main_stats = cell_order[artifact_set].get(slot)
+            if not main_stats:
                 continue
-
-            # Main stats for this slot
             main_stat_data = {}
-            for main_stat in slot_df['Main Stat'].unique():
-                ms_df = slot_df[slot_df['Main Stat'] == main_stat]
-
-                # Characters wanting this main stat
-                ms_chars = ms_df.groupby(['Character', 'Role', 'Preferred Role', 'Artifact Set Rank']).size().reset_index()
-                ms_char_list = []
-                seen = set()
-                for _, row in ms_chars.iterrows():
-                    key = (row['Character'], row['Role'])
-                    if key not in seen:
-                        seen.add(key)
-                        ms_char_list.append({
-                            'character': row['Character'],
-                            'role': row['Role'],
-                            'preferred': bool(row['Preferred Role']),
-                            'setRank': int(row['Artifact Set Rank'])
-                        })
-                ms_char_list.sort(key=lambda x: (x['setRank'], x['character']))
-
-                # Substats for this main stat - include character+role pairs
-                substat_data = ms_df.groupby(['Substat', 'Substat Rank']).apply(
-                    lambda g: g[['Character', 'Role']].drop_duplicates().to_dict('records')
-                ).reset_index(name='char_roles')
-                substats_list = []
-                for _, row in substat_data.iterrows():
-                    char_roles = [{'character': cr['Character'], 'role': cr['Role']}
-                                  for cr in row['char_roles']]
-                    char_roles.sort(key=lambda x: (x['character'], x['role']))
-                    substats_list.append({
-                        'substat': row['Substat'],
-                        'rank': int(row['Substat Rank']),
-                        'characterRoles': char_roles
-                    })
-                substats_list.sort(key=lambda x: (x['rank'], x['substat']))
-
-                main_stat_data[main_stat] = {
-                    'characters': ms_char_list,
-                    'substats': substats_list
-                }
-
+            for main_stat in main_stats:
+                cell = (artifact_set, slot, main_stat)
+                main_stat_data[main_stat] = member_cell(cell_chars[cell], cell_subs[cell], member_masks)
+                by_artifact[f"{artifact_set}|{slot}|{main_stat}"] = main_stat_data[main_stat]
             slot_breakdown[slot] = main_stat_data
 
-        # Build combined fixed-main-stat slot for Flower/Feather.
+        # Combined fixed-main-stat slot for Flower/Feather.
         # Source data does not encode these slots explicitly; aggregate by set.
-        fixed_char_data = set_df.groupby(
-            ['Character', 'Role', 'Preferred Role', 'Artifact Set Rank']
-        ).size().reset_index()
-        fixed_char_list = []
-        fixed_seen = set()
-        for _, row in fixed_char_data.iterrows():
-            key = (row['Character'], row['Role'])
-            if key not in fixed_seen:
-                fixed_seen.add(key)
-                fixed_char_list.append({
-                    'character': row['Character'],
-                    'role': row['Role'],
-                    'preferred': bool(row['Preferred Role']),
-                    'setRank': int(row['Artifact Set Rank'])
-                })
-        fixed_char_list.sort(key=lambda x: (x['setRank'], x['character']))
-
-        fixed_sub_data = set_df.groupby(['Substat', 'Substat Rank']).apply(
-            lambda g: g[['Character', 'Role']].drop_duplicates().to_dict('records')
-        ).reset_index(name='char_roles')
-        fixed_sub_list = []
-        for _, row in fixed_sub_data.iterrows():
-            char_roles = [{'character': cr['Character'], 'role': cr['Role']}
-                          for cr in row['char_roles']]
-            char_roles.sort(key=lambda x: (x['character'], x['role']))
-            fixed_sub_list.append({
-                'substat': row['Substat'],
-                'rank': int(row['Substat Rank']),
-                'characterRoles': char_roles
-            })
-        fixed_sub_list.sort(key=lambda x: (x['rank'], x['substat']))
-
         by_set[artifact_set] = {
             'characters': characters_list,
             'slots': slot_breakdown,
             'fixedSlots': {
-                'slot': 'Flower/Feather',
-                'mainStatLabel': 'Fixed Main Stats (HP / ATK)',
-                'characters': fixed_char_list,
-                'substats': fixed_sub_list
+                'slot': FIXED_SLOT,
+                'mainStatLabel': FIXED_MAIN_STAT_LABEL,
+                **member_cell(characters_list, set_subs[(artifact_set,)], member_masks)
             }
         }
 
-    # Build byArtifact index: "set|slot|mainStat" → characters + substats
-    by_artifact = {}
-    for artifact_set in sets:
-        set_df = df[df['Artifact Set'] == artifact_set]
-        for slot in slots:
-            slot_df = set_df[set_df['Artifact Slot'] == slot]
-            for main_stat in slot_df['Main Stat'].unique():
-                key = f"{artifact_set}|{slot}|{main_stat}"
-                ms_df = slot_df[slot_df['Main Stat'] == main_stat]
-
-                # Characters
-                char_data = ms_df.groupby(['Character', 'Role', 'Preferred Role', 'Artifact Set Rank']).size().reset_index()
-                char_list = []
-                seen = set()
-                for _, row in char_data.iterrows():
-                    k = (row['Character'], row['Role'])
-                    if k not in seen:
-                        seen.add(k)
-                        char_list.append({
-                            'character': row['Character'],
-                            'role': row['Role'],
-                            'preferred': bool(row['Preferred Role']),
-                            'setRank': int(row['Artifact Set Rank'])
-                        })
-                char_list.sort(key=lambda x: (x['setRank'], x['character']))
-
-                # Substats with character+role attribution
-                sub_data = ms_df.groupby(['Substat', 'Substat Rank']).apply(
-                    lambda g: g[['Character', 'Role']].drop_duplicates().to_dict('records')
-                ).reset_index(name='char_roles')
-                sub_list = []
-                for _, row in sub_data.iterrows():
-                    char_roles = [{'character': cr['Character'], 'role': cr['Role']}
-                                  for cr in row['char_roles']]
-                    char_roles.sort(key=lambda x: (x['character'], x['role']))
-                    sub_list.append({
-                        'substat': row['Substat'],
-                        'rank': int(row['Substat Rank']),
-                        'characterRoles': char_roles
-                    })
-                sub_list.sort(key=lambda x: (x['rank'], x['substat']))
-
-                by_artifact[key] = {
-                    'characters': char_list,
-                    'substats': sub_list
-                }
-
-    # Build byMainStat index: "slot|mainStat" (ignores set) → characters + substats
+    # Build byMainStat index: "slot|mainStat" (ignores set) → characters + substats.
+    # Each character+role is listed once, with its lowest (preferred, set rank) pair across sets as in
+    # bySet, so the preferred-only slices never hold it twice; each substat gets its best rank per
+    # character+role.
+    offset_chars = group_characters(
+        main_stat_rows.sort_values(['Preferred Role', 'Artifact Set Rank'], kind='stable')
+        .drop_duplicates(CELL_KEYS[1:] + CHARACTER_KEYS),
+        CELL_KEYS[1:]
+    )
+    offset_subs = group_substats(
+        main_stat_rows.groupby(CELL_KEYS[1:] + CHARACTER_KEYS + ['Substat'], sort=False, observed=True)['Substat Rank']
+        .min().reset_index(name='Best Substat Rank'),
+        CELL_KEYS[1:], member_masks, rank_column='Best Substat Rank'
+    )
     by_main_stat = {}
     for slot in slots:
-        slot_df = df[df['Artifact Slot'] == slot]
-        for main_stat in slot_df['Main Stat'].unique():
-            key = f"{slot}|{main_stat}"
-            ms_df = slot_df[slot_df['Main Stat'] == main_stat]
-
-            # Characters with best (lowest) set rank for this slot/main stat across all sets.
-            char_data = ms_df.groupby(
-                ['Character', 'Role', 'Preferred Role']
-            )['Artifact Set Rank'].min().reset_index(name='Best Set Rank')
-            char_list = []
-            for _, row in char_data.iterrows():
-                char_list.append({
-                    'character': row['Character'],
-                    'role': row['Role'],
-                    'preferred': bool(row['Preferred Role']),
-                    'setRank': int(row['Best Set Rank'])
-                })
-            char_list.sort(key=lambda x: (x['setRank'], x['character']))
-
-            # Substats with best rank per character+role+substat, then grouped for UI display.
-            best_sub_per_char = ms_df.groupby(
-                ['Character', 'Role', 'Substat']
-            )['Substat Rank'].min().reset_index(name='Best Substat Rank')
-            sub_data = best_sub_per_char.groupby(['Substat', 'Best Substat Rank']).apply(
-                lambda g: g[['Character', 'Role']].drop_duplicates().to_dict('records')
-            ).reset_index(name='char_roles')
-            sub_list = []
-            for _, row in sub_data.iterrows():
-                char_roles = [{'character': cr['Character'], 'role': cr['Role']}
-                              for cr in row['char_roles']]
-                char_roles.sort(key=lambda x: (x['character'], x['role']))
-                sub_list.append({
-                    'substat': row['Substat'],
-                    'rank': int(row['Best Substat Rank']),
-                    'characterRoles': char_roles
-                })
-            sub_list.sort(key=lambda x: (x['rank'], x['substat']))
-
-            by_main_stat[key] = {
-                'characters': char_list,
-                'substats': sub_list
-            }
+        for main_stat in slot_order[slot]:
+            key = f"{slot}|{main_stat}"
+            if (slot, main_stat) not in offset_chars:
+                by_main_stat[key] = previous['byMainStat'][key]
+                continue
+            by_main_stat[key] = member_cell(offset_chars[(slot, main_stat)], offset_subs[(slot, main_stat)], member_masks)
 
+    # Build byCharacter index: "character|role" → ranked sets, main stats per slot and best substat ranks
+    character_builds = group_character_builds(character_rows)
+    by_character = {}
+    for character, role in member_order:
+        key = f"{character}|{role}"
+        by_character[key] = character_builds.get((character, role)) or previous['byCharacter'][key]
+
     return {
         'meta': meta,
         'bySet': by_set,
         'byArtifact': by_artifact,
-        'byMainStat': by_main_stat
+        'byMainStat': by_main_stat,
+        'byCharacter': by_character
     }
 
 
-# Generate and write JSON for web evaluator
-web_json = generate_web_json(df_enhanced_v2)
-with open('output/artifact_data.json', 'w', encoding='utf-8') as f:
-    json.dump(web_json, f, separators=(',', ':'))
+def share_cells(web_json):
+    """Store each set/slot/main stat cell once, in a top-level cells list.
+
+    bySet slot breakdowns and byArtifact hold the cell's index instead of a second copy of it;
+    resolve_cells() (and resolveCells() in the template) puts the objects back.
+    """
+    cells = []
+    by_set = {}
+    by_artifact = {}
+    for artifact_set, set_data in web_json['bySet'].items():
+        slots = {}
+        for slot, main_stat_data in set_data['slots'].items():
+            slots[slot] = {}
+            for main_stat, cell in main_stat_data.items():
+                slots[slot][main_stat] = by_artifact[f"{artifact_set}|{slot}|{main_stat}"] = len(cells)
+                cells.append(cell)
+        by_set[artifact_set] = {**set_data, 'slots': slots}
+    return {
+        'meta': web_json['meta'],
+        'cells': cells,
+        'bySet': by_set,
+        'byArtifact': by_artifact,
+        'byMainStat': web_json['byMainStat'],
+        'byCharacter': web_json['byCharacter']
+    }
+
+
+def resolve_cells(payload):
+    """Inverse of share_cells(): replace cell indices with the cells they point at."""
+    cells = payload['cells']
+    return {
+        'meta': payload['meta'],
+        'bySet': {
+            artifact_set: {
+                **set_data,
+                'slots': {
+                    slot: {main_stat: cells[cell_id] for main_stat, cell_id in main_stat_ids.items()}
+                    for slot, main_stat_ids in set_data['slots'].items()
+                }
+            }
+            for artifact_set, set_data in payload['bySet'].items()
+        },
+        'byArtifact': {key: cells[cell_id] for key, cell_id in payload['byArtifact'].items()},
+        'byMainStat': payload['byMainStat'],
+        'byCharacter': payload['byCharacter']
+    }
+
+
+def encode_web_json(payload):
+    """Dictionary-encode a share_cells() payload so each string is stored once, in meta.
+
+    Character lists become flat [characterRole, setRank, preferred, ...] triples and substat lists
+    [[substat, rank, characterRole, ...], ...], where characterRole indexes meta.characterRoles
+    ([character, role] index pairs). Cells are [characters, substats] and bySet entries
+    [characters, slots, fixed-slot substats]; byCharacter entries are [characterRole, preferred,
+    [set, setRank, ...], {slot: [mainStat, ...]}, [substat, rank, ...]] with main stats indexing
+    meta.mainStatsBySlot[slot]. characterRoles follows meta.memberOrder, which it
+    replaces, and the membership bitsets and rank ranges are left out: decodeData() in the template
+    rebuilds them from the characterRole ids and substat ranks while expanding this back into the
+    plain schema.
+    """
+    meta = {key: value for key, value in payload['meta'].items() if key != 'memberOrder'}
+    character_index = {character: i for i, character in enumerate(meta['characters'])}
+    substat_index = {substat: i for i, substat in enumerate(meta['substats'])}
+    role_index = {}
+    pair_index = {}
+
+    def character_role(character, role):
+        pair = (character, role)
+        if pair not in pair_index:
+            pair_index[pair] = len(pair_index)
+            role_index.setdefault(role, len(role_index))
+        return pair_index[pair]
+
+    def encode_characters(characters):
+        flat = []
+        for entry in characters:
+            flat += [character_role(entry['character'], entry['role']), entry['setRank'], int(entry['preferred'])]
+        return flat
+
+    def encode_substats(substats):
+        return [
+            [substat_index[entry['substat']], entry['rank']]
+            + [character_role(pair['character'], pair['role']) for pair in entry['characterRoles']]
+            for entry in substats
+        ]
+
+    def encode_cell(cell):
+        return [encode_characters(cell['characters']), encode_substats(cell['substats'])]
+
+    for character, role in payload['meta']['memberOrder']:
+        character_role(character, role)
+    cells = [encode_cell(cell) for cell in payload['cells']]
+    by_set = {
+        artifact_set: [
+            encode_characters(set_data['characters']),
+            set_data['slots'],
+            encode_substats(set_data['fixedSlots']['substats']),
+        ]
+        for artifact_set, set_data in payload['bySet'].items()
+    }
+    by_main_stat = {key: encode_cell(cell) for key, cell in payload['byMainStat'].items()}
+    set_index = {artifact_set: i for i, artifact_set in enumerate(meta['sets'])}
+    main_stat_index = {
+        slot: {main_stat: i for i, main_stat in enumerate(main_stats)} for slot, main_stats in meta['mainStatsBySlot'].items()
+    }
+    by_character = {
+        key: [
+            character_role(build['character'], build['role']),
+            int(build['preferred']),
+            [value for entry in build['sets'] for value in (set_index[entry['set']], entry['setRank'])],
+            {
+                slot: [main_stat_index[slot][main_stat] for main_stat in main_stats]
+                for slot, main_stats in build['mainStats'].items()
+            },
+            [value for entry in build['substats'] for value in (substat_index[entry['substat']], entry['rank'])],
+        ]
+        for key, build in payload['byCharacter'].items()
+    }
 
-# Generate HTML from template
-with open('artifact_evaluator_template.html', 'r', encoding='utf-8') as f:
-    html_template = f.read()
-json_str = json.dumps(web_json, separators=(',', ':'))
-html_output = html_template.replace('ARTIFACT_DATA_PLACEHOLDER', json_str)
-with open('output/artifact_evaluator.html', 'w', encoding='utf-8') as f:
-    f.write(html_output)
+    return {
+        'meta': {
+            **meta,
+            'encoding': 'dict-v1',
+            'roles': list(role_index),
+            'characterRoles': [
+                [character_index[character], role_index[role]] for character, role in pair_index
+            ],
+            'fixedSlot': {'slot': FIXED_SLOT, 'mainStatLabel': FIXED_MAIN_STAT_LABEL},
+        },
+        'cells': cells,
+        'bySet': by_set,
+        'byArtifact': payload['byArtifact'],
+        'byMainStat': by_main_stat,
+        'byCharacter': by_character
+    }
+
+
+def decode_web_json(payload):
+    """Inverse of encode_web_json(), like decodeData() in the template; plain payloads pass through."""
+    meta = {
+        key: value for key, value in payload['meta'].items()
+        if key not in ('encoding', 'roles', 'characterRoles', 'fixedSlot')
+    }
+    encoding = payload['meta'].get('encoding')
+    if encoding is None:
+        return payload
+    if encoding != 'dict-v1':
+        raise ValueError(f"Unsupported data encoding: {encoding}")
+    roles = payload['meta']['roles']
+    fixed_slot = payload['meta']['fixedSlot']
+    character_roles = [
+        (meta['characters'][character], roles[role]) for character, role in payload['meta']['characterRoles']
+    ]
+    # characterRoles ids are the membership bit positions
+    meta['memberOrder'] = [list(pair) for pair in character_roles]
+    member_masks = {pair: 1 << bit for bit, pair in enumerate(character_roles)}
+
+    def decode_characters(flat):
+        return [
+            {
+                'character': character_roles[flat[i]][0],
+                'role': character_roles[flat[i]][1],
+                'preferred': flat[i + 2] == 1,
+                'setRank': flat[i + 1]
+            }
+            for i in range(0, len(flat), 3)
+        ]
+
+    def decode_substats(entries):
+        return [
+            {
+                'substat': meta['substats'][substat],
+                'rank': rank,
+                'characterRoles': [
+                    {'character': character_roles[i][0], 'role': character_roles[i][1]} for i in pair_ids
+                ],
+                'members': bitset_words(sum(1 << i for i in set(pair_ids)))
+            }
+            for substat, rank, *pair_ids in entries
+        ]
+
+    def decode_cell(cell):
+        return member_cell(decode_characters(cell[0]), decode_substats(cell[1]), member_masks)
+
+    def decode_set(set_data):
+        characters = decode_characters(set_data[0])
+        return {
+            'characters': characters,
+            'slots': set_data[1],
+            'fixedSlots': {**fixed_slot, **member_cell(characters, decode_substats(set_data[2]), member_masks)}
+        }
+
+    def decode_build(build):
+        pair_id, preferred, set_ranks, main_stats, substat_ranks = build
+        return {
+            'character': character_roles[pair_id][0],
+            'role': character_roles[pair_id][1],
+            'preferred': preferred == 1,
+            'sets': [
+                {'set': meta['sets'][set_ranks[i]], 'setRank': set_ranks[i + 1]} for i in range(0, len(set_ranks), 2)
+            ],
+            'mainStats': {
+                slot: [meta['mainStatsBySlot'][slot][i] for i in indices] for slot, indices in main_stats.items()
+            },
+            'substats': [
+                {'substat': meta['substats'][substat_ranks[i]], 'rank': substat_ranks[i + 1]}
+                for i in range(0, len(substat_ranks), 2)
+            ]
+        }
+
+    return {
+        'meta': meta,
+        'cells': [decode_cell(cell) for cell in payload['cells']],
+        'bySet': {artifact_set: decode_set(set_data) for artifact_set, set_data in payload['bySet'].items()},
+        'byArtifact': payload['byArtifact'],
+        'byMainStat': {key: decode_cell(cell) for key, cell in payload['byMainStat'].items()},
+        'byCharacter': {key: decode_build(build) for key, build in payload['byCharacter'].items()}
+    }
+
+
+DATA_SHARD_DIR = 'output/data'
+
+
+def write_data_shards(payload, directory, manifest):
+    """Split a share_cells() payload into one file per set, per slot of byMainStat and per character of byCharacter.
+
+    Files are named by content hash, so unchanged shards keep their names (and browser caches)
+    across builds, and are written with precompressed siblings; shards no longer referenced are
+    removed. Returns what the template embeds instead of the full payload: meta plus a map from
+    set / slot / character to shard path.
+    """
+    shards = {}
+    for artifact_set, set_data in payload['bySet'].items():
+        slots = set_data['slots'] if isinstance(set_data, dict) else set_data[1]
+        by_artifact = {
+            f"{artifact_set}|{slot}|{main_stat}": cell_id
+            for slot, main_stat_ids in slots.items()
+            for main_stat, cell_id in main_stat_ids.items()
+        }
+        shards[('bySet', artifact_set)] = {
+            'cells': {cell_id: payload['cells'][cell_id] for cell_id in by_artifact.values()},
+            'bySet': {artifact_set: set_data},
+            'byArtifact': by_artifact,
+        }
+    for key, cell in payload['byMainStat'].items():
+        slot = key.split('|', 1)[0]
+        shards.setdefault(('byMainStat', slot), {'byMainStat': {}})['byMainStat'][key] = cell
+    for key, build in payload['byCharacter'].items():
+        character = key.split('|', 1)[0]
+        shards.setdefault(('byCharacter', character), {'byCharacter': {}})['byCharacter'][key] = build
+
+    os.makedirs(directory, exist_ok=True)
+    shard_map = {'bySet': {}, 'byMainStat': {}, 'byCharacter': {}}
+    prefixes = {'bySet': 'set', 'byMainStat': 'main-stat', 'byCharacter': 'character'}
+    written = set()
+    for (index, name), shard in shards.items():
+        content = json.dumps(shard, separators=(',', ':')).encode('utf-8')
+        filename = f"{prefixes[index]}-{hashlib.sha256(content).hexdigest()[:16]}.json"
+        write_output(os.path.join(directory, filename), content, manifest, precompress=True)
+        shard_map[index][name] = f"{os.path.basename(directory)}/{filename}"
+        written.add(filename)
+    for filename in os.listdir(directory):
+        if filename.endswith('.json') and filename not in written:
+            remove_output(os.path.join(directory, filename), manifest)
+    stale_keys = [key for key in manifest['files']
+                  if key.startswith(output_key(directory) + '/') and key.rsplit('/', 1)[1] not in written]
+    for key in stale_keys:
+        del manifest['files'][key]
+
+    return {'meta': payload['meta'], 'shards': shard_map}
+
+
+def write_web_outputs(df_enhanced_v2, metrics, manifest, previous_web_json=None, changed_rows=None,
+                      json_schema='plain', data_layout='single', check_json=False):
+    """Build the web index and write artifact_data.json and the evaluator HTML; returns the plain index.
+
+    Both files (and any data shards) are written with .gz/.br siblings, and only when their content changed.
+    """
+    # Generate and write JSON for web evaluator
+    begin_stage(metrics, 'index', rows_in=len(df_enhanced_v2))
+    web_json = generate_web_json(df_enhanced_v2, previous_web_json, changed_rows)
+    index_entries = sum(len(web_json[index]) for index in ('bySet', 'byArtifact', 'byMainStat', 'byCharacter'))
+    stage_rows(metrics, rows_out=index_entries)
+    published_json = share_cells(web_json)
+    if check_json:
+        assert resolve_cells(published_json) == web_json, "shared cells do not resolve back to the web index"
+    if json_schema == 'encoded':
+        shared_json = published_json
+        published_json = encode_web_json(published_json)
+        if check_json:
+            assert decode_web_json(published_json) == shared_json, "encoded index does not decode back to the web index"
+    # Serialize once (json.dumps uses the C encoder; json.dump to a file does not) and reuse the string
+    begin_stage(metrics, 'render', rows_in=index_entries)
+    json_bytes = json.dumps(published_json, separators=(',', ':')).encode('utf-8')
+    write_output('output/artifact_data.json', json_bytes, manifest, precompress=True)
+
+    # Generate HTML from template: hash and write prefix, payload and suffix without building the page string
+    with open('artifact_evaluator_template.html', 'r', encoding='utf-8') as f:
+        html_prefix, html_suffix = f.read().split('ARTIFACT_DATA_PLACEHOLDER', 1)
+    if data_layout == 'sharded':
+        shard_index = write_data_shards(published_json, DATA_SHARD_DIR, manifest)
+        json_bytes = json.dumps(shard_index, separators=(',', ':')).encode('utf-8')
+    else:
+        # The page no longer loads shards, so stop tracking (and publishing) them
+        for key in [key for key in manifest['files'] if key.startswith(output_key(DATA_SHARD_DIR) + '/')]:
+            del manifest['files'][key]
+    write_output('output/artifact_evaluator.html', [html_prefix.encode('utf-8'), json_bytes,
+                                                    html_suffix.encode('utf-8')], manifest, precompress=True)
+    return web_json
+
+
+def build(value_ranges, metrics=None, workers=1, expansion='columnar', full_rebuild=False,
+          json_schema='plain', data_layout='single', check_expansion=False, check_json=False,
+          dataset_formats=('csv', 'arrow'), block_cache=None, tab_cache=None):
+    """Build the flattened dataset files, artifact_data.json and the evaluator HTML from fetched valueRanges.
+
+    Reuses (and updates) the block cache unless full_rebuild, and rewrites only outputs whose content
+    hash differs from the output manifest's (every output, with full_rebuild). changes.json diffs the
+    rows against the previous build's dataset file. Returns the flattened rows and the validation
+    counts, which report() turns into summary.txt.
+
+    A caller that builds repeatedly (see watch) can pass the block cache it keeps in memory instead of
+    having it loaded from disk, and a tab_cache dict in which cleaned and parsed tabs are kept between
+    builds, so only tabs whose content changed are cleaned and parsed again.
+    """
+    import pandas as pd  # imported up front so its load time is not billed to the first stage
+
+    # pyarrow (needed for the dataset files) would otherwise make pandas back str columns with Arrow,
+    # which is slower and larger for this pipeline's object-heavy work than python strings
+    metrics = metrics if metrics is not None else new_run_metrics()
+    validation_counts = dict(VALIDATION_COUNTS)
+    with pd.option_context('mode.string_storage', 'python'):
+        tab_keys = list(zip(elements, map(snapshots.tab_hash, value_ranges))) if tab_cache is not None else None
+        if full_rebuild and tab_cache is not None:
+            tab_cache.clear()
+        cleaned_tabs = trim_and_filter_tabs(value_ranges, validation_counts, metrics, workers, tab_keys, tab_cache)
+        df_final_cleaned = parse_character_blocks(cleaned_tabs, validation_counts, metrics, workers, tab_keys, tab_cache)
+
+        # Enhanced data processing: only blocks whose fingerprint is not cached are normalized and expanded
+        if block_cache is None:
+            # A full rebuild reuses none of the cache, so it is not unpickled just to be replaced
+            block_cache = empty_block_cache() if full_rebuild else load_block_cache(BLOCK_CACHE_PATH)
+        manifest = load_output_manifest()
+        last_dataset = read_last_dataset(manifest)
+        if full_rebuild:
+            block_cache['blocks'], block_cache['order'], block_cache['web_json'] = {}, [], None
+            manifest = {'files': {}}
+        df_enhanced_v2, block_order = expand_character_blocks(
+            df_final_cleaned, block_cache, validation_counts, metrics, workers, expansion
+        )
+        if check_expansion:
+            check_expansion_against_loop(df_final_cleaned, df_enhanced_v2, validation_counts)
+        previous_web_json, changed_rows = index_changes(block_cache, block_order)
+
+        validation_counts['final_output_rows'] = len(df_enhanced_v2)
+        write_dataset(df_enhanced_v2, metrics, manifest, dataset_formats)
+        write_changes(last_dataset, df_enhanced_v2, metrics, manifest)
+        web_json = write_web_outputs(
+            df_enhanced_v2, metrics, manifest, previous_web_json, changed_rows, json_schema, data_layout, check_json
+        )
+        save_output_manifest(manifest)
+
+        # Remember this build's blocks and index for the next incremental run
+        begin_stage(metrics, 'cache')
+        block_cache['blocks'] = {fp: block_cache['blocks'][fp] for fp in block_order}
+        block_cache['order'] = block_order
+        block_cache['web_json'] = web_json
+        save_block_cache(BLOCK_CACHE_PATH, block_cache)
+        begin_stage(metrics)
+        return df_enhanced_v2, validation_counts
 
 
 # Helper functions for summary analysis
@@ -567,117 +2181,594 @@ ARTIFACT_SET_CATEGORIES = {
 }
 
 
+# Patterns that suggest incomplete cleanup, in order of precedence (a value is reported for the first it matches)
+SUSPICIOUS_PATTERNS = [
+    (r'[~≈]', 'contains ~ or ≈'),
+    (r'[\[\]]', 'contains brackets []'),
+    (r'\*', 'contains asterisk'),
+    (r'\d+%', 'contains percentage (may need expansion)'),
+    (r'.{50,}', 'very long string (>50 chars)'),
+]
+PERCENTAGE_PATTERN_INDEX = 3
+# All of them in one pass: an optional lookahead per pattern, whose group is set only where that pattern occurs
+SUSPICIOUS_PATTERN = re.compile(''.join(rf'(?:(?=[\s\S]*?({pattern})))?' for pattern, _ in SUSPICIOUS_PATTERNS))
+
+
 def find_suspicious_strings(series, allowed_percentages=None):
     """Find values containing patterns that suggest incomplete cleanup."""
-    if allowed_percentages is None:
-        allowed_percentages = set()
-    suspicious_patterns = [
-        (r'[~≈]', 'contains ~ or ≈'),
-        (r'[\[\]]', 'contains brackets []'),
-        (r'\*', 'contains asterisk'),
-        (r'\d+%', 'contains percentage (may need expansion)'),
-        (r'.{50,}', 'very long string (>50 chars)'),
-    ]
+    import pandas as pd
+
+    values = pd.Series([value for value in series.unique() if isinstance(value, str)], dtype=object)
+    if values.empty:
+        return []
+    matches = values.str.extract(SUSPICIOUS_PATTERN).notna().to_numpy(copy=True)
+    if allowed_percentages:
+        # Skip percentage check for known canonical category names
+        matches[values.isin(allowed_percentages).to_numpy(), PERCENTAGE_PATTERN_INDEX] = False
+    first_match = matches.argmax(axis=1)
+    return [(value, SUSPICIOUS_PATTERNS[index][1])
+            for value, index, found in zip(values.tolist(), first_match.tolist(), matches.any(axis=1).tolist()) if found]
+
+
+# Near-duplicate names: distinct values this similar (difflib ratio, compared casefolded with whitespace collapsed)
+NEAR_DUPLICATE_SIMILARITY = 0.94
+# Share of character trigrams (Dice coefficient) two values need in common before difflib compares them
+NEAR_DUPLICATE_MIN_OVERLAP = 0.7
+
+
+def find_near_duplicates(series):
+    """Clusters of distinct values that look like spellings of one name, as (suggested form, [(value, count), ...]).
+
+    Candidate pairs come from an inverted index of character trigrams, so only values sharing most of their trigrams
+    are compared. Values must agree on their numbers and % signs ("15% Cryo DMG set" and "15% Hydro DMG set", "DEF"
+    and "DEF%", or "Character 12" and "Character 13" are different names). The suggested form is the most common
+    spelling in the cluster.
+    """
+    import difflib
+    import numpy as np
+    import pandas as pd
+
+    counts = {value: int(count) for value, count in series.value_counts().items() if isinstance(value, str) and count}
+    if len(counts) < 2:
+        return []
+    values = list(counts)
+    keys = [' '.join(value.casefold().split()) for value in values]
+    # Trigram sets; each trigram is keyed by its value's numbers, so only values agreeing on those can share one
+    gram_sets = []
+    for key in keys:
+        numbers = ' '.join(re.findall(r'\d+|%', key))
+        padded = f"  {key} "
+        gram_sets.append({f"{numbers}|{padded[start:start + 3]}" for start in range(len(padded) - 2)})
+
+    # Inverted index: (value id, trigram code, position) rows, each value's trigrams rarest first
+    sizes = np.array([len(grams) for grams in gram_sets])
+    ids = np.repeat(np.arange(len(values)), sizes)
+    codes, _ = pd.factorize(np.array([gram for grams in gram_sets for gram in grams], dtype=object))
+    codes = codes[np.lexsort((codes, np.bincount(codes)[codes], ids))]
+    positions = np.arange(len(ids)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+
+    # Prefix filter: two values sharing enough trigrams for the overlap threshold must share one among the first
+    # (size - minimum shared + 1) of each, so only those are indexed
+    min_shared = np.ceil(NEAR_DUPLICATE_MIN_OVERLAP * sizes / (2 - NEAR_DUPLICATE_MIN_OVERLAP) - 1e-9)
+    in_prefix = positions < np.repeat(sizes - min_shared + 1, sizes)
+    index = pd.DataFrame({'id': ids[in_prefix], 'gram': codes[in_prefix], 'position': positions[in_prefix]})
+    pairs = index.merge(index, on='gram', suffixes=('_a', '_b'))
+    pairs = pairs[pairs['id_a'] < pairs['id_b']]
+    if pairs.empty:
+        return []
+    pair_keys = pairs['id_a'].to_numpy() * len(values) + pairs['id_b'].to_numpy()
+    pairs = pairs.iloc[np.lexsort((pairs['position_a'].to_numpy(), pair_keys))]
+    pair_keys = np.sort(pair_keys)
+    # One row per pair: its last prefix trigram in common, and how many it shares in the prefixes up to there.
+    # Trigrams after that one bound what else the pair can share
+    last = np.append(pair_keys[1:] != pair_keys[:-1], True)
+    shared = np.diff(np.flatnonzero(last), prepend=-1)
+    id_a, id_b = pairs['id_a'].to_numpy()[last], pairs['id_b'].to_numpy()[last]
+    most_shared = shared + np.minimum(sizes[id_a] - 1 - pairs['position_a'].to_numpy()[last],
+                                      sizes[id_b] - 1 - pairs['position_b'].to_numpy()[last])
+    candidates = 2 * most_shared >= NEAR_DUPLICATE_MIN_OVERLAP * (sizes[id_a] + sizes[id_b]) - 1e-9
+
+    # Confirm the survivors and join them into clusters (union-find over value ids)
+    parents = {}
+
+    def root(i):
+        while parents.get(i, i) != i:
+            i = parents[i]
+        return i
+
+    for a, b in zip(id_a[candidates].tolist(), id_b[candidates].tolist()):
+        if (2 * len(gram_sets[a] & gram_sets[b]) >= NEAR_DUPLICATE_MIN_OVERLAP * (sizes[a] + sizes[b])
+                and difflib.SequenceMatcher(None, keys[a], keys[b]).ratio() >= NEAR_DUPLICATE_SIMILARITY):
+            parents[root(b)] = root(a)
+    clusters = {}
+    for i in parents:
+        clusters.setdefault(root(i), set()).update({i, root(i)})
     results = []
-    for value in series.unique():
-        if not isinstance(value, str):
+    for members in clusters.values():
+        spellings = sorted(((values[i], counts[values[i]]) for i in members), key=lambda item: (-item[1], item[0]))
+        results.append((spellings[0][0], spellings))
+    return sorted(results)
+
+
+def report(df_enhanced_v2, validation_counts, metrics=None, cache_stats=None):
+    """Write summary.txt: validation counts, changelog, cache counters, cleanup diagnostics and stage metrics."""
+    import pandas as pd
+
+    metrics = metrics if metrics is not None else new_run_metrics()
+    cache_stats = cache_stats if cache_stats is not None else canonicalization_cache_stats()
+    begin_stage(metrics, 'diagnostics', rows_in=len(df_enhanced_v2))
+    # Write summary info to txt file for human review
+    with atomic_write('output/summary.txt', encoding='utf-8') as file:
+        # Section: Validation Counts (E)
+        file.write('=' * 60 + '\n')
+        file.write('VALIDATION COUNTS\n')
+        file.write('=' * 60 + '\n')
+        file.write(f"Rows fetched from API:          {validation_counts['rows_fetched']}\n")
+        file.write(f"Rows after header trim:         {validation_counts['rows_after_header_trim']}\n")
+        file.write(f"Rows filtered (keywords):       {validation_counts['rows_filtered_keywords']}\n")
+        file.write(f"Rows after keyword filter:      {validation_counts['rows_after_keyword_filter']}\n")
+        file.write(f"Rows missing data:              {validation_counts['rows_missing_data']}\n")
+        file.write(f"Rows with meaningful data:      {validation_counts['rows_with_meaningful_data']}\n")
+        file.write(f"Artifact lines without rank:    {validation_counts['artifact_lines_no_rank']}\n")
+        file.write(f"Main stat lines without slot:   {validation_counts['main_stat_lines_no_slot']}\n")
+        file.write(f"Substat lines without rank:     {validation_counts['substat_lines_no_rank']}\n")
+        file.write(f"Skipped (main=substat):         {validation_counts['skipped_duplicate_main_substat']}\n")
+        file.write(f"Final output rows:              {validation_counts['final_output_rows']}\n")
+        file.write('\n')
+
+        # Section: Changes (from changes.json, so `report` rewrites it too)
+        file.write('=' * 60 + '\n')
+        file.write('CHANGES SINCE THE PREVIOUS BUILD (last build that changed the rows)\n')
+        file.write('=' * 60 + '\n')
+        changes = load_changes()
+        if changes is None:
+            file.write("No previous build to compare with.\n")
+        else:
+            file.write('\n'.join(changelog_lines(changes)) + '\n')
+        file.write('\n')
+
+        # Section: Canonicalization cache
+        file.write('=' * 60 + '\n')
+        file.write('CANONICALIZATION CACHE\n')
+        file.write('=' * 60 + '\n')
+        for cache_label, stats in cache_stats.items():
+            file.write(f"{cache_label + ' hits:':<32}{stats['hits']}\n")
+            file.write(f"{cache_label + ' misses:':<32}{stats['misses']}\n")
+        file.write('\n')
+
+        # Section: Suspicious Strings (B)
+        file.write('=' * 60 + '\n')
+        file.write('SUSPICIOUS STRINGS (may need cleanup)\n')
+        file.write('=' * 60 + '\n')
+        suspicious_found = False
+        for col_name, col_label in [('Artifact Set', 'Artifact Sets'),
+                                     ('Main Stat', 'Main Stats'),
+                                     ('Substat', 'Substats'),
+                                     ('Character', 'Characters'),
+                                     ('Role', 'Roles')]:
+            # Exclude known canonical artifact set categories from percentage check
+            allowed = ARTIFACT_SET_CATEGORIES if col_name == 'Artifact Set' else None
+            suspicious = find_suspicious_strings(df_enhanced_v2[col_name], allowed)
+            if suspicious:
+                suspicious_found = True
+                file.write(f"\n{col_label}:\n")
+                for value, reason in suspicious:
+                    file.write(f"  - \"{value}\" ({reason})\n")
+        if not suspicious_found:
+            file.write("None found.\n")
+        file.write('\n')
+
+        # Section: Near-duplicate names
+        file.write('=' * 60 + '\n')
+        file.write('NEAR-DUPLICATE NAMES (suggested canonical form first)\n')
+        file.write('=' * 60 + '\n')
+        near_duplicates_found = False
+        for col_name, col_label in [('Artifact Set', 'Artifact Sets'),
+                                     ('Main Stat', 'Main Stats'),
+                                     ('Substat', 'Substats'),
+                                     ('Character', 'Characters'),
+                                     ('Role', 'Roles')]:
+            near_duplicates = find_near_duplicates(df_enhanced_v2[col_name])
+            if near_duplicates:
+                near_duplicates_found = True
+                file.write(f"\n{col_label}:\n")
+                for suggested, spellings in near_duplicates:
+                    file.write(f"  - \"{suggested}\": " + ', '.join(f"\"{value}\" (count: {count})" for value, count in spellings) + '\n')
+        if not near_duplicates_found:
+            file.write("None found.\n")
+        file.write('\n')
+
+        # Section: Low Frequency Values (A)
+        file.write('=' * 60 + '\n')
+        file.write('LOW FREQUENCY VALUES (count <= 2, may be typos)\n')
+        file.write('=' * 60 + '\n')
+        low_freq_found = False
+        for col_name, col_label in [('Artifact Set', 'Artifact Sets'),
+                                     ('Main Stat', 'Main Stats'),
+                                     ('Substat', 'Substats')]:
+            low_freq = find_low_frequency_values(df_enhanced_v2[col_name])
+            if len(low_freq) > 0:
+                low_freq_found = True
+                file.write(f"\n{col_label}:\n")
+                for value, count in low_freq.items():
+                    file.write(f"  - \"{value}\" (count: {count})\n")
+        if not low_freq_found:
+            file.write("None found.\n")
+        file.write('\n')
+
+        # Section: DataFrame info
+        file.write('=' * 60 + '\n')
+        file.write('DATAFRAME INFO\n')
+        file.write('=' * 60 + '\n')
+        df_enhanced_v2.info(buf=file)
+        file.write('\n\n')
+
+        # Section: Unique value counts
+        file.write('=' * 60 + '\n')
+        file.write('UNIQUE VALUE COUNTS\n')
+        file.write('=' * 60 + '\n\n')
+
+        file.write('UNIQUE CHARACTERS\n')
+        character_lines = pd.DataFrame(sorted(df_enhanced_v2['Character'].value_counts().items()), columns=['Name', 'Count'])
+        file.write(character_lines.to_string(index=False) + '\n\n')
+
+        file.write('UNIQUE ARTIFACT SETS\n')
+        artifact_sets_lines = pd.DataFrame(sorted(df_enhanced_v2['Artifact Set'].value_counts().items()), columns=['Name', 'Count'])
+        file.write(artifact_sets_lines.to_string(index=False) + '\n\n')
+
+        file.write('UNIQUE ARTIFACT SLOTS\n')
+        artifact_slots = pd.DataFrame(sorted(df_enhanced_v2['Artifact Slot'].value_counts().items()), columns=['Name', 'Count'])
+        file.write(artifact_slots.to_string(index=False) + '\n\n')
+
+        file.write('UNIQUE MAIN STATS\n')
+        main_stat_lines = pd.DataFrame(sorted(df_enhanced_v2['Main Stat'].value_counts().items()), columns=['Name', 'Count'])
+        file.write(main_stat_lines.to_string(index=False) + '\n\n')
+
+        file.write('UNIQUE SUBSTATS\n')
+        substat_lines = pd.DataFrame(sorted(df_enhanced_v2['Substat'].value_counts().items()), columns=['Name', 'Count'])
+        file.write(substat_lines.to_string(index=False) + '\n')
+
+        # Section: Stage metrics (diagnostics stops here, so its own time excludes writing this table)
+        begin_stage(metrics)
+        file.write('\n' + '=' * 60 + '\n')
+        file.write('STAGE METRICS\n')
+        file.write('=' * 60 + '\n')
+        stage_table = pd.DataFrame.from_dict(metrics['stages'], orient='index').rename_axis('stage').dropna(axis=1, how='all')
+        stage_table[['rows_in', 'rows_out']] = stage_table[['rows_in', 'rows_out']].astype('Int64')
+        file.write(stage_table.to_string(na_rep='-') + '\n')
+
+
+def write_metrics(metrics, validation_counts, cache_stats, path=METRICS_PATH):
+    """Write stage metrics, validation counts and cache counters; with profiling, also the slowest stage's stats."""
+    payload = {'stages': metrics['stages'], 'counts': validation_counts, 'cache': cache_stats}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if metrics['profiles']:
+        slowest_stage = max(metrics['profiles'], key=lambda name: metrics['stages'][name]['wall_s'])
+        profile_path = os.path.join(os.path.dirname(path), f"profile_{slowest_stage}.prof")
+        metrics['profiles'][slowest_stage].dump_stats(profile_path)
+        payload['profile'] = {'stage': slowest_stage, 'path': profile_path}
+        print(f"Slowest stage: {slowest_stage}; cProfile stats written to {profile_path} (python -m pstats {profile_path})")
+    with atomic_write(path, encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+
+
+def load_build_outputs(metrics_path=METRICS_PATH):
+    """The last build's flattened rows (from its Arrow, Parquet or CSV file) and its metrics.json."""
+    dataset_format = last_dataset_format(load_output_manifest()['files'])
+    if dataset_format is None:
+        raise FileNotFoundError("No flattened dataset in output/; run a build first.")
+    with open(metrics_path, 'r', encoding='utf-8') as f:
+        return load_dataset(DATASET_PATHS[dataset_format]), json.load(f)
+
+
+def file_sha256(path):
+    """sha256 hex digest of the file at path, or None if there is none."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def publish(directory=PUBLISH_DIR):
+    """Copy the last build's evaluator page into directory as index.html, with the shards and changes.json it loads.
+
+    A file is copied (with its .gz/.br siblings) only when the target's size or sha256 differs from
+    the output manifest's entry; published shards the page no longer loads are removed.
+    Returns the paths copied.
+    """
+    files = load_output_manifest()['files']
+    if 'artifact_evaluator.html' not in files:
+        raise FileNotFoundError("No evaluator page in the output manifest; run a build first.")
+    shard_prefix = output_key(DATA_SHARD_DIR) + '/'
+    targets = {'artifact_evaluator.html': 'index.html'}
+    targets.update({key: key for key in files if key.startswith(shard_prefix) or key == output_key(CHANGES_PATH)})
+
+    copied = []
+    for key, target in targets.items():
+        entry = files[key]
+        target_path = os.path.join(directory, target)
+        suffixes = [''] + entry.get('variants', [])
+        if (all(os.path.exists(target_path + suffix) for suffix in suffixes)
+                and os.path.getsize(target_path) == entry['bytes']
+                and file_sha256(target_path) == entry['sha256']):
             continue
-        for pattern, reason in suspicious_patterns:
-            if re.search(pattern, value):
-                # Skip percentage check for known canonical category names
-                if 'percentage' in reason and value in allowed_percentages:
-                    continue
-                results.append((value, reason))
-                break  # Only report first matching reason per value
-    return results
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        source_path = os.path.join(os.path.dirname(OUTPUT_MANIFEST_PATH), key)
+        for suffix in suffixes:
+            with open(source_path + suffix, 'rb') as source, atomic_write(target_path + suffix, 'wb') as f:
+                shutil.copyfileobj(source, f)
+        copied.append(target_path)
+
+    shard_dir = os.path.join(directory, shard_prefix)
+    if os.path.isdir(shard_dir):
+        for filename in os.listdir(shard_dir):
+            shard_name = filename[:filename.find('.json') + len('.json')]
+            if '.json' in filename and shard_prefix + shard_name not in targets:
+                os.remove(os.path.join(shard_dir, filename))
+    return copied
+
+
+def log_watch(record, log_path=WATCH_LOG_PATH):
+    """Print a watch poll's outcome and append it to log_path as one JSON line."""
+    if 'error' in record:
+        print(f"{record['time']} poll {record['poll']} failed: {record['error']}; retrying in {record['retry_s']:g} s",
+              file=sys.stderr, flush=True)
+    else:
+        stage_times = ', '.join(f"{stage} {wall_s:.2f}" for stage, wall_s in record['stages'].items())
+        print(f"{record['time']} rebuilt in {record['wall_s']:.2f} s (changed tabs: "
+              f"{', '.join(record['changed_tabs']) or 'none'}; {record['rows']} rows): {stage_times}", flush=True)
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def watch(batch_get=None, snapshot_dir=SNAPSHOT_DIR, interval=300.0, max_interval=3600.0, polls=None,
+          build_options=None, log_path=WATCH_LOG_PATH):
+    """Poll the sheet every interval seconds and rebuild, report and write metrics when a tab's content changes.
+
+    Runs in one process, so the sheet client (batch_get, default the Google Sheets API), pandas, the
+    compiled cleaners and their caches load once. Cleaned and parsed tabs and the block cache stay in
+    memory between builds: a rebuild cleans and parses only the changed tabs, normalizes and expands
+    only the changed blocks and patches the index (and, as in any build, rewrites only changed outputs).
+    The first poll always builds. A failed poll is retried after a delay that doubles with each
+    consecutive failure, up to max_interval. Each rebuild or failure is logged (see log_watch).
+    Runs until interrupted, or for polls polls.
+    """
+    import pandas as pd  # noqa: F401 (loaded before the first poll, not billed to its fetch)
+
+    batch_get = batch_get if batch_get is not None else google_batch_get()
+    build_options = dict(build_options or {})
+    block_cache, tab_cache = load_block_cache(BLOCK_CACHE_PATH), {}
+    built = False
+    failures = 0
+    poll = 0
+    while polls is None or poll < polls:
+        poll += 1
+        metrics = new_run_metrics()
+        start = time.perf_counter()
+        try:
+            value_ranges, changed_tabs = fetch(snapshot_dir, metrics, batch_get)
+            if built and not changed_tabs:
+                print(f"{time.strftime('%Y-%m-%dT%H:%M:%S')} no tab changed", flush=True)
+            else:
+                df_enhanced_v2, validation_counts = build(
+                    value_ranges, metrics, block_cache=block_cache, tab_cache=tab_cache, **build_options
+                )
+                cache_stats = canonicalization_cache_stats()
+                report(df_enhanced_v2, validation_counts, metrics, cache_stats)
+                write_metrics(metrics, validation_counts, cache_stats)
+                build_options['full_rebuild'] = False
+                built = True
+                log_watch({
+                    'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'poll': poll,
+                    'changed_tabs': changed_tabs,
+                    'rows': validation_counts['final_output_rows'],
+                    'wall_s': round(time.perf_counter() - start, 4),
+                    'stages': {stage: measured['wall_s'] for stage, measured in metrics['stages'].items()},
+                }, log_path)
+            failures = 0
+        except Exception as error:  # a sheet or network error must not stop the watcher
+            begin_stage(metrics)
+            # The snapshot may already hold the new content, so the next poll rebuilds whether or not it changes
+            built = False
+            failures += 1
+            log_watch({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'poll': poll,
+                'error': f"{type(error).__name__}: {error}",
+                'retry_s': min(interval * 2 ** failures, max_interval),
+            }, log_path)
+        if polls is None or poll < polls:
+            time.sleep(min(interval * 2 ** failures, max_interval))
+    return poll
+
+
+COMMANDS = {
+    'fetch': "fetch the sheet into the snapshot directory, without building",
+    'build': "build the dataset files, artifact_data.json and the HTML from the stored snapshot",
+    'report': "write summary.txt for the last build from its dataset file and metrics.json",
+    'all': "fetch (or load, with --offline), build and report (the default)",
+    'publish': "copy the last build's page (and data shards) into --publish-dir, skipping unchanged files",
+    'watch': "poll the sheet every --interval seconds; rebuild and report, in memory, only when a tab changed",
+}
 
-# Write summary info to txt file for human review
-with open('output/summary.txt', 'w', encoding='utf-8') as file:
-    # Section: Validation Counts (E)
-    file.write('=' * 60 + '\n')
-    file.write('VALIDATION COUNTS\n')
-    file.write('=' * 60 + '\n')
-    file.write(f"Rows fetched from API:          {validation_counts['rows_fetched']}\n")
-    file.write(f"Rows after header trim:         {validation_counts['rows_after_header_trim']}\n")
-    file.write(f"Rows filtered (keywords):       {validation_counts['rows_filtered_keywords']}\n")
-    file.write(f"Rows after keyword filter:      {validation_counts['rows_after_keyword_filter']}\n")
-    file.write(f"Rows missing data:              {validation_counts['rows_missing_data']}\n")
-    file.write(f"Rows with meaningful data:      {validation_counts['rows_with_meaningful_data']}\n")
-    file.write(f"Artifact lines without rank:    {validation_counts['artifact_lines_no_rank']}\n")
-    file.write(f"Main stat lines without slot:   {validation_counts['main_stat_lines_no_slot']}\n")
-    file.write(f"Substat lines without rank:     {validation_counts['substat_lines_no_rank']}\n")
-    file.write(f"Skipped (main=substat):         {validation_counts['skipped_duplicate_main_substat']}\n")
-    file.write(f"Final output rows:              {validation_counts['final_output_rows']}\n")
-    file.write('\n')
-
-    # Section: Suspicious Strings (B)
-    file.write('=' * 60 + '\n')
-    file.write('SUSPICIOUS STRINGS (may need cleanup)\n')
-    file.write('=' * 60 + '\n')
-    suspicious_found = False
-    for col_name, col_label in [('Artifact Set', 'Artifact Sets'),
-                                 ('Main Stat', 'Main Stats'),
-                                 ('Substat', 'Substats'),
-                                 ('Character', 'Characters'),
-                                 ('Role', 'Roles')]:
-        # Exclude known canonical artifact set categories from percentage check
-        allowed = ARTIFACT_SET_CATEGORIES if col_name == 'Artifact Set' else None
-        suspicious = find_suspicious_strings(df_enhanced_v2[col_name], allowed)
-        if suspicious:
-            suspicious_found = True
-            file.write(f"\n{col_label}:\n")
-            for value, reason in suspicious:
-                file.write(f"  - \"{value}\" ({reason})\n")
-    if not suspicious_found:
-        file.write("None found.\n")
-    file.write('\n')
-
-    # Section: Low Frequency Values (A)
-    file.write('=' * 60 + '\n')
-    file.write('LOW FREQUENCY VALUES (count <= 2, may be typos)\n')
-    file.write('=' * 60 + '\n')
-    low_freq_found = False
-    for col_name, col_label in [('Artifact Set', 'Artifact Sets'),
-                                 ('Main Stat', 'Main Stats'),
-                                 ('Substat', 'Substats')]:
-        low_freq = find_low_frequency_values(df_enhanced_v2[col_name])
-        if len(low_freq) > 0:
-            low_freq_found = True
-            file.write(f"\n{col_label}:\n")
-            for value, count in low_freq.items():
-                file.write(f"  - \"{value}\" (count: {count})\n")
-    if not low_freq_found:
-        file.write("None found.\n")
-    file.write('\n')
-
-    # Section: DataFrame info
-    file.write('=' * 60 + '\n')
-    file.write('DATAFRAME INFO\n')
-    file.write('=' * 60 + '\n')
-    df_enhanced_v2.info(buf=file)
-    file.write('\n\n')
-
-    # Section: Unique value counts
-    file.write('=' * 60 + '\n')
-    file.write('UNIQUE VALUE COUNTS\n')
-    file.write('=' * 60 + '\n\n')
-
-    file.write('UNIQUE CHARACTERS\n')
-    character_lines = pd.DataFrame(sorted(df_enhanced_v2['Character'].value_counts().items()), columns=['Name', 'Count'])
-    file.write(character_lines.to_string(index=False) + '\n\n')
-
-    file.write('UNIQUE ARTIFACT SETS\n')
-    artifact_sets_lines = pd.DataFrame(sorted(df_enhanced_v2['Artifact Set'].value_counts().items()), columns=['Name', 'Count'])
-    file.write(artifact_sets_lines.to_string(index=False) + '\n\n')
-
-    file.write('UNIQUE ARTIFACT SLOTS\n')
-    artifact_slots = pd.DataFrame(sorted(df_enhanced_v2['Artifact Slot'].value_counts().items()), columns=['Name', 'Count'])
-    file.write(artifact_slots.to_string(index=False) + '\n\n')
-
-    file.write('UNIQUE MAIN STATS\n')
-    main_stat_lines = pd.DataFrame(sorted(df_enhanced_v2['Main Stat'].value_counts().items()), columns=['Name', 'Count'])
-    file.write(main_stat_lines.to_string(index=False) + '\n\n')
-
-    file.write('UNIQUE SUBSTATS\n')
-    substat_lines = pd.DataFrame(sorted(df_enhanced_v2['Substat'].value_counts().items()), columns=['Name', 'Count'])
-    file.write(substat_lines.to_string(index=False) + '\n')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build the artifact evaluator from the recommendations sheet.",
+        epilog='commands: ' + '; '.join(f"{name}: {help_text}" for name, help_text in COMMANDS.items()),
+    )
+    parser.add_argument('command', nargs='?', choices=list(COMMANDS), default='all', help="pipeline steps to run")
+    parser.add_argument(
+        '--expansion', choices=['columnar', 'loop'], default='columnar',
+        help="row expansion engine; 'loop' is the row-by-row reference implementation",
+    )
+    parser.add_argument(
+        '--check-expansion', action='store_true',
+        help="also run the reference loop expansion and fail if its rows or counts differ",
+    )
+    parser.add_argument(
+        '--offline', '--from-snapshot', dest='offline', action='store_true',
+        help="rebuild from the local sheet snapshot instead of fetching",
+    )
+    parser.add_argument(
+        '--skip-unchanged', action='store_true',
+        help="fetch, then stop without rebuilding if no tab's content hash changed since the last snapshot",
+    )
+    parser.add_argument(
+        '--snapshot-dir', default=SNAPSHOT_DIR,
+        help="where fetched sheet tabs are stored (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--sheet-file',
+        help="fetch from this saved batchGet response (JSON with valueRanges, reread each fetch) instead of Google",
+    )
+    parser.add_argument(
+        '--sources',
+        help="fetch and all: JSON list of sheet sources (see sheet_sources.py) to fetch concurrently; the first "
+             f"is built, the others are only snapshotted under {SOURCE_SNAPSHOT_DIR}/<name>",
+    )
+    parser.add_argument(
+        '--fetch-concurrency', type=int, default=8,
+        help="with --sources: requests in flight at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--fetch-retries', type=int, default=4,
+        help="with --sources: retries per request on connection errors and 429/5xx responses (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--interval', type=float, default=300.0,
+        help="watch: seconds between polls (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--max-interval', type=float, default=3600.0,
+        help="watch: longest delay before retrying after repeated failed polls (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--polls', type=int,
+        help="watch: stop after this many polls (default: run until interrupted)",
+    )
+    parser.add_argument(
+        '--full-rebuild', action='store_true',
+        help="ignore cached character blocks and rebuild every block and index from scratch",
+    )
+    parser.add_argument(
+        '--dataset-format', dest='dataset_formats', nargs='+', choices=list(DATASET_PATHS),
+        default=['csv', 'arrow'],
+        help="flattened dataset files to write to output/ (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--json-schema', choices=['plain', 'encoded'], default='plain',
+        help="'encoded' dictionary-encodes artifact_data.json and the embedded copy (integer refs into meta tables)",
+    )
+    parser.add_argument(
+        '--check-json', action='store_true',
+        help="fail if the published JSON's cell references do not resolve back to the full web index",
+    )
+    parser.add_argument(
+        '--data-layout', choices=['single', 'sharded'], default='single',
+        help="'sharded' embeds only meta in the HTML and writes per-set/per-slot data files it fetches on demand",
+    )
+    parser.add_argument(
+        '--publish-dir', default=PUBLISH_DIR,
+        help="where publish copies the page, as index.html (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help="profile each stage with cProfile and write the slowest stage's stats to output/profile_<stage>.prof",
+    )
+    parser.add_argument(
+        '--trace-memory', action='store_true',
+        help="also record each stage's tracemalloc peak (slows the build down)",
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="processes for tab parsing and block expansion (default: %(default)s, i.e. serial)",
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.interval <= 0 or args.max_interval < args.interval:
+        parser.error("--interval must be positive and at most --max-interval")
+    if args.polls is not None and args.polls < 1:
+        parser.error("--polls must be at least 1")
+    if args.fetch_concurrency < 1 or args.fetch_retries < 0:
+        parser.error("--fetch-concurrency must be at least 1 and --fetch-retries at least 0")
+    if args.sources and (args.sheet_file or args.command == 'watch'):
+        parser.error("--sources works with fetch and all, and not with --sheet-file")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.trace_memory:
+        tracemalloc.start()
+    metrics = new_run_metrics(profile=args.profile)
+
+    if args.command == 'publish':
+        copied = publish(args.publish_dir)
+        print(f"Published {len(copied)} changed file(s) to {args.publish_dir}")
+        return 0
+
+    batch_get = file_batch_get(args.sheet_file) if args.sheet_file else None
+    build_options = dict(
+        workers=args.workers, expansion=args.expansion, full_rebuild=args.full_rebuild,
+        json_schema=args.json_schema, data_layout=args.data_layout,
+        check_expansion=args.check_expansion, check_json=args.check_json, dataset_formats=args.dataset_formats,
+    )
+    if args.command == 'watch':
+        try:
+            watch(batch_get, args.snapshot_dir, args.interval, args.max_interval, args.polls, build_options)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+        return 0
+
+    if args.command == 'report':
+        df_enhanced_v2, previous_metrics = load_build_outputs()
+        metrics['stages'].update(previous_metrics['stages'])
+        report(df_enhanced_v2, previous_metrics['counts'], metrics, previous_metrics['cache'])
+        write_metrics(metrics, previous_metrics['counts'], previous_metrics['cache'])
+        return 0
+
+    # Fetch data, or rebuild from the last snapshot
+    tab_cache = None
+    if args.command == 'fetch' or (args.command == 'all' and not args.offline):
+        if args.sources:
+            import sheet_sources
+
+            ingested = ingest(sheet_sources.load_sources(args.sources), args.snapshot_dir, metrics,
+                              args.fetch_concurrency, args.fetch_retries, clean=args.command != 'fetch')
+            fetched = [(name, result['snapshot_dir'], result['changed_tabs']) for name, result in ingested.items()]
+            built_source = next(iter(ingested.values()))
+            value_ranges, changed_tabs, tab_cache = (
+                built_source['value_ranges'], built_source['changed_tabs'], built_source['tab_cache']
+            )
+        else:
+            value_ranges, changed_tabs = fetch(args.snapshot_dir, metrics, batch_get)
+            fetched = [(None, args.snapshot_dir, changed_tabs)]
+        if args.command == 'fetch':
+            for name, directory, source_changed_tabs in fetched:
+                print(f"Snapshot {f'of {name} ' if name else ''}saved to {directory}; "
+                      f"changed tabs: {', '.join(source_changed_tabs) or 'none'}")
+            return 0
+        if args.skip_unchanged and not changed_tabs:
+            print("No sheet tab changed since the last snapshot; skipping rebuild.")
+            return 0
+    else:
+        value_ranges = load_sheet(args.snapshot_dir, metrics)
+
+    df_enhanced_v2, validation_counts = build(value_ranges, metrics, tab_cache=tab_cache, **build_options)
+    cache_stats = canonicalization_cache_stats()
+    if args.command == 'all':
+        report(df_enhanced_v2, validation_counts, metrics, cache_stats)
+    write_metrics(metrics, validation_counts, cache_stats)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""Triage a whole artifact inventory (a GOOD format export) against the web index: keep or fodder.
+
+    python inventory.py good_export.json
+    python inventory.py good_export.json --top 4 --min-matches 3 --json output/inventory_report.json
+
+Every artifact is looked up in output/artifact_data.json by set, slot and main stat (byArtifact, or
+the set's fixedSlots for Flower/Feather) to find the character+roles that want it, then scored by
+how many of its substats rank in each one's top N. The index is flattened into demand rows once;
+substats are bitmasks, so scoring the inventory is a few NumPy gathers and a popcount.
+"""
+import argparse
+import json
+import re
+import sys
+import time
+
+import numpy as np
+
+import genshin
+
+INDEX_PATH = 'output/artifact_data.json'
+
+# GOOD keys -> the sheet's names for them. Stats the sheet spells more than one way list every spelling.
+SLOT_KEYS = {'Sands': 'sands', 'Goblet': 'goblet', 'Circlet': 'circlet'}
+# Flower and Feather have fixed main stats; both score against the set's fixedSlots
+FIXED_SLOT_KEYS = ('flower', 'plume')
+MAIN_STAT_NAMES = {
+    'hp_': ('HP%',),
+    'atk_': ('ATK%',),
+    'def_': ('DEF%',),
+    'eleMas': ('EM', 'Elemental Mastery'),
+    'enerRech_': ('Energy Recharge', 'ER'),
+    'heal_': ('Healing Bonus',),
+    'critRate_': ('Crit Rate',),
+    'critDMG_': ('Crit DMG',),
+    'physical_dmg_': ('Physical DMG',),
+    **{f"{element}_dmg_": (f"{element.capitalize()} DMG",)
+       for element in ('anemo', 'geo', 'electro', 'hydro', 'pyro', 'cryo', 'dendro')},
+}
+SUBSTAT_NAMES = {
+    'hp': ('Flat HP', 'HP'),
+    'atk': ('Flat ATK', 'ATK'),
+    'def': ('DEF', 'Flat DEF'),
+    'hp_': ('HP%',),
+    'atk_': ('ATK%',),
+    'def_': ('DEF%',),
+    'eleMas': ('EM', 'Elemental Mastery'),
+    'enerRech_': ('Energy Recharge', 'ER'),
+    'critRate_': ('Crit Rate',),
+    'critDMG_': ('Crit DMG',),
+}
+# One bit per GOOD substat key
+SUBSTAT_BITS = {key: 1 << bit for bit, key in enumerate(SUBSTAT_NAMES)}
+SUBSTAT_MASK_VALUES = np.array(list(SUBSTAT_BITS.values()), dtype=np.uint16)
+# Substat rank for substats a character+role does not list
+NOT_WANTED = 255
+
+
+def good_set_key(artifact_set):
+    """GOOD setKey for a sheet set name, e.g. "Gladiator's Finale" -> "GladiatorsFinale"."""
+    words = re.split(r'[^0-9A-Za-z]+', artifact_set.replace("'", ''))
+    return ''.join(word[:1].upper() + word[1:] for word in words)
+
+
+def load_index(path=INDEX_PATH):
+    """Load artifact_data.json as the plain web index, whichever schema genshin.py wrote it in."""
+    with open(path, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+    if 'shards' in payload:
+        raise ValueError(f"{path} only lists data shards; rebuild with --data-layout single.")
+    payload = genshin.decode_web_json(payload)
+    return genshin.resolve_cells(payload) if 'cells' in payload else payload
+
+
+def build_demand(web_json):
+    """Flatten the web index into one demand row per (cell, character+role), grouped by cell.
+
+    Cells are keyed by GOOD (setKey, slotKey, mainStatKey), with Flower/Feather under
+    (setKey, genshin.FIXED_SLOT, None); sheet spellings of one stat merge into the same cell, each
+    character+role keeping its best set rank and substat ranks. Returns a dict of the cell lookup
+    (key -> position in starts/stops), the (character, role) pairs, and per row arrays of pair id,
+    set rank, preferred flag and a NOT_WANTED-filled rank for each GOOD substat. Sheet substats with
+    no GOOD equivalent are listed under 'unmapped'.
+    """
+    main_stat_keys = {}
+    for key, names in MAIN_STAT_NAMES.items():
+        for name in names:
+            main_stat_keys.setdefault(name, []).append(key)
+    substat_positions = {name: position for position, key in enumerate(SUBSTAT_NAMES)
+                         for name in SUBSTAT_NAMES[key]}
+    unmapped = set()
+    cells = {}
+
+    def add_cell(key, cell):
+        rows = cells.setdefault(key, {})
+        for entry in cell['characters']:
+            pair = (entry['character'], entry['role'])
+            set_rank, preferred, ranks = rows.get(pair, (entry['setRank'], entry['preferred'], None))
+            rows[pair] = (min(set_rank, entry['setRank']), preferred or entry['preferred'],
+                          ranks or [NOT_WANTED] * len(SUBSTAT_NAMES))
+        for entry in cell['substats']:
+            position = substat_positions.get(entry['substat'])
+            if position is None:
+                unmapped.add(entry['substat'])
+                continue
+            for pair in entry['characterRoles']:
+                ranks = rows[(pair['character'], pair['role'])][2]
+                ranks[position] = min(ranks[position], entry['rank'])
+
+    for artifact_set, set_data in web_json['bySet'].items():
+        set_key = good_set_key(artifact_set)
+        for slot, main_stat_data in set_data['slots'].items():
+            if slot not in SLOT_KEYS:
+                continue
+            for main_stat, cell in main_stat_data.items():
+                for main_stat_key in main_stat_keys.get(main_stat, ()):
+                    add_cell((set_key, SLOT_KEYS[slot], main_stat_key), cell)
+        add_cell((set_key, genshin.FIXED_SLOT, None), set_data['fixedSlots'])
+
+    pair_ids = {}
+    starts, stops = [], []
+    row_pairs, set_ranks, preferred, substat_ranks = [], [], [], []
+    for rows in cells.values():
+        starts.append(len(row_pairs))
+        for pair, (set_rank, is_preferred, ranks) in rows.items():
+            row_pairs.append(pair_ids.setdefault(pair, len(pair_ids)))
+            set_ranks.append(set_rank)
+            preferred.append(is_preferred)
+            substat_ranks.append(ranks)
+        stops.append(len(row_pairs))
+    return {
+        'cells': {key: i for i, key in enumerate(cells)},
+        'starts': np.array(starts, dtype=np.int64),
+        'stops': np.array(stops, dtype=np.int64),
+        'pairs': list(pair_ids),
+        'pair': np.array(row_pairs, dtype=np.int32),
+        'set_rank': np.array(set_ranks, dtype=np.int16),
+        'preferred': np.array(preferred, dtype=bool),
+        'ranks': np.array(substat_ranks, dtype=np.uint8).reshape(-1, len(SUBSTAT_NAMES)),
+        'unmapped': sorted(unmapped),
+    }
+
+
+def load_good(path):
+    """Artifacts from a GOOD (Genshin Open Object Description) export."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('format') != 'GOOD':
+        raise ValueError(f"{path} is not a GOOD export (format is {data.get('format')!r}).")
+    return data.get('artifacts', [])
+
+
+def encode_inventory(demand, artifacts):
+    """Per artifact: its demand cell (-1 if the index has none), substat bitmask and rarity."""
+    cells = demand['cells']
+    cell_ids, masks = [], []
+    for artifact in artifacts:
+        slot = artifact.get('slotKey')
+        if slot in FIXED_SLOT_KEYS:
+            key = (artifact.get('setKey'), genshin.FIXED_SLOT, None)
+        else:
+            key = (artifact.get('setKey'), slot, artifact.get('mainStatKey'))
+        cell_ids.append(cells.get(key, -1))
+        mask = 0
+        for substat in artifact.get('substats', ()):
+            mask |= SUBSTAT_BITS.get(substat.get('key'), 0)
+        masks.append(mask)
+    return (
+        np.array(cell_ids, dtype=np.int64),
+        np.array(masks, dtype=np.uint16),
+        np.array([artifact.get('rarity', 0) for artifact in artifacts], dtype=np.int8),
+    )
+
+
+def evaluate(demand, artifacts, top=3, min_matches=2, min_rarity=5):
+    """Score every artifact against every character+role that wants its set/slot/main stat.
+
+    A character+role fits an artifact when at least min_matches of its substats rank in their top
+    top; artifacts below min_rarity are not scored. Returns a dict of per-artifact arrays (cell,
+    rarity, wanted_by, best_matches, fitting, keep) plus each artifact's candidate demand rows, best
+    first: candidates[offsets[i]:offsets[i] + wanted_by[i]] with their matches.
+    """
+    cell_ids, masks, rarity = encode_inventory(demand, artifacts)
+    want = (demand['ranks'] <= top).astype(np.uint16) @ SUBSTAT_MASK_VALUES
+
+    scored = (cell_ids >= 0) & (rarity >= min_rarity)
+    # Only scored artifacts look up their cell: -1 (no cell) is not a valid position, even in an empty index
+    starts = np.zeros(len(artifacts), dtype=np.int64)
+    wanted_by = np.zeros(len(artifacts), dtype=np.int64)
+    starts[scored] = demand['starts'][cell_ids[scored]]
+    wanted_by[scored] = demand['stops'][cell_ids[scored]] - starts[scored]
+    offsets = np.cumsum(wanted_by) - wanted_by
+    # One (artifact, demand row) pair per character+role wanting each artifact's cell
+    owner = np.repeat(np.arange(len(artifacts)), wanted_by)
+    rows = np.repeat(starts - offsets, wanted_by) + np.arange(wanted_by.sum())
+    matches = np.bitwise_count(masks[owner] & want[rows]).astype(np.int8)
+
+    best_matches = np.zeros(len(artifacts), dtype=np.int8)
+    np.maximum.at(best_matches, owner, matches)
+    fitting = np.bincount(owner[matches >= min_matches], minlength=len(artifacts))
+    # Within each artifact: most matching substats, then preferred roles, then best set rank
+    order = np.lexsort((demand['set_rank'][rows], ~demand['preferred'][rows], -matches, owner))
+    return {
+        'cell': cell_ids,
+        'rarity': rarity,
+        'wanted_by': wanted_by,
+        'best_matches': best_matches,
+        'fitting': fitting,
+        'keep': fitting > 0,
+        'offsets': offsets,
+        'candidates': rows[order],
+        'candidate_matches': matches[order],
+    }
+
+
+def ranked_report(demand, artifacts, result, top=3, min_matches=2, min_rarity=5, candidates=3):
+    """Artifacts best first (keeps, by best fit and number of fitting character+roles, then fodder)."""
+    order = np.lexsort((-result['fitting'], -result['best_matches'], ~result['keep']))
+    report = []
+    for i in order.tolist():
+        artifact = artifacts[i]
+        start = result['offsets'][i]
+        stop = start + min(candidates, result['wanted_by'][i])
+        fits = [
+            {
+                'character': demand['pairs'][demand['pair'][row]][0],
+                'role': demand['pairs'][demand['pair'][row]][1],
+                'preferred': bool(demand['preferred'][row]),
+                'setRank': int(demand['set_rank'][row]),
+                'matches': int(matches),
+            }
+            for row, matches in zip(result['candidates'][start:stop], result['candidate_matches'][start:stop])
+        ]
+        if result['keep'][i]:
+            reason = f"{result['fitting'][i]} of {result['wanted_by'][i]} character+roles fit"
+        elif result['rarity'][i] < min_rarity:
+            reason = f"below {min_rarity} star"
+        elif result['cell'][i] < 0:
+            reason = "no character+role wants this set/slot/main stat"
+        else:
+            reason = f"at most {result['best_matches'][i]} of {min_matches} top-{top} substats"
+        report.append({
+            'index': i,
+            'verdict': 'keep' if result['keep'][i] else 'fodder',
+            'setKey': artifact.get('setKey'),
+            'slotKey': artifact.get('slotKey'),
+            'mainStatKey': artifact.get('mainStatKey'),
+            'rarity': artifact.get('rarity'),
+            'level': artifact.get('level'),
+            'location': artifact.get('location') or None,
+            'substats': [substat.get('key') for substat in artifact.get('substats', ()) if substat.get('key')],
+            'bestMatches': int(result['best_matches'][i]),
+            'fitting': int(result['fitting'][i]),
+            'wantedBy': int(result['wanted_by'][i]),
+            'reason': reason,
+            'candidates': fits,
+        })
+    return report
+
+
+def format_entry(rank, entry):
+    fits = ', '.join(
+        f"{fit['character']} ({fit['role']}{' ✩' if fit['preferred'] else ''}) {fit['matches']}"
+        for fit in entry['candidates']
+    )
+    artifact = f"{entry['setKey']} {entry['slotKey']} {entry['mainStatKey']} +{entry['level']}"
+    return (f"{rank:>6}  {entry['verdict']:<8}{artifact:<48}{'/'.join(entry['substats']):<36}"
+            f"{entry['reason']}{': ' + fits if fits else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank a GOOD artifact export into keep and fodder.")
+    parser.add_argument('inventory', help="GOOD format JSON export")
+    parser.add_argument('--index', default=INDEX_PATH, help="web index genshin.py wrote (default: %(default)s)")
+    parser.add_argument('--top', type=int, default=3, help="substats ranked this high or better count (default: %(default)s)")
+    parser.add_argument('--min-matches', type=int, default=2,
+                        help="top substats a character+role needs on an artifact to keep it (default: %(default)s)")
+    parser.add_argument('--min-rarity', type=int, default=5, help="lower rarities are fodder (default: %(default)s)")
+    parser.add_argument('--limit', type=int, help="print only the first LIMIT artifacts of the ranking")
+    parser.add_argument('--json', dest='json_path', help="also write the ranked report as JSON here")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    demand = build_demand(load_index(args.index))
+    loaded = time.perf_counter()
+    artifacts = load_good(args.inventory)
+    parsed = time.perf_counter()
+    result = evaluate(demand, artifacts, args.top, args.min_matches, args.min_rarity)
+    scored = time.perf_counter()
+    report = ranked_report(demand, artifacts, result, args.top, args.min_matches, args.min_rarity)
+
+    for rank, entry in enumerate(report[:args.limit], 1):
+        print(format_entry(rank, entry))
+    if args.json_path:
+        with genshin.atomic_write(args.json_path, encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if demand['unmapped']:
+        print(f"Ignored sheet substats with no GOOD key: {', '.join(demand['unmapped'])}")
+    keep = int(result['keep'].sum())
+    score_s = scored - parsed
+    print(f"{keep} keep, {len(artifacts) - keep} fodder of {len(artifacts)} artifacts")
+    print(f"Index: {len(demand['starts'])} cells, {len(demand['pair'])} demand rows in {(loaded - start) * 1000:.0f} ms; "
+          f"inventory loaded in {(parsed - loaded) * 1000:.0f} ms")
+    print(f"Scored in {score_s * 1000:.1f} ms ({len(artifacts) / max(score_s, 1e-9):,.0f} artifacts/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
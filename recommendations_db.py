@@ -0,0 +1,176 @@
+"""Indexed SQLite copy of the flattened recommendations (output/output.sqlite) and helpers to query it.
+
+    python recommendations_db.py Sands EM --substat "Crit Rate" --top 3
+    python recommendations_db.py Goblet "Pyro DMG" --set "Crimson Witch of Flames"
+
+genshin.py writes the database with --dataset-format sqlite. Strings live in dimension tables
+(character_roles, sets, slots, stats); the recommendations fact table holds their ids and the ranks,
+with covering indexes for the set/slot/main stat and slot/main stat lookups the web index uses.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+DEFAULT_PATH = 'output/output.sqlite'
+
+SCHEMA = """
+CREATE TABLE characters (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE character_roles (
+    id INTEGER PRIMARY KEY,
+    character_id INTEGER NOT NULL REFERENCES characters (id),
+    role TEXT NOT NULL,
+    preferred INTEGER NOT NULL,
+    UNIQUE (character_id, role, preferred)
+);
+CREATE TABLE sets (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE slots (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE stats (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE recommendations (
+    character_role_id INTEGER NOT NULL REFERENCES character_roles (id),
+    set_id INTEGER NOT NULL REFERENCES sets (id),
+    set_rank INTEGER NOT NULL,
+    slot_id INTEGER NOT NULL REFERENCES slots (id),
+    main_stat_id INTEGER NOT NULL REFERENCES stats (id),
+    substat_id INTEGER NOT NULL REFERENCES stats (id),
+    substat_rank INTEGER NOT NULL
+);
+"""
+# Created after the bulk insert, which is much faster than maintaining them row by row
+INDEXES = """
+CREATE INDEX recommendations_by_cell ON recommendations
+    (set_id, slot_id, main_stat_id, substat_rank, substat_id, character_role_id, set_rank);
+CREATE INDEX recommendations_by_main_stat ON recommendations
+    (slot_id, main_stat_id, substat_id, substat_rank, character_role_id, set_rank, set_id);
+"""
+
+
+def build_database(df, path):
+    """Build the database for flattened rows (genshin.OUTPUT_COLUMNS) in a new file at path, replacing any file there.
+
+    genshin.py builds it in a temp file and moves that into place (see genshin.move_output).
+    """
+    import pandas as pd
+
+    if os.path.exists(path):
+        os.remove(path)
+    columns = {column: df[column].astype('category') for column in
+               ['Character', 'Role', 'Artifact Set', 'Artifact Slot', 'Main Stat', 'Substat']}
+
+    characters = columns['Character'].cat.categories.tolist()
+    pairs = pd.DataFrame({
+        'character': columns['Character'].cat.codes.to_numpy(),
+        'role': columns['Role'].to_numpy(dtype=object),
+        'preferred': df['Preferred Role'].to_numpy(dtype=bool),
+    })
+    character_role_ids, character_roles = pd.MultiIndex.from_frame(pairs).factorize()
+    stats = sorted(set(columns['Main Stat'].cat.categories) | set(columns['Substat'].cat.categories))
+    stat_ids = {stat: i for i, stat in enumerate(stats)}
+    main_stat_ids = columns['Main Stat'].cat.categories.map(stat_ids).to_numpy()[columns['Main Stat'].cat.codes]
+    substat_ids = columns['Substat'].cat.categories.map(stat_ids).to_numpy()[columns['Substat'].cat.codes]
+
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + SCHEMA)
+        connection.executemany("INSERT INTO characters VALUES (?, ?)", enumerate(characters))
+        connection.executemany(
+            "INSERT INTO character_roles VALUES (?, ?, ?, ?)",
+            ((i, int(character), role, int(preferred)) for i, (character, role, preferred) in enumerate(character_roles)),
+        )
+        for table, column in [('sets', 'Artifact Set'), ('slots', 'Artifact Slot')]:
+            connection.executemany(f"INSERT INTO {table} VALUES (?, ?)", enumerate(columns[column].cat.categories))
+        connection.executemany("INSERT INTO stats VALUES (?, ?)", enumerate(stats))
+        connection.executemany(
+            "INSERT INTO recommendations VALUES (?, ?, ?, ?, ?, ?, ?)",
+            zip(
+                character_role_ids.tolist(),
+                columns['Artifact Set'].cat.codes.tolist(),
+                df['Artifact Set Rank'].tolist(),
+                columns['Artifact Slot'].cat.codes.tolist(),
+                main_stat_ids.tolist(),
+                substat_ids.tolist(),
+                df['Substat Rank'].tolist(),
+            ),
+        )
+        connection.executescript(INDEXES + "ANALYZE;")
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def connect(path=DEFAULT_PATH):
+    """Open the database read-only."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No database at {path}; build with --dataset-format sqlite first.")
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def characters_wanting(connection, slot, main_stat, substat=None, top=None, artifact_set=None):
+    """Character+roles that want this slot/main stat (in artifact_set, or any set).
+
+    With substat, only those ranking it within their top substats (rank <= top, if given).
+    Rows are (character, role, preferred, best set rank, best substat rank), best first.
+    """
+    conditions = ["r.slot_id = (SELECT id FROM slots WHERE name = ?)",
+                  "r.main_stat_id = (SELECT id FROM stats WHERE name = ?)"]
+    params = [slot, main_stat]
+    if artifact_set is not None:
+        conditions.append("r.set_id = (SELECT id FROM sets WHERE name = ?)")
+        params.append(artifact_set)
+    if substat is not None:
+        conditions.append("r.substat_id = (SELECT id FROM stats WHERE name = ?)")
+        params.append(substat)
+    if top is not None:
+        conditions.append("r.substat_rank <= ?")
+        params.append(top)
+    return connection.execute(f"""
+        SELECT characters.name, character_roles.role, character_roles.preferred,
+               MIN(r.set_rank), MIN(r.substat_rank)
+        FROM recommendations AS r
+        JOIN character_roles ON character_roles.id = r.character_role_id
+        JOIN characters ON characters.id = character_roles.character_id
+        WHERE {' AND '.join(conditions)}
+        GROUP BY r.character_role_id
+        ORDER BY MIN(r.set_rank), MIN(r.substat_rank), characters.name, character_roles.role
+    """, params).fetchall()
+
+
+def substats_wanted(connection, slot, main_stat, artifact_set=None):
+    """(substat, best rank, number of character+roles) for this slot/main stat, most wanted first."""
+    set_condition = "AND r.set_id = (SELECT id FROM sets WHERE name = ?)" if artifact_set is not None else ""
+    params = [slot, main_stat] + ([artifact_set] if artifact_set is not None else [])
+    return connection.execute(f"""
+        SELECT stats.name, MIN(r.substat_rank), COUNT(DISTINCT r.character_role_id)
+        FROM recommendations AS r
+        JOIN stats ON stats.id = r.substat_id
+        WHERE r.slot_id = (SELECT id FROM slots WHERE name = ?)
+          AND r.main_stat_id = (SELECT id FROM stats WHERE name = ?)
+          {set_condition}
+        GROUP BY r.substat_id
+        ORDER BY MIN(r.substat_rank), COUNT(DISTINCT r.character_role_id) DESC, stats.name
+    """, params).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the recommendations database genshin.py writes.")
+    parser.add_argument('slot', help="e.g. Sands")
+    parser.add_argument('main_stat', help="e.g. EM")
+    parser.add_argument('--substat', help="only character+roles that list this substat")
+    parser.add_argument('--top', type=int, help="with --substat: only where it ranks this high or better")
+    parser.add_argument('--set', dest='artifact_set', help="only this artifact set (default: any set)")
+    parser.add_argument('--db', default=DEFAULT_PATH, help="database path (default: %(default)s)")
+    args = parser.parse_args()
+
+    connection = connect(args.db)
+    start = time.perf_counter()
+    rows = characters_wanting(connection, args.slot, args.main_stat, args.substat, args.top, args.artifact_set)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for character, role, preferred, set_rank, substat_rank in rows:
+        print(f"{character:<24}{role + (' ✩' if preferred else ''):<40}set rank {set_rank}  substat rank {substat_rank}")
+    print(f"{len(rows)} character+roles in {elapsed_ms:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Sheet sources fetched concurrently: live sheets over the Sheets REST API, saved responses and snapshots.
+
+A sources file is a JSON list; each source has a unique 'name' (the tag its ranges carry) and one of
+    "spreadsheetId": fetched range by range over HTTP. Optional "ranges" (one per element tab,
+        default: the element tabs' ranges) and "url" (API base, for a local stand-in server such as
+        benchmarks/sheets_stand_in.py; no API key is needed then)
+    "file": a saved batchGet response (JSON with valueRanges, in element tab order)
+    "snapshot": a snapshot directory, e.g. a historical revision kept from an earlier fetch
+
+    [{"name": "main", "spreadsheetId": "1gNx..."},
+     {"name": "community", "spreadsheetId": "1AbC...", "ranges": ["Pyro!A1:J", ...]},
+     {"name": "2025-01", "snapshot": "archive/2025-01"}]
+"""
+import json
+import os
+from urllib.parse import quote
+
+import snapshots
+
+SHEETS_API_URL = 'https://sheets.googleapis.com'
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+SOURCE_KINDS = ('spreadsheetId', 'file', 'snapshot')
+
+
+def load_sources(path):
+    """Read and check a sources file (see the module docstring); returns the list of sources."""
+    with open(path, 'r', encoding='utf-8') as f:
+        sources = json.load(f)
+    if not isinstance(sources, list) or not sources:
+        raise ValueError(f"{path} must hold a non-empty JSON list of sources.")
+    names = set()
+    for source in sources:
+        kinds = [kind for kind in SOURCE_KINDS if kind in source]
+        if not source.get('name') or len(kinds) != 1:
+            raise ValueError(f"Each source in {path} needs a name and exactly one of {', '.join(SOURCE_KINDS)}: {source}")
+        if source['name'] in names or os.sep in source['name']:
+            raise ValueError(f"Source names in {path} must be unique and usable as directory names: {source['name']!r}")
+        names.add(source['name'])
+    return sources
+
+
+def http_session(concurrency, retries):
+    """A requests session whose connection pool keeps up to concurrency connections per host alive.
+
+    Failed connections and RETRY_STATUSES responses are retried up to retries times, with exponential
+    backoff (honouring Retry-After).
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset({'GET'}), respect_retry_after_header=True)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=concurrency, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_range(session, source, range_name, api_key=None, timeout=30):
+    """One range of a spreadsheetId source, as a valueRange (the Sheets API spreadsheets.values.get response)."""
+    url = f"{source.get('url', SHEETS_API_URL).rstrip('/')}/v4/spreadsheets/{source['spreadsheetId']}/values/{quote(range_name, safe='')}"
+    params = {'key': api_key} if api_key and 'url' not in source else None
+    response = session.get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def read_source(source, tabs):
+    """All value ranges of a file or snapshot source, in tabs order."""
+    if 'snapshot' in source:
+        return snapshots.load_snapshot(source['snapshot'], tabs)
+    with open(source['file'], 'r', encoding='utf-8') as f:
+        value_ranges = json.load(f)['valueRanges']
+    if len(value_ranges) != len(tabs):
+        raise ValueError(f"Source {source['name']!r} has {len(value_ranges)} ranges, expected {len(tabs)}.")
+    return value_ranges
+
+
+def iter_value_ranges(sources, tabs, ranges, api_key=None, concurrency=8, retries=4, timeout=30):
+    """Fetch every source's tabs on up to concurrency threads; yields (source name, tab index, valueRange).
+
+    Ranges are yielded as they arrive, not in order, so the caller can process each one while the rest
+    are in flight. HTTP sources fetch each of their ranges (default: ranges) as its own request over one
+    pooled session; file and snapshot sources are read whole. An error that outlasts its retries is
+    raised once the requests already running finish; pending ones are cancelled.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    session = http_session(concurrency, retries) if any('spreadsheetId' in source for source in sources) else None
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        jobs = {}
+        for source in sources:
+            if 'spreadsheetId' in source:
+                source_ranges = source.get('ranges', ranges)
+                if len(source_ranges) != len(tabs):
+                    raise ValueError(f"Source {source['name']!r} lists {len(source_ranges)} ranges, expected {len(tabs)}.")
+                for index, range_name in enumerate(source_ranges):
+                    job = pool.submit(fetch_range, session, source, range_name, api_key, timeout)
+                    jobs[job] = (source['name'], index)
+            else:
+                jobs[pool.submit(read_source, source, tabs)] = (source['name'], None)
+        try:
+            for job in as_completed(jobs):
+                name, index = jobs[job]
+                if index is not None:
+                    yield name, index, job.result()
+                else:
+                    for index, value_range in enumerate(job.result()):
+                        yield name, index, value_range
+        finally:
+            for job in jobs:
+                job.cancel()
+            if session is not None:
+                session.close()
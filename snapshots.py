@@ -0,0 +1,93 @@
+"""Local snapshots of the Sheets batchGet response: one gzipped JSON file per tab plus a manifest of content hashes."""
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def tab_hash(value_range):
+    """Content hash of one tab's cell values."""
+    payload = json.dumps(value_range.get('values', []), ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def tab_filename(tab):
+    return f"{tab.lower()}.json.gz"
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(directory):
+    """Return the snapshot manifest in directory, or {} if there is none yet."""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def changed_tabs(directory, tabs, value_ranges):
+    """Names of tabs whose content hash differs from the snapshot in directory."""
+    previous = read_manifest(directory).get('tabs', {})
+    return [
+        tab for tab, value_range in zip(tabs, value_ranges)
+        if previous.get(tab, {}).get('sha256') != tab_hash(value_range)
+    ]
+
+
+def save_snapshot(directory, tabs, value_ranges, spreadsheet_id=None):
+    """Store value_ranges (in tabs order) under directory and return the names of the tabs that changed.
+
+    Unchanged tabs keep their existing files; the manifest is rewritten last so a failed
+    save never leaves it pointing at missing or partial tab files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    changed = changed_tabs(directory, tabs, value_ranges)
+    manifest_tabs = {}
+    for tab, value_range in zip(tabs, value_ranges):
+        filename = tab_filename(tab)
+        if tab in changed or not os.path.exists(os.path.join(directory, filename)):
+            payload = json.dumps(value_range, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            write_atomic(os.path.join(directory, filename), gzip.compress(payload, mtime=0))
+        manifest_tabs[tab] = {
+            'file': filename,
+            'range': value_range.get('range'),
+            'rows': len(value_range.get('values', [])),
+            'sha256': tab_hash(value_range),
+        }
+    manifest = {
+        'spreadsheetId': spreadsheet_id,
+        'savedAt': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'tabs': manifest_tabs,
+    }
+    write_atomic(
+        os.path.join(directory, MANIFEST_NAME),
+        json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8'),
+    )
+    return changed
+
+
+def load_snapshot(directory, tabs):
+    """Load the stored valueRanges for tabs (in order), verifying each against its manifest hash."""
+    manifest = read_manifest(directory)
+    if not manifest:
+        raise FileNotFoundError(f"No snapshot manifest in {directory}; run once without --offline first.")
+    value_ranges = []
+    for tab in tabs:
+        entry = manifest['tabs'].get(tab)
+        if entry is None:
+            raise KeyError(f"Snapshot in {directory} has no tab {tab!r}.")
+        with gzip.open(os.path.join(directory, entry['file']), 'rb') as f:
+            value_range = json.loads(f.read().decode('utf-8'))
+        if tab_hash(value_range) != entry['sha256']:
+            raise ValueError(f"Snapshot tab {tab!r} does not match its manifest hash; refetch to repair it.")
+        value_ranges.append(value_range)
+    return value_ranges
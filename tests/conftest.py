@@ -0,0 +1,41 @@
+"""Shared fixtures. The modules live at the repository root (and the synthetic data in benchmarks/)."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from synthetic_sheet import make_value_ranges  # noqa: E402
+
+
+@pytest.fixture
+def value_ranges():
+    """A small synthetic sheet (see benchmarks/synthetic_sheet.py)."""
+    return make_value_ranges(30, seed=1)
+
+
+@pytest.fixture
+def dataset(value_ranges):
+    """The flattened rows build() makes from value_ranges."""
+    import pandas as pd
+
+    import genshin
+
+    metrics = genshin.new_run_metrics()
+    validation_counts = dict(genshin.VALIDATION_COUNTS)
+    block_cache = {'blocks': {}, 'order': [], 'web_json': None}
+    with pd.option_context('mode.string_storage', 'python'):
+        cleaned_tabs = genshin.trim_and_filter_tabs(value_ranges, validation_counts, metrics)
+        df_final_cleaned = genshin.parse_character_blocks(cleaned_tabs, validation_counts, metrics)
+        df, _ = genshin.expand_character_blocks(df_final_cleaned, block_cache, validation_counts, metrics)
+    return df
+
+
+@pytest.fixture
+def in_tmp_path(tmp_path, monkeypatch):
+    """Run in an empty directory, so builds write their output/ tree there."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,82 @@
+"""The columnar expansion must give the loop reference's rows, order and skip counts."""
+import pandas as pd
+import pytest
+
+import genshin
+
+
+def expand_both(df_final_cleaned):
+    normalized = genshin.normalize_fields(df_final_cleaned)
+    return genshin.expand_rows_columnar(normalized), genshin.expand_rows_loop(normalized)
+
+
+def assert_same_expansion(df_final_cleaned):
+    (columnar, columnar_counts), (loop, loop_counts) = expand_both(df_final_cleaned)
+    assert len(loop), "fixture expands to no rows"
+    pd.testing.assert_frame_equal(columnar, loop)
+    pd.testing.assert_frame_equal(columnar_counts, loop_counts)
+
+
+def block_rows(*rows):
+    return pd.DataFrame(rows, columns=['Character', 'Role', 'Artifact Sets', 'Main Stats', 'Substats'])
+
+
+def test_empty_cells():
+    assert_same_expansion(block_rows(
+        ['A', 'DPS ✩', '1. Noblesse Oblige', 'Sands - ATK%', '1. Crit Rate'],
+        ['A', 'SUPPORT', None, 'Goblet - HP%', '1. HP%'],
+        ['A', 'SUPPORT', '1. Noblesse Oblige', None, '1. ER%'],
+        ['B', 'DPS', '1. Deepwood Memories', 'Circlet - CRIT', None],
+        ['B', '', '', '', ''],
+        ['B', 'HEALER', '1. Ocean Hued Clam\n', 'Sands - HP%\n\n', '1. HP%\n2. \n'],
+    ))
+
+
+def test_continuation_lines():
+    assert_same_expansion(block_rows(
+        ['A', 'DPS', '1. Gladiator\'s Finale\n~= Noblesse Oblige\n2. Golden Troupe\n≈ Deepwood Memories',
+         'Sands - ATK% / EM\nGoblet - Pyro DMG%', '1. Crit Rate / DMG\n~= ATK%\n2. EM\n≈ HP%'],
+        ['B', 'SUPPORT', '~= Noblesse Oblige\n1. Golden Troupe', 'Circlet - CRIT', '≈ EM\n1. ER%'],
+        ['C', 'DPS', '1.   Blizzard  Strayer\r\n2. Heart of Depth ~=Noblesse Oblige', 'Goblet - Cryo DMG%',
+         '1. Crit  Rate\n2. ATK%'],
+    ))
+
+
+def test_category_sets():
+    assert_same_expansion(block_rows(
+        ['A', 'DPS ✩', '1. 18% ATK set\n2. 20% HP\n3. 80 EM', 'Sands - ATK%\nCirclet - CRIT', '1. CRIT\n2. ATK%'],
+        ['B', 'HEALER', '1. 15% Healing Bonus (2) / 20% HP (2)\n2. [Choose Two] 15% Hydro DMG Bonus set / 18 ATK% set',
+         'Goblet - HP%', '1. HP%\n2. ER% (until requirement is met)'],
+    ))
+
+
+def test_unranked_and_skipped_lines():
+    assert_same_expansion(block_rows(
+        ['A', 'DPS', '1. Noblesse Oblige\nGolden Troupe', 'Sands - ATK%\nAny slot\nGoblet - ATK%',
+         '1. ATK%\nCrit Rate\n2. EM'],
+    ))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_synthetic_sheet(seed):
+    from synthetic_sheet import make_value_ranges
+
+    metrics = genshin.new_run_metrics()
+    validation_counts = dict(genshin.VALIDATION_COUNTS)
+    with pd.option_context('mode.string_storage', 'python'):
+        cleaned_tabs = genshin.trim_and_filter_tabs(make_value_ranges(40, seed=seed), validation_counts, metrics)
+        df_final_cleaned = genshin.parse_character_blocks(cleaned_tabs, validation_counts, metrics)
+        assert_same_expansion(df_final_cleaned)
+
+
+def test_check_expansion_leaves_cache_stats_alone(value_ranges):
+    metrics = genshin.new_run_metrics()
+    validation_counts = dict(genshin.VALIDATION_COUNTS)
+    block_cache = {'blocks': {}, 'order': [], 'web_json': None}
+    with pd.option_context('mode.string_storage', 'python'):
+        cleaned_tabs = genshin.trim_and_filter_tabs(value_ranges, validation_counts, metrics)
+        df_final_cleaned = genshin.parse_character_blocks(cleaned_tabs, validation_counts, metrics)
+        df, _ = genshin.expand_character_blocks(df_final_cleaned, block_cache, validation_counts, metrics)
+        stats = genshin.canonicalization_cache_stats()
+        genshin.check_expansion_against_loop(df_final_cleaned, df, validation_counts)
+    assert genshin.canonicalization_cache_stats() == stats
@@ -0,0 +1,73 @@
+"""An incremental build (block cache, patched index) must write the same index as a full rebuild."""
+import copy
+import os
+import shutil
+
+import pytest
+
+import genshin
+from conftest import ROOT
+
+# Sheet edits, on the first tab's rows: 7 starts a three-role character block (synthetic seed 1)
+EDITS = {
+    'substat': lambda rows: rows[7].__setitem__(6, "1. Crit DMG\n2. EM\n~= Crit Rate"),
+    'main_stat': lambda rows: rows[7].__setitem__(5, "Sands - EM\nGoblet - Pyro DMG%\nCirclet - Crit Rate"),
+    'new_set': lambda rows: rows[8].__setitem__(4, rows[8][4] + "\n6. Gilded Dreams"),
+    'row_delete': lambda rows: rows.pop(8),
+    'reorder': lambda rows: rows.__setitem__(slice(8, 10), rows[9:7:-1]),
+    'rename': lambda rows: rows[7].__setitem__(1, "PYROCHAR1B"),
+    'preferred': lambda rows: rows[7].__setitem__(2, "SHIELD SUPPORT ✩"),
+}
+LAYOUTS = {
+    'plain': {},
+    'encoded_sharded': {'json_schema': 'encoded', 'data_layout': 'sharded'},
+}
+
+
+def build_in(directory, monkeypatch, value_ranges, **options):
+    """Build value_ranges in directory (its output/ tree persisting between calls)."""
+    os.makedirs(directory, exist_ok=True)
+    shutil.copy(os.path.join(ROOT, 'artifact_evaluator_template.html'), directory)
+    monkeypatch.chdir(directory)
+    genshin.build(copy.deepcopy(value_ranges), **options)
+
+
+def web_outputs(directory):
+    """artifact_data.json and any data shards, by path relative to output/."""
+    output = os.path.join(directory, 'output')
+    paths = ['artifact_data.json'] + [
+        os.path.join('data', name) for name in sorted(os.listdir(os.path.join(output, 'data')))
+        if name.endswith('.json')
+    ] if os.path.isdir(os.path.join(output, 'data')) else ['artifact_data.json']
+    contents = {}
+    for path in paths:
+        with open(os.path.join(output, path), 'rb') as f:
+            contents[path] = f.read()
+    return contents
+
+
+@pytest.mark.parametrize('layout', list(LAYOUTS))
+@pytest.mark.parametrize('edit', list(EDITS))
+def test_incremental_matches_full_rebuild(value_ranges, tmp_path, monkeypatch, edit, layout):
+    edited = copy.deepcopy(value_ranges)
+    EDITS[edit](edited[0]['values'])
+    assert edited != value_ranges
+
+    options = LAYOUTS[layout]
+    build_in(tmp_path / 'incremental', monkeypatch, value_ranges, **options)
+    patched = []
+    generate_web_json = genshin.generate_web_json
+
+    def spy(df, previous=None, changed_rows=None):
+        patched.append(previous is not None)
+        return generate_web_json(df, previous, changed_rows)
+
+    monkeypatch.setattr(genshin, 'generate_web_json', spy)
+    metrics = genshin.new_run_metrics()
+    build_in(tmp_path / 'incremental', monkeypatch, edited, metrics=metrics, **options)
+    monkeypatch.setattr(genshin, 'generate_web_json', generate_web_json)
+    # Only the edited block is expanded again, and the cached index is patched rather than rebuilt
+    assert 0 < metrics['stages']['normalize']['rows_in'] < metrics['stages']['blocks']['rows_out']
+    assert patched == [True]
+    build_in(tmp_path / 'full', monkeypatch, edited, full_rebuild=True, **options)
+    assert web_outputs(tmp_path / 'incremental') == web_outputs(tmp_path / 'full')
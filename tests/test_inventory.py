@@ -0,0 +1,61 @@
+"""inventory.evaluate() against a per-artifact loop, and on artifacts or indexes with nothing to match."""
+import numpy as np
+import pytest
+
+import genshin
+import inventory
+from synthetic_inventory import make_inventory
+
+SANDS = {'slotKey': 'sands', 'mainStatKey': 'atk_', 'rarity': 5, 'level': 20,
+         'substats': [{'key': 'critRate_'}, {'key': 'critDMG_'}, {'key': 'eleMas'}]}
+
+
+@pytest.fixture
+def demand(dataset):
+    return inventory.build_demand(genshin.generate_web_json(dataset))
+
+
+def fitting_by_loop(demand, artifacts, top=3, min_matches=2, min_rarity=5):
+    """Character+roles fitting each artifact, one demand row at a time."""
+    cell_ids, masks, rarity = inventory.encode_inventory(demand, artifacts)
+    fitting = []
+    for cell, mask, stars in zip(cell_ids.tolist(), masks.tolist(), rarity.tolist()):
+        count = 0
+        if cell >= 0 and stars >= min_rarity:
+            for row in range(demand['starts'][cell], demand['stops'][cell]):
+                want = sum(int(bit) for bit, rank in zip(inventory.SUBSTAT_MASK_VALUES, demand['ranks'][row])
+                           if rank <= top)
+                count += bin(mask & want).count('1') >= min_matches
+        fitting.append(count)
+    return fitting
+
+
+def test_matches_loop(demand):
+    artifacts = make_inventory(300, seed=1)['artifacts']
+    result = inventory.evaluate(demand, artifacts)
+    assert result['fitting'].tolist() == fitting_by_loop(demand, artifacts)
+    assert result['keep'].any() and not result['keep'].all()
+
+
+def test_artifact_without_cell(demand):
+    set_key, slot, main_stat = next(key for key in demand['cells'] if key[1] == 'sands')
+    artifacts = [dict(SANDS, setKey=set_key, mainStatKey=main_stat), dict(SANDS, setKey='NoSuchSet')]
+    result = inventory.evaluate(demand, artifacts, min_matches=0)
+    cell = demand['cells'][(set_key, slot, main_stat)]
+    assert result['cell'].tolist() == [cell, -1]
+    assert result['wanted_by'].tolist() == [demand['stops'][cell] - demand['starts'][cell], 0]
+    assert result['fitting'][1] == 0 and not result['keep'][1]
+    assert len(result['candidates']) == result['wanted_by'][0]
+    report = inventory.ranked_report(demand, artifacts, result)
+    assert report[-1]['reason'] == "no character+role wants this set/slot/main stat"
+
+
+def test_empty_index():
+    demand = inventory.build_demand({'bySet': {}, 'byMainStat': {}, 'meta': {}})
+    artifacts = [dict(SANDS, setKey='GladiatorsFinale'), dict(SANDS, setKey='NoSuchSet', rarity=4)]
+    result = inventory.evaluate(demand, artifacts)
+    assert result['cell'].tolist() == [-1, -1]
+    assert result['wanted_by'].tolist() == [0, 0]
+    assert not result['keep'].any()
+    assert len(result['candidates']) == 0
+    assert np.array_equal(inventory.evaluate(demand, [])['keep'], np.zeros(0, dtype=bool))
@@ -0,0 +1,56 @@
+"""compile_replacements() passes must give the same text as str.replace applied rule by rule."""
+import random
+
+import pytest
+
+import genshin
+
+
+def replace_in_order(rules, text):
+    for old, new in rules:
+        text = text.replace(old, new)
+    return text
+
+
+def test_contained_pattern_keeps_rule_order():
+    rules = [['aba', 'X'], ['ba', 'Y']]
+    passes = genshin.compile_replacements(rules)
+    assert len(passes) == 2
+    assert genshin.apply_replacements(passes, 'baba') == replace_in_order(rules, 'baba') == 'bX'
+
+
+def test_deleted_pattern_replaced_again():
+    rules = [['a', ''], ['a', 'XY']]
+    assert genshin.apply_replacements(genshin.compile_replacements(rules), 'aY') == 'Y'
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_rules(seed):
+    rng = random.Random(seed)
+    for _ in range(2000):
+        rules = [
+            [''.join(rng.choices('abc', k=rng.randint(1, 3))), ''.join(rng.choices('abcXY', k=rng.randint(0, 3)))]
+            for _ in range(rng.randint(1, 5))
+        ]
+        passes = genshin.compile_replacements(rules)
+        for _ in range(10):
+            text = ''.join(rng.choices('abcXY', k=rng.randint(0, 12)))
+            assert genshin.apply_replacements(passes, text) == replace_in_order(rules, text), (rules, text)
+
+
+def table_texts(rules, rng, count):
+    """Texts stitched from the table's patterns, outputs and pieces of them, so rules meet and overlap."""
+    fragments = [text for rule in rules for text in rule if text]
+    fragments += [text[:n] for text in fragments for n in (1, len(text) // 2)]
+    fragments += [text[-n:] for text in fragments for n in (1, len(text) // 2) if n]
+    fragments += list(' |/%()[]') + ['set', 'DMG', 'Crit', '2']
+    return [''.join(rng.choices(fragments, k=rng.randint(1, 8))) for _ in range(count)]
+
+
+@pytest.mark.parametrize('rules, passes', [
+    (genshin.ARTIFACT_SET_NAME_REPLACEMENTS, genshin.ARTIFACT_SET_NAME_PASSES),
+    (genshin.STAT_REPLACEMENTS, genshin.STAT_PASSES),
+])
+def test_replacement_tables(rules, passes):
+    for text in table_texts(rules, random.Random(0), 20000):
+        assert genshin.apply_replacements(passes, text) == replace_in_order(rules, text), text
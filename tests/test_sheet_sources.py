@@ -0,0 +1,125 @@
+"""Concurrent ingestion against the local Sheets API stand-in (benchmarks/sheets_stand_in.py)."""
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib.parse import unquote
+
+import pytest
+import requests
+
+import genshin
+import sheet_sources
+from sheets_stand_in import make_handler, sheet_title
+from synthetic_sheet import make_value_ranges
+
+
+@pytest.fixture
+def stand_in():
+    """Start a stand-in on a free port; stand_in(handler) returns its base URL and the paths it was asked for."""
+    servers = []
+
+    def start(handler):
+        requested = []
+
+        class Recording(handler):
+            def do_GET(self):
+                requested.append(self.path)
+                super().do_GET()
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Recording)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}", requested
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def first_requests_fail(handler, status):
+    """handler, answering the first request for each range with status before serving it."""
+    seen = set()
+    lock = threading.Lock()
+
+    class Failing(handler):
+        def do_GET(self):
+            with lock:
+                first = self.path not in seen
+                seen.add(self.path)
+            if first:
+                return self.reply(status, {'error': {'code': status, 'message': "Try again later."}})
+            super().do_GET()
+
+    return Failing
+
+
+def reversed_latency(handler):
+    """handler, answering later element tabs first, so ranges arrive out of tab order."""
+    titles = [sheet_title(range_name).strip() for range_name in genshin.RANGES]
+
+    class Reversed(handler):
+        def do_GET(self):
+            title = sheet_title(unquote(self.path.rsplit('/', 1)[1])).strip()
+            time.sleep(0.05 * (len(titles) - titles.index(title)))
+            super().do_GET()
+
+    return Reversed
+
+
+@pytest.fixture
+def responses():
+    return {'main': {'valueRanges': make_value_ranges(20, seed=1)},
+            'other': {'valueRanges': make_value_ranges(20, seed=2)}}
+
+
+def http_sources(url, *names):
+    return [{'name': name, 'spreadsheetId': name, 'url': url} for name in names]
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_retries_transient_errors(stand_in, responses, status):
+    url, requested = stand_in(first_requests_fail(make_handler(responses, 20, 0.0, 0), status))
+    arrived = list(sheet_sources.iter_value_ranges(http_sources(url, 'main'), genshin.elements, genshin.RANGES,
+                                                   retries=2))
+    assert sorted(index for _, index, _ in arrived) == list(range(len(genshin.elements)))
+    assert {index: value_range for _, index, value_range in arrived} == dict(enumerate(responses['main']['valueRanges']))
+    assert len(requested) == 2 * len(genshin.elements)
+
+
+def test_ingest_orders_ranges_by_source_and_tab(stand_in, responses, in_tmp_path):
+    url, _ = stand_in(reversed_latency(make_handler(responses, 20, 0.0, 0)))
+    arrival = [index for name, index, _ in sheet_sources.iter_value_ranges(
+        http_sources(url, 'main'), genshin.elements, genshin.RANGES)]
+    assert arrival != sorted(arrival)
+
+    results = genshin.ingest(http_sources(url, 'main', 'other'), 'snapshot')
+    assert list(results) == ['main', 'other']
+    for name, result in results.items():
+        assert result['value_ranges'] == responses[name]['valueRanges']
+    assert results['main']['snapshot_dir'] == 'snapshot'
+    assert results['other']['snapshot_dir'] == f"{genshin.SOURCE_SNAPSHOT_DIR}/other"
+    assert genshin.snapshots.load_snapshot('snapshot', genshin.elements) == responses['main']['valueRanges']
+
+
+def test_ingest_cleans_only_the_built_source(stand_in, responses, in_tmp_path):
+    url, _ = stand_in(make_handler(responses, 20, 0.0, 0))
+    results = genshin.ingest(http_sources(url, 'main', 'other'), 'snapshot')
+    assert len(results['main']['tab_cache']) == len(genshin.elements)
+    assert 'tab_cache' not in results['other']
+    assert genshin.ingest(http_sources(url, 'main'), 'snapshot', clean=False)['main']['tab_cache'] == {}
+
+
+def test_exhausted_retries_raise(stand_in, responses, in_tmp_path):
+    url, requested = stand_in(make_handler(responses, 20, 0.0, 1))
+    with pytest.raises(requests.exceptions.RetryError):
+        genshin.ingest(http_sources(url, 'main'), 'snapshot', concurrency=2, retries=1)
+    assert len(requested) <= 2 * len(genshin.elements)
+    assert not (in_tmp_path / 'snapshot').exists()
+
+
+def test_unknown_range_raises(stand_in, responses):
+    url, _ = stand_in(make_handler(responses, 20, 0.0, 0))
+    source = dict(http_sources(url, 'main')[0], ranges=['Nowhere!A1:J'] * len(genshin.elements))
+    with pytest.raises(requests.exceptions.HTTPError, match='400'):
+        list(sheet_sources.iter_value_ranges([source], genshin.elements, genshin.RANGES, retries=0))
@@ -0,0 +1,62 @@
+"""watch() against a file-backed sheet: it rebuilds on the first poll and then only when a tab changes."""
+import json
+import os
+import shutil
+
+import pytest
+
+import genshin
+from conftest import ROOT
+
+
+@pytest.fixture
+def sheet_file(in_tmp_path, value_ranges):
+    """A saved batchGet response holding value_ranges, with the template a build renders next to it."""
+    shutil.copy(os.path.join(ROOT, 'artifact_evaluator_template.html'), in_tmp_path)
+    path = in_tmp_path / 'sheet.json'
+    path.write_text(json.dumps({'valueRanges': value_ranges}), encoding='utf-8')
+    return path
+
+
+def run_watch(sheet_file, polls):
+    """Run watch() for polls polls with no delay between them; returns its log records."""
+    genshin.watch(genshin.file_batch_get(sheet_file), interval=0, polls=polls)
+    with open(genshin.WATCH_LOG_PATH, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_unchanged_sheet_builds_once(sheet_file):
+    records = run_watch(sheet_file, polls=3)
+    assert [record['poll'] for record in records] == [1]
+    assert 'error' not in records[0]
+    assert sorted(records[0]['changed_tabs']) == sorted(genshin.elements)
+
+
+def test_changed_tab_rebuilds_once(sheet_file, value_ranges, monkeypatch):
+    # Every role row of one character now recommends just one set
+    character, block = None, []
+    for row in value_ranges[genshin.elements.index('HYDRO')]['values'][6:]:
+        if len(row) > 1 and row[1]:
+            if block:
+                break
+            if row[1].startswith('HYDROCHAR'):
+                character = row[1]
+        if character and len(row) > 4:
+            block.append(row)
+    for row in block:
+        row[4] = "1. Gilded Dreams"
+    polls_slept = []
+
+    def sleep(seconds):
+        # The sheet changes while watch() waits after its second poll
+        polls_slept.append(seconds)
+        if len(polls_slept) == 2:
+            sheet_file.write_text(json.dumps({'valueRanges': value_ranges}), encoding='utf-8')
+
+    monkeypatch.setattr(genshin.time, 'sleep', sleep)
+    records = run_watch(sheet_file, polls=4)
+    assert [record['poll'] for record in records] == [1, 3]
+    assert records[1]['changed_tabs'] == ['HYDRO']
+
+    df, _ = genshin.load_build_outputs()
+    assert set(df.loc[df['Character'] == character, 'Artifact Set']) == {'Gilded Dreams'}
@@ -0,0 +1,94 @@
+"""The published forms of the web index (shared cells, encoded, sharded) must give back the index exactly."""
+import json
+import os
+
+import pytest
+
+import genshin
+
+
+@pytest.fixture
+def web_json(dataset):
+    return genshin.generate_web_json(dataset)
+
+
+def through_json(payload):
+    """payload as the page (and inventory.py) reads it back from artifact_data.json."""
+    return json.loads(json.dumps(payload, separators=(',', ':')))
+
+
+def read_shards(shard_index, directory):
+    """Reassemble a share_cells() payload from the shard files write_data_shards() wrote."""
+    payload = {'meta': shard_index['meta'], 'cells': {}, 'bySet': {}, 'byArtifact': {}, 'byMainStat': {},
+               'byCharacter': {}}
+    for index, shards in shard_index['shards'].items():
+        for path in shards.values():
+            with open(os.path.join(os.path.dirname(directory), path), 'r', encoding='utf-8') as f:
+                shard = json.load(f)
+            for key, entries in shard.items():
+                payload[key].update(entries)
+    cells = payload['cells']
+    payload['cells'] = [cells[str(cell_id)] for cell_id in range(len(cells))]
+    return payload
+
+
+def test_shared_cells_resolve(web_json):
+    shared = genshin.share_cells(web_json)
+    assert len(shared['cells']) == len(web_json['byArtifact'])
+    assert genshin.resolve_cells(shared) == web_json
+    assert genshin.resolve_cells(through_json(shared)) == web_json
+
+
+def test_encoded_decodes(web_json):
+    shared = genshin.share_cells(web_json)
+    encoded = through_json(genshin.encode_web_json(shared))
+    assert encoded['meta']['encoding'] == 'dict-v1'
+    assert genshin.decode_web_json(encoded) == shared
+    assert genshin.resolve_cells(genshin.decode_web_json(encoded)) == web_json
+
+
+def test_plain_payload_decodes_to_itself(web_json):
+    shared = genshin.share_cells(web_json)
+    assert genshin.decode_web_json(shared) is shared
+
+
+@pytest.mark.parametrize('encoded', [False, True])
+def test_sharded_layout(web_json, in_tmp_path, encoded):
+    shared = genshin.share_cells(web_json)
+    payload = genshin.encode_web_json(shared) if encoded else shared
+    manifest = {'files': {}}
+    shard_index = genshin.write_data_shards(payload, genshin.DATA_SHARD_DIR, manifest)
+    assert set(shard_index['shards']['bySet']) == set(web_json['bySet'])
+    assert all(key.startswith('data/') for key in manifest['files'])
+
+    reassembled = read_shards(shard_index, genshin.DATA_SHARD_DIR)
+    assert reassembled == through_json(payload)
+    assert genshin.resolve_cells(genshin.decode_web_json(reassembled)) == web_json
+
+
+def test_unchanged_shards_keep_their_names(web_json, in_tmp_path):
+    shared = genshin.share_cells(web_json)
+    first = genshin.write_data_shards(shared, genshin.DATA_SHARD_DIR, {'files': {}})
+    second = genshin.write_data_shards(shared, genshin.DATA_SHARD_DIR, {'files': {}})
+    assert first == second
+    assert len(os.listdir(genshin.DATA_SHARD_DIR)) == 3 * sum(map(len, first['shards'].values()))
+
+
+def test_main_stat_cells_list_each_character_role_once(dataset):
+    # A character+role preferred in one set's rows only, for a slot/main stat it also wants from other sets
+    keys = genshin.CELL_KEYS[1:] + genshin.CHARACTER_KEYS
+    sets_per_entry = dataset.groupby(keys, observed=True)['Artifact Set'].nunique()
+    slot, main_stat, character, role = sets_per_entry[sets_per_entry > 1].index[0]
+    rows = (dataset['Character'] == character) & (dataset['Role'] == role)
+    in_cell = rows & (dataset['Artifact Slot'] == slot) & (dataset['Main Stat'] == main_stat)
+    dataset = dataset.copy()
+    dataset.loc[rows, 'Preferred Role'] = False
+    dataset.loc[rows & (dataset['Artifact Set'] == dataset.loc[in_cell, 'Artifact Set'].iloc[0]), 'Preferred Role'] = True
+
+    web_json = genshin.generate_web_json(dataset)
+    for key, cell in web_json['byMainStat'].items():
+        pairs = [(entry['character'], entry['role']) for entry in cell['characters']]
+        assert len(pairs) == len(set(pairs)), key
+        assert all(cell['characters'][i]['preferred'] for i in cell['preferredCharacters']), key
+    cell = web_json['byMainStat'][f"{slot}|{main_stat}"]
+    assert [(entry['character'], entry['role']) for entry in cell['characters']].count((character, role)) == 1